@@ -0,0 +1,164 @@
+"""
+App Config
+Settings aplikasi dari environment (.env). Dipisah dari internal_assistant_core supaya modul
+tanpa client (chunking, benchmark) bisa membaca settings tanpa membangun client Azure/Qdrant/Redis.
+"""
+import os
+
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+# Load env & Settings
+load_dotenv()
+
+# Konfigurasi Settings
+class Settings(BaseModel):
+    # Azure OpenAI
+    openai_key: str = os.getenv("azure-openai-api-key", "")
+    openai_endpoint: str = os.getenv("azure-openai-endpoint", "")
+    openai_api_version: str = os.getenv("azure-openai-api-version", "2024-05-01-preview")
+    openai_deployment: str = os.getenv("azure-openai-deployment", "gpt-4o-mini")
+    openai_embed_deployment: str = os.getenv("azure-openai-embed-deployment", "text-embedding-3-large")
+
+    # Cognitive Search
+    search_endpoint: str = os.getenv("azure-search-endpoint", "")
+    search_key: str = os.getenv("azure-search-key", "")
+    search_index: str = os.getenv("azure-search-index-name", "internal-docs-index")
+
+    # Blob
+    blob_conn: str = os.getenv("azure-blob-connection-string", "")
+    blob_container: str = os.getenv("azure-blob-container", "internal-docs")
+
+    # Document Intelligence
+    docint_endpoint: str = os.getenv("azure-docint-endpoint", "")
+    docint_key: str = os.getenv("azure-docint-key", "")
+    # PDF besar dipecah per range halaman yang dianalisis paralel (0 = tidak dipecah)
+    docint_pages_per_range: int = int(os.getenv("docint-pages-per-range", "50"))
+    docint_range_concurrency: int = int(os.getenv("docint-range-concurrency", "4"))
+    # Retry per range halaman untuk error sementara (429/5xx/timeout) sebelum dokumen dianggap gagal
+    docint_range_max_retries: int = int(os.getenv("docint-range-max-retries", "3"))
+    # Format yang diextract lokal tanpa Document Intelligence: text,docx,xlsx,pdf (kosong = semua ke DI).
+    # pdf opt-in: jalur text layer tidak mengenali tabel / heading, jadi default PDF tetap lewat DI
+    native_extractors: str = os.getenv("native-extractors", "text,docx,xlsx")
+    # PDF dianggap punya text layer bila >= 90% halaman berisi minimal sekian karakter
+    native_pdf_min_chars_per_page: int = int(os.getenv("native-pdf-min-chars-per-page", "200"))
+    # File JSON rule klasifikasi paragraf (kosong = rule bawaan DEFAULT_CLASSIFIER_RULES)
+    content_classifier_rules: str = os.getenv("content-classifier-rules", "")
+
+    # Azure Function (preprocess)
+    func_preprocess_url: str = os.getenv("azure-function-preprocess-url", "")
+    func_preprocess_key: str = os.getenv("azure-function-preprocess-key", "")
+
+    # SQL
+    sql_server: str = os.getenv("azure-sql-server", "")
+    sql_db: str = os.getenv("azure-sql-database", "")
+    sql_user: str = os.getenv("azure-sql-username", "")
+    sql_password: str = os.getenv("azure-sql-password", "")
+
+        # === Load dari .env ===
+    MS_CLIENT_ID : str = os.getenv("ms-client-id","")
+    MS_CLIENT_SECRET : str = os.getenv("ms-client-secret","")
+    MS_TENANT_ID : str = os.getenv("ms-tenant-id","")
+    MS_GRAPH_SCOPE : str = os.getenv("ms-graph-scope", "https://graph.microsoft.com/.default")
+    MS_GROUP_ID : str = os.getenv("ms-group-id","")  # opsional, bisa kosong
+
+    @property
+    def ms_authority(self) -> str:
+        return f"https://login.microsoftonline.com/{self.MS_TENANT_ID}"
+    
+
+    # Notifications
+    notify_webhook: str = os.getenv("notify-webhook-url", "")
+
+    debug: bool = os.getenv("app-debug", "false").lower() == "true"
+
+    #qdrant
+    qdrant_url: str = os.getenv("qdrant-url","")
+    qdrant_api_key: str = os.getenv("qdrant-api-key","")
+    qdrant_collection: str = os.getenv("qdrant-collection","internal-docs-index")
+    # Profil collection baru (rebuild): float32 | int8 | binary | int8-1536 | binary-1536
+    qdrant_collection_profile: str = os.getenv("qdrant-collection-profile", "float32")
+    # Search di collection quantized: rescoring dengan vektor asli + oversampling kandidat
+    qdrant_search_oversampling: float = float(os.getenv("qdrant-search-oversampling", "2.0"))
+    # Blue/green rebuild: qdrant_collection menjadi alias ke collection versi {nama}_v{timestamp}
+    qdrant_keep_versions: int = int(os.getenv("qdrant-keep-versions", "2"))
+    # Swap dibatalkan bila point collection baru < rasio ini x collection aktif
+    qdrant_swap_min_ratio: float = float(os.getenv("qdrant-swap-min-ratio", "0.5"))
+
+    # Indexing pipeline
+    index_embed_batch_size: int = int(os.getenv("index-embed-batch-size", "64"))
+    index_workers: int = int(os.getenv("index-workers", "8"))
+    index_download_concurrency: int = int(os.getenv("index-download-concurrency", "8"))
+    index_layout_concurrency: int = int(os.getenv("index-layout-concurrency", "4"))
+    index_chunk_concurrency: int = int(os.getenv("index-chunk-concurrency", "4"))
+    index_embed_concurrency: int = int(os.getenv("index-embed-concurrency", "2"))
+    # Download di atas batas ini di-spool ke temp file, bukan ditahan di memori
+    index_spool_max_bytes: int = int(os.getenv("index-spool-max-bytes", str(16 * 1024 * 1024)))
+    blob_upload_max_concurrency: int = int(os.getenv("blob-upload-max-concurrency", "4"))
+    # Jumlah file yang di-upload bersamaan di batch_upload_files
+    blob_upload_parallelism: int = int(os.getenv("blob-upload-parallelism", "8"))
+    # Rate limit embedding (Azure OpenAI deployment quota) + retry
+    embed_tokens_per_minute: int = int(os.getenv("embed-tokens-per-minute", "350000"))
+    embed_requests_per_minute: int = int(os.getenv("embed-requests-per-minute", "2100"))
+    embed_max_retries: int = int(os.getenv("embed-max-retries", "6"))
+    embed_backoff_base_seconds: float = float(os.getenv("embed-backoff-base-seconds", "1.0"))
+    embed_backoff_max_seconds: float = float(os.getenv("embed-backoff-max-seconds", "60"))
+    # Embedding cache (key: deployment + MD5 chunk): sqlite | redis | off
+    embedding_cache_backend: str = os.getenv("embedding-cache-backend", "sqlite")
+    embedding_cache_path: str = os.getenv("embedding-cache-path", "cache/embeddings.sqlite3")
+    embedding_cache_ttl_seconds: int = int(os.getenv("embedding-cache-ttl-seconds", str(90 * 24 * 3600)))
+    # Manifest checkpoint run indexing ditulis ulang setiap N blob selesai
+    index_checkpoint_every: int = int(os.getenv("index-checkpoint-every", "10"))
+    # Run yang di-resume (resume=True) berkali-kali tanpa selesai dimulai ulang dari awal
+    index_resume_max_attempts: int = int(os.getenv("index-resume-max-attempts", "3"))
+    # Status job indexing background disimpan selama ini (Redis TTL)
+    index_job_ttl_seconds: int = int(os.getenv("index-job-ttl-seconds", str(7 * 24 * 3600)))
+
+    # ID chunk: content (hash isi + source, re-index hanya chunk yang berubah) | position (urutan chunk)
+    index_chunk_ids: str = os.getenv("index-chunk-ids", "content")
+    # Chunk tabel: blob (tabel utuh, split > 5000 token) | rows (kelompok baris + header diulang, data baris di payload)
+    table_chunk_mode: str = os.getenv("table-chunk-mode", "blob")
+    table_chunk_target_tokens: int = int(os.getenv("table-chunk-target-tokens", "800"))
+    # Mode rows: tabel kecil (<= N baris data) juga di-index satu point per baris untuk lookup
+    # (baris ter-index dua kali: di kelompok baris dan sebagai point sendiri); 0 = nonaktif
+    table_row_points_max_rows: int = int(os.getenv("table-row-points-max-rows", "0"))
+    # Profil chunking (CHUNKING_PROFILES di chunking): default | balanced | compact | profil dari file JSON
+    chunking_profile: str = os.getenv("chunking-profile", "default")
+    # Profil per prefix blob, mis. "sop/=default,finance/=compact" (prefix terpanjang menang)
+    chunking_profile_prefixes: str = os.getenv("chunking-profile-prefixes", "")
+    chunking_profiles_path: str = os.getenv("chunking-profiles-path", "")
+
+    # Near-duplicate chunk lintas dokumen (MinHash + LSH): off | link (hanya payload near_duplicate_of)
+    # | skip (tidak di-index)
+    near_dup_mode: str = os.getenv("near-dup-mode", "off")
+    # Pemakaian near_duplicate_of saat retrieval: off | collapse (satu chunk per grup) | downweight
+    # (skor rerank dikali near-dup-downweight)
+    near_dup_retrieval: str = os.getenv("near-dup-retrieval", "off")
+    # Estimasi Jaccard similarity (word 3-shingle) minimal untuk dianggap near-duplicate
+    near_dup_threshold: float = float(os.getenv("near-dup-threshold", "0.8"))
+    near_dup_min_tokens: int = int(os.getenv("near-dup-min-tokens", "30"))
+    near_dup_downweight: float = float(os.getenv("near-dup-downweight", "0.5"))
+    # Index signature: sqlite | redis
+    near_dup_index_backend: str = os.getenv("near-dup-index-backend", "sqlite")
+    near_dup_index_path: str = os.getenv("near-dup-index-path", "cache/near_duplicates.sqlite3")
+
+    # Blob prefix untuk data internal pipeline (cache, checkpoint) - tidak ikut diindeks
+    system_blob_prefix: str = os.getenv("system-blob-prefix", "_system/")
+
+    # Extraction cache (hasil Document Intelligence): local | blob | off
+    extraction_cache_backend: str = os.getenv("extraction-cache-backend", "local")
+    extraction_cache_dir: str = os.getenv("extraction-cache-dir", "cache/extraction")
+
+    # Redis (Memory - Short Term)
+    redis_host: str = os.getenv("redis-host", "")
+    redis_port: int = int(os.getenv("redis-port", "6380"))
+    redis_password: str = os.getenv("redis-password", "")
+    redis_ssl: bool = os.getenv("redis-ssl", "true").lower() == "true"
+
+    # Cosmos DB (Memory - Long Term)
+    cosmos_endpoint: str = os.getenv("cosmos-endpoint", "")
+    cosmos_key: str = os.getenv("cosmos-key", "")
+    cosmos_database: str = os.getenv("cosmos-database", "internal_assistant")
+    cosmos_container: str = os.getenv("cosmos-container", "conversation_history")
+
+settings = Settings()
@@ -0,0 +1,107 @@
+# Benchmark Extraction + Chunking
+# Ukur waktu walk hasil Document Intelligence + chunking per 100 halaman, plus jumlah
+# pemanggilan tokenizer dan karakter yang di-tokenize. Dokumen sintetis (tanpa Azure),
+# jadi angka antar commit bisa dibandingkan langsung: jalankan di commit lama dan baru.
+import argparse
+import random
+import statistics
+import time
+from types import SimpleNamespace
+from typing import Dict, Any, List
+
+try:
+    import chunking
+except ImportError:  # commit lama: chunking masih di rag_modul (butuh kredensial service)
+    import rag_modul as chunking
+
+WORDS = ("karyawan perusahaan prosedur kebijakan cuti approval atasan dokumen laporan "
+         "reimbursement proses sistem data tanggal jumlah biaya divisi manager policy "
+         "employee request form submit review budget target quarter").split()
+
+class CountingTokenizer:
+    """Proxy tokenizer: hitung pemanggilan encode/encode_batch dan karakter yang di-encode"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = 0
+        self.chars = 0
+
+    def encode(self, text, *args, **kwargs):
+        self.calls += 1
+        self.chars += len(text)
+        return self.inner.encode(text, *args, **kwargs)
+
+    def encode_batch(self, texts, *args, **kwargs):
+        self.calls += 1
+        self.chars += sum(len(t) for t in texts)
+        return self.inner.encode_batch(texts, *args, **kwargs)
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def build_document(pages: int, seed: int = 42) -> Any:
+    """AnalyzeResult sintetis: ~12 paragraf per halaman, heading tiap 6 paragraf, tabel tiap 5 halaman"""
+    rng = random.Random(seed)
+    paragraphs, tables = [], []
+
+    for page in range(1, pages + 1):
+        for i in range(12):
+            if i % 6 == 0:
+                paragraphs.append(SimpleNamespace(content=f"{page}.{i // 6 + 1} {_sentence(rng, 4)}", role="sectionHeading"))
+            else:
+                paragraphs.append(SimpleNamespace(content=" ".join(_sentence(rng, 12) for _ in range(4)), role=None))
+
+        if page % 5 == 0:
+            cells = [
+                SimpleNamespace(row_index=r, column_index=c, content=f"Kolom {c}" if r == 0 else _sentence(rng, 3))
+                for r in range(40) for c in range(4)
+            ]
+            tables.append(SimpleNamespace(
+                cells=cells, column_count=4, row_count=40,
+                bounding_regions=[SimpleNamespace(page_number=page)],
+            ))
+
+    return SimpleNamespace(pages=list(range(pages)), paragraphs=paragraphs, tables=tables)
+
+def benchmark_chunking(pages: int = 100, rounds: int = 5) -> Dict[str, Any]:
+    """Waktu extraction walk + chunking (median dari beberapa ronde), dinormalisasi per 100 halaman"""
+    res = build_document(pages)
+    original = chunking.tokenizer
+    timings: List[float] = []
+    counter = None
+    chunks = []
+
+    try:
+        for _ in range(rounds):
+            counter = CountingTokenizer(original)
+            chunking.tokenizer = counter
+            cache_clear = getattr(getattr(chunking, "_section_header_tokens", None), "cache_clear", None)
+            if cache_clear:
+                cache_clear()
+
+            t0 = time.perf_counter()
+            chunks = list(chunking._iter_intelligent_chunks(chunking._iter_docint_elements(res)))
+            timings.append(time.perf_counter() - t0)
+    finally:
+        chunking.tokenizer = original
+
+    per_100 = statistics.median(timings) * 100 / pages
+    result = {
+        "pages": pages,
+        "chunks": len(chunks),
+        "seconds_per_100_pages": round(per_100, 4),
+        "tokenizer_calls": counter.calls,
+        "tokenized_chars": counter.chars,
+    }
+    print(f"📄 {pages} pages -> {len(chunks)} chunks")
+    print(f"  {result['seconds_per_100_pages']}s / 100 pages (median of {rounds})")
+    print(f"  tokenizer: {counter.calls} calls, {counter.chars} chars encoded")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark extraction walk + chunking")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    benchmark_chunking(args.pages, args.rounds)
@@ -0,0 +1,115 @@
+# Benchmark Chunking Profiles
+# Bandingkan profil chunking (CHUNKING_PROFILES) secara offline: dokumen di-extract sekali
+# (lewat extraction cache), di-chunk per profil, di-embed (embedding cache), lalu query dicari
+# dengan cosine similarity di memori - tanpa menulis ke Qdrant.
+# Output per profil: hit rate@k, MRR, rata-rata token prompt (jumlah token top-k chunk, kira-kira
+# isi konteks rag_answer) dan jumlah chunk.
+#
+# File query (JSON): [{"query": "...", "source": "sop/cuti.pdf", "expect": "12 hari"}, ...]
+# "expect" opsional: bila ada, chunk dianggap hit hanya jika source cocok DAN teksnya memuat expect.
+#
+# Chunking diimpor dari modul chunking (tanpa client). Extraction (Blob + Document Intelligence) dan
+# embedding memang butuh service, jadi rag_modul / internal_assistant_core baru diimpor di fungsi
+# yang memakainya.
+import argparse
+import json
+import statistics
+from typing import Dict, List, Any
+
+import numpy as np
+
+from chunking import chunking_profiles, _iter_intelligent_chunks
+
+def load_elements(blob_names: List[str]) -> Dict[str, List[Any]]:
+    """Extract tiap blob sekali; element dipakai ulang untuk semua profil"""
+    from internal_assistant_core import blob_container
+    from rag_modul import _download_blob_to_spool, _open_extraction, _blob_mime_type
+
+    documents = {}
+    for blob_name in blob_names:
+        spool, properties, content_hash, _ = _download_blob_to_spool(blob_container.get_blob_client(blob_name))
+        with spool:
+            elements, cache_hit, extractor = _open_extraction(spool, content_hash, _blob_mime_type(blob_name, properties))
+            documents[blob_name] = list(elements)
+        print(f"📄 {blob_name}: {len(documents[blob_name])} elements ({extractor}, cache hit: {cache_hit})")
+    return documents
+
+def _normalize(vectors: List[List[float]]) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def evaluate_profile(
+    profile: str,
+    documents: Dict[str, List[Any]],
+    queries: List[Dict[str, Any]],
+    query_vectors: np.ndarray,
+    k: int = 10,
+) -> Dict[str, Any]:
+    """Chunk + embed semua dokumen dengan satu profil, lalu ukur retrieval per query"""
+    from rag_modul import _build_chunk_records, _embed_records
+
+    records = []
+    for blob_name, elements in documents.items():
+        chunks = list(_iter_intelligent_chunks(iter(elements), profile))
+        records.extend(_build_chunk_records(blob_name, chunks))
+
+    vectors, stats = _embed_records(records)
+    scores = query_vectors @ _normalize(vectors).T
+
+    hits, reciprocal_ranks, prompt_tokens = [], [], []
+    for query, row in zip(queries, scores):
+        top = np.argsort(-row)[:k]
+        prompt_tokens.append(sum(records[i]["metadata"]["token_count"] for i in top))
+
+        rank = None
+        for position, i in enumerate(top, 1):
+            record = records[i]
+            if record["metadata"]["source"] != query["source"]:
+                continue
+            if query.get("expect") and query["expect"].lower() not in record["text"].lower():
+                continue
+            rank = position
+            break
+        hits.append(rank is not None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+    token_counts = [r["metadata"]["token_count"] for r in records]
+    return {
+        "chunks": len(records),
+        "avg_chunk_tokens": round(statistics.mean(token_counts), 1) if token_counts else 0,
+        "hit_rate_at_k": round(statistics.mean(hits), 4),
+        "mrr": round(statistics.mean(reciprocal_ranks), 4),
+        "avg_prompt_tokens": round(statistics.mean(prompt_tokens), 1),
+        "embedding_cache_hits": stats["cache_hits"],
+    }
+
+def benchmark_chunking_profiles(queries_path: str, profiles: List[str], k: int = 10) -> Dict[str, Any]:
+    from internal_assistant_core import embeddings
+
+    with open(queries_path, "r", encoding="utf-8") as fp:
+        queries = json.load(fp)
+    if not queries:
+        print("❌ No queries to evaluate")
+        return {}
+
+    documents = load_elements(sorted({q["source"] for q in queries}))
+    query_vectors = _normalize(embeddings.embed_documents([q["query"] for q in queries]))
+    print(f"🔎 {len(queries)} queries over {len(documents)} documents, k={k}")
+
+    results = {}
+    for profile in profiles:
+        results[profile] = evaluate_profile(profile, documents, queries, query_vectors, k)
+        r = results[profile]
+        print(f"  {profile:<10} hit@{k}={r['hit_rate_at_k']:.3f} MRR={r['mrr']:.3f} "
+              f"prompt~{r['avg_prompt_tokens']} tokens chunks={r['chunks']} (avg {r['avg_chunk_tokens']} tokens)")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare chunking profiles offline (retrieval hit rate vs prompt tokens)")
+    parser.add_argument("queries", help="JSON file: [{query, source, expect?}]")
+    parser.add_argument("--profiles", nargs="+", default=list(chunking_profiles))
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    benchmark_chunking_profiles(args.queries, args.profiles, args.k)
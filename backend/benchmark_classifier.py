@@ -0,0 +1,152 @@
+# Benchmark Content Classifier
+# Bandingkan ContentClassifier (rule dari config, keyword-set lookup per token) dengan implementasi lama
+# (if/any berurutan) pada korpus sintetis 100k paragraf; sekaligus cek hasil keduanya sama.
+import argparse
+import random
+import re
+import time
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+from chunking import ContentClassifier, DEFAULT_CLASSIFIER_RULES, content_classifier
+
+WORDS = ("karyawan perusahaan wajib mengajukan cuti melalui sistem dan mendapatkan persetujuan atasan "
+         "langsung sebelum tanggal mulai employee must submit the request form within working days "
+         "secara berkala laporan keuangan divisi operasional dokumen pendukung").split()
+MARKERS = ["Tujuan", "Prosedur", "Kebijakan", "Lampiran", "Daftar Isi", "Core Values", "Integrity",
+           "BAB 3", "2.1", "4.", "Summary", "Catatan:", "Kolom | Nilai", "Overview"]
+ROLES = [None] * 18 + ["title", "sectionHeading"]
+
+def legacy_classify(text: str, role: Optional[str] = None) -> str:
+    """Implementasi lama (if/any berurutan) sebagai baseline dan referensi hasil"""
+    text_upper = text.upper()
+    text_lower = text.lower()
+
+    # Deteksi berdasarkan role
+    if role and "title" in role.lower():
+        return "title"
+    if role and "heading" in role.lower():
+        return "heading"
+
+    # FIX: Enhanced core values detection
+    if any(keyword in text_upper for keyword in ["CORE VALUES", "NILAI INTI"]):
+        return "core_values_header"
+
+    # FIX: Detect individual core value items
+    core_value_items = ["HUMBLE", "CUSTOMER FOCUSED", "EMPLOYEE SATISFACTION",
+                       "SPEED", "PASSION", "INTEGRITY", "DISCIPLINE"]
+    if any(cv in text_upper for cv in core_value_items):
+        # Check if it's a header or detailed content
+        if len(text.split()) < 10:  # Short text, likely header
+            return "core_value_item"
+        else:  # Longer text with core value content
+            return "core_value_content"
+
+    # Pattern umum untuk berbagai bahasa dan jenis dokumen
+    # Table of Contents patterns
+    if any(keyword in text_upper for keyword in
+           ["DAFTAR ISI", "TABLE OF CONTENTS", "CONTENTS", "INDEX", "INDEKS"]):
+        return "table_of_contents"
+
+    # Chapter/Section patterns
+    if re.match(r'^(BAB|CHAPTER|SECTION|BAGIAN)\s*\d+', text_upper):
+        return "chapter"
+
+    if re.match(r'^\d+\.', text.strip()):  # Dimulai dengan nomor
+        return "section_header"
+
+    if re.match(r'^\d+\.\d+', text.strip()):  # Sub section
+        return "subsection_header"
+
+    # Appendix patterns
+    if any(keyword in text_upper for keyword in
+           ["APPENDIX", "LAMPIRAN", "ANNEX", "ATTACHMENT"]):
+        return "appendix"
+
+    # General important sections
+    if any(keyword in text_upper for keyword in
+           ["PURPOSE", "TUJUAN", "VISION", "VISI", "MISSION", "MISI",
+            "OBJECTIVE", "SASARAN", "GOAL", "TARGET", "INTRODUCTION",
+            "PENDAHULUAN", "OVERVIEW", "RINGKASAN", "SUMMARY",
+            "CONCLUSION", "KESIMPULAN", "RECOMMENDATION", "REKOMENDASI"]):
+        return "purpose_statement"
+
+    # Procedure/Process patterns
+    if any(keyword in text_upper for keyword in
+           ["PROCEDURE", "PROSEDUR", "PROCESS", "PROSES", "WORKFLOW",
+            "LANGKAH", "TAHAP", "STEPS", "CARA"]):
+        return "detailed_content"
+
+    # Policy/Rule patterns
+    if any(keyword in text_upper for keyword in
+           ["POLICY", "KEBIJAKAN", "RULE", "ATURAN", "REGULATION",
+            "REGULASI", "GUIDELINE", "PANDUAN"]):
+        return "detailed_content"
+
+    # Long detailed content
+    if len(text.split()) > 100:
+        return "detailed_content"
+
+    # Table content detection
+    if any(char in text for char in ["|", ":", "─", "┌", "└"]) or \
+       (text.count("|") > 2 and "\n" in text):
+        return "table_content"
+
+    # List content
+    if text.count("- ") > 2 or text.count("• ") > 2:
+        return "content"
+
+    return "content"
+
+
+def build_corpus(size: int, seed: int = 42) -> List[Tuple[str, Optional[str]]]:
+    """Paragraf acak 3-150 kata; ~1/3 disisipi penanda (keyword/penomoran) di posisi acak"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        words = [rng.choice(WORDS) for _ in range(rng.choice((3, 6, 12, 25, 40, 80, 150)))]
+        if rng.random() < 0.33:
+            words.insert(rng.choice((0, len(words) // 2, len(words))), rng.choice(MARKERS))
+        corpus.append((" ".join(words), rng.choice(ROLES)))
+    return corpus
+
+def _time(classify, corpus: List[Tuple[str, Optional[str]]], rounds: int) -> Tuple[float, List[str]]:
+    best, labels = None, []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        labels = [classify(text, role) for text, role in corpus]
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, labels
+
+def benchmark_classifier(size: int = 100_000, rounds: int = 3) -> Dict[str, Any]:
+    corpus = build_corpus(size)
+    default_rules = ContentClassifier(DEFAULT_CLASSIFIER_RULES)
+
+    legacy_seconds, legacy_labels = _time(legacy_classify, corpus, rounds)
+    new_seconds, new_labels = _time(default_rules.classify, corpus, rounds)
+    mismatches = sum(1 for a, b in zip(legacy_labels, new_labels) if a != b)
+
+    result = {
+        "paragraphs": size,
+        "legacy_seconds": round(legacy_seconds, 3),
+        "classifier_seconds": round(new_seconds, 3),
+        "speedup": round(legacy_seconds / new_seconds, 2),
+        "mismatches": mismatches,
+        "labels": dict(Counter(new_labels).most_common()),
+    }
+    print(f"📄 {size} paragraphs (best of {rounds})")
+    print(f"  legacy      {result['legacy_seconds']}s")
+    print(f"  classifier  {result['classifier_seconds']}s  ({result['speedup']}x)")
+    print(f"  mismatches  {mismatches}")
+    if content_classifier.rules is not DEFAULT_CLASSIFIER_RULES:
+        print("  ℹ️ content-classifier-rules is set; benchmark uses the built-in rules")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark content classifier")
+    parser.add_argument("--paragraphs", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    benchmark_classifier(args.paragraphs, args.rounds)
@@ -0,0 +1,142 @@
+# Benchmark Collection Profiles
+# Bandingkan recall@k dan latency tiap profil collection (COLLECTION_PROFILES) terhadap
+# setup sekarang (float32 3072 dim, exact search sebagai ground truth).
+# Sampel point + vektor diambil dari collection aktif; collection benchmark dihapus setelah selesai.
+# Hanya butuh Qdrant (--qdrant-url, default qdrant-url dari .env): tidak membuat client Azure/Redis,
+# jadi bisa dijalankan ke Qdrant lokal yang berisi snapshot collection.
+import argparse
+import random
+import statistics
+import time
+from typing import Dict, List, Any, Tuple
+
+from app_config import settings
+from qdrant_profiles import COLLECTION_PROFILES, _collection_profile_config, truncate_embedding, iter_qdrant_points
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qdrant_models
+
+def load_sample(qdrant_client: QdrantClient, collection: str, sample_size: int) -> List[Any]:
+    """Ambil sample_size point pertama (dengan vektor) dari collection aktif"""
+    points = []
+    for point in iter_qdrant_points(
+        qdrant_client, collection, with_payload=False, page_size=256, with_vectors=True
+    ):
+        points.append(point)
+        if len(points) >= sample_size:
+            break
+    return points
+
+def _build_collection(qdrant_client: QdrantClient, name: str, profile: str, points: List[Any]):
+    dims = COLLECTION_PROFILES[profile]["dims"]
+    if qdrant_client.collection_exists(name):
+        qdrant_client.delete_collection(collection_name=name)
+    qdrant_client.create_collection(collection_name=name, **_collection_profile_config(profile))
+
+    for i in range(0, len(points), 256):
+        qdrant_client.upsert(
+            collection_name=name,
+            points=[
+                qdrant_models.PointStruct(id=p.id, vector=truncate_embedding(p.vector, dims))
+                for p in points[i:i + 256]
+            ],
+            wait=True,
+        )
+
+    # Tunggu optimizer selesai membangun HNSW + quantization
+    while qdrant_client.get_collection(collection_name=name).status != qdrant_models.CollectionStatus.GREEN:
+        time.sleep(1)
+
+def _search(
+    qdrant_client: QdrantClient, name: str, vector: List[float], k: int, params: qdrant_models.SearchParams
+) -> Tuple[List[Any], float]:
+    t0 = time.perf_counter()
+    result = qdrant_client.query_points(
+        collection_name=name, query=vector, limit=k, search_params=params, with_payload=False
+    )
+    return [p.id for p in result.points], (time.perf_counter() - t0) * 1000
+
+def _vector_ram_bytes(profile: str, count: int) -> int:
+    """Perkiraan RAM untuk vektor (tanpa graph HNSW)"""
+    cfg = COLLECTION_PROFILES[profile]
+    dims = cfg["dims"]
+    if cfg["quantization"] == "int8":
+        return count * dims
+    if cfg["quantization"] == "binary":
+        return count * dims // 8
+    return count * dims * 4
+
+def benchmark_profiles(
+    qdrant_client: QdrantClient,
+    profiles: List[str],
+    collection: str = settings.qdrant_collection,
+    sample_size: int = 5000,
+    queries: int = 100,
+    k: int = 10,
+    oversampling: float = 2.0,
+) -> Dict[str, Any]:
+    """Recall@k (vs exact float32) dan latency p50/p95 per profil"""
+    points = load_sample(qdrant_client, collection, sample_size)
+    if not points:
+        print("❌ Collection is empty, nothing to benchmark")
+        return {}
+
+    print(f"📦 Sample: {len(points)} points, {queries} queries, k={k}")
+    query_points = random.Random(42).sample(points, min(queries, len(points)))
+    results = {}
+
+    # Ground truth: exact search pada float32 penuh (setup sekarang)
+    baseline = f"{collection}_bench_float32"
+    _build_collection(qdrant_client, baseline, "float32", points)
+    exact = qdrant_models.SearchParams(exact=True)
+    truth = {p.id: set(_search(qdrant_client, baseline, p.vector, k, exact)[0]) for p in query_points}
+
+    try:
+        for profile in profiles:
+            name = baseline if profile == "float32" else f"{collection}_bench_{profile}"
+            if name != baseline:
+                _build_collection(qdrant_client, name, profile, points)
+
+            dims = COLLECTION_PROFILES[profile]["dims"]
+            params = qdrant_models.SearchParams(
+                quantization=qdrant_models.QuantizationSearchParams(rescore=True, oversampling=oversampling)
+            )
+            recalls, latencies = [], []
+            for p in query_points:
+                ids, ms = _search(qdrant_client, name, truncate_embedding(p.vector, dims), k, params)
+                recalls.append(len(truth[p.id] & set(ids)) / k)
+                latencies.append(ms)
+
+            latencies.sort()
+            results[profile] = {
+                "dims": dims,
+                "quantization": COLLECTION_PROFILES[profile]["quantization"],
+                "recall_at_k": round(statistics.mean(recalls), 4),
+                "latency_ms_p50": round(statistics.median(latencies), 2),
+                "latency_ms_p95": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+                "vector_ram_mb": round(_vector_ram_bytes(profile, len(points)) / (1024 * 1024), 1),
+            }
+            print(f"  {profile:<12} recall@{k}={results[profile]['recall_at_k']:.3f} "
+                  f"p50={results[profile]['latency_ms_p50']}ms p95={results[profile]['latency_ms_p95']}ms "
+                  f"RAM~{results[profile]['vector_ram_mb']}MB")
+
+            if name != baseline:
+                qdrant_client.delete_collection(collection_name=name)
+    finally:
+        qdrant_client.delete_collection(collection_name=baseline)
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Qdrant collection profiles")
+    parser.add_argument("--qdrant-url", default=settings.qdrant_url)
+    parser.add_argument("--qdrant-api-key", default=settings.qdrant_api_key)
+    parser.add_argument("--collection", default=settings.qdrant_collection, help="Collection / alias sumber sampel")
+    parser.add_argument("--profiles", nargs="+", default=list(COLLECTION_PROFILES))
+    parser.add_argument("--sample-size", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--oversampling", type=float, default=settings.qdrant_search_oversampling)
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.qdrant_url, api_key=args.qdrant_api_key or None, timeout=60)
+    benchmark_profiles(client, args.profiles, args.collection, args.sample_size, args.queries, args.k, args.oversampling)
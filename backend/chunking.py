@@ -0,0 +1,1256 @@
+"""
+Chunking
+Bagian murni pipeline dokumen: token counting, tabel (grid, merge multi-halaman, chunk per
+baris), klasifikasi paragraf, section dan chunking per profil. Modul ini hanya membaca settings
+(app_config), tidak bergantung pada client Azure/Qdrant/Redis, sehingga benchmark bisa
+mengimpornya tanpa kredensial. Extraction, embedding dan indexing diurus rag_modul.
+"""
+import functools
+import hashlib
+import itertools
+import json
+import re
+import sys
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import tiktoken
+
+from app_config import settings
+
+tokenizer = tiktoken.get_encoding("cl100k_base")
+def tiktoken_len(text):
+    return len(tokenizer.encode(text))
+
+# Di bawah ukuran ini encode_batch (thread pool tiktoken) tidak sebanding overhead-nya
+TOKEN_BATCH_MIN = 8
+
+def tiktoken_lens(texts: List[str]) -> List[int]:
+    """Jumlah token banyak teks sekaligus (encode_batch untuk list besar)."""
+    if len(texts) < TOKEN_BATCH_MIN:
+        return [tiktoken_len(text) for text in texts]
+    return [len(tokens) for tokens in tokenizer.encode_batch(texts)]
+
+@functools.lru_cache(maxsize=4096)
+def _section_header_tokens(section_header: str) -> int:
+    """Token header chunk "=== header ===" (dipakai ulang di setiap batas chunk)."""
+    return tiktoken_len(f"=== {section_header} ===\n")
+
+# === Advanced text cleaning dengan preserve struktur ===
+def _clean_text(text: str) -> str:
+    if not text:
+        return ""
+    
+    # Preserve struktur dokumen yang penting
+    txt = text.replace("\u00a0", " ")            # Non-breaking space
+    txt = re.sub(r"[•●▪∙◦]", "- ", txt)          # Bullet points dengan spasi
+    txt = re.sub(r'[ \t]+', ' ', txt)            # Multiple spaces jadi single space
+    txt = re.sub(r'\n{4,}', '\n\n\n', txt)       # Max 3 newlines berturut-turut
+    
+    # Preserve numbering dan struktur hierarki
+    txt = re.sub(r'(\d+)\.(\s*)', r'\1. ', txt)  # Normalize numbering
+    txt = re.sub(r'(\d+\.\d+)\.(\s*)', r'\1. ', txt)  # Sub-numbering
+    
+    return txt.strip()
+
+# ============Table Handler============
+# === Compact Table Grid ===
+
+class TableGrid:
+    """
+    Representasi tabel yang ringkas: satu list row-major berukuran row_count * column_count
+    berisi string yang di-intern (nilai berulang seperti "0", "Ya", "-" cukup disimpan sekali).
+    None = posisi tanpa cell (tertutup span / trailing kosong) dan tidak ikut diserialisasi,
+    sehingga hasil " | ".join sama persis dengan format baris sebelumnya.
+
+    Dipakai bersama oleh merge continuation, serialisasi (_table_element) dan
+    _split_large_table.
+    """
+
+    __slots__ = ("row_count", "column_count", "cells")
+
+    def __init__(self, row_count: int, column_count: int):
+        self.row_count = max(row_count, 0)
+        self.column_count = max(column_count, 0)
+        self.cells: List[Optional[str]] = [None] * (self.row_count * self.column_count)
+
+    @classmethod
+    def from_rows(cls, rows: List[List[str]]) -> "TableGrid":
+        grid = cls(0, max((len(row) for row in rows), default=0))
+        for row in rows:
+            grid.append_row(row)
+        return grid
+
+    @classmethod
+    def concat(cls, grids: List["TableGrid"], skip_header: bool = True) -> "TableGrid":
+        """Sambung grid secara vertikal; header (baris 0) grid lanjutan dibuang bila skip_header"""
+        column_count = max((g.column_count for g in grids), default=0)
+        merged = cls(0, column_count)
+        for idx, grid in enumerate(grids):
+            start = 1 if skip_header and idx > 0 else 0
+            if grid.column_count == column_count:
+                merged.cells.extend(grid.cells[start * column_count:])
+            else:
+                pad = [None] * (column_count - grid.column_count)
+                for r in range(start, grid.row_count):
+                    merged.cells.extend(grid.cells[r * grid.column_count:(r + 1) * grid.column_count])
+                    merged.cells.extend(pad)
+            merged.row_count += max(grid.row_count - start, 0)
+        return merged
+
+    def _grow(self, row_count: int, column_count: int):
+        """Perbesar grid (dipakai bila index cell melebihi row_count/column_count yang dilaporkan)"""
+        if column_count > self.column_count:
+            pad = [None] * (column_count - self.column_count)
+            cells = []
+            for r in range(self.row_count):
+                cells.extend(self.cells[r * self.column_count:(r + 1) * self.column_count])
+                cells.extend(pad)
+            self.cells, self.column_count = cells, column_count
+        if row_count > self.row_count:
+            self.cells.extend([None] * ((row_count - self.row_count) * self.column_count))
+            self.row_count = row_count
+
+    def append_row(self, values: List[str]):
+        if len(values) > self.column_count:
+            self._grow(self.row_count, len(values))
+        self.cells.extend(sys.intern(v) for v in values)
+        self.cells.extend([None] * (self.column_count - len(values)))
+        self.row_count += 1
+
+    def set(self, row: int, column: int, value: str):
+        if row >= self.row_count or column >= self.column_count:
+            self._grow(max(row + 1, self.row_count), max(column + 1, self.column_count))
+        self.cells[row * self.column_count + column] = sys.intern(value)
+
+    def row(self, row: int) -> List[str]:
+        offset = row * self.column_count
+        return [v for v in self.cells[offset:offset + self.column_count] if v is not None]
+
+    def rows(self) -> Iterator[List[str]]:
+        """Baris yang punya minimal satu cell (baris tanpa cell sama sekali dilewati)"""
+        for r in range(self.row_count):
+            values = self.row(r)
+            if values:
+                yield values
+
+    def lines(self) -> List[str]:
+        return [" | ".join(values) for values in self.rows()]
+
+
+# === Table Continuation Detection Functions ===
+
+_TABLE_DATA_PATTERN = re.compile(r'\d+[.,]\d+|\d{4}|IDR|Rp|\%')
+_DIGIT_PATTERN = re.compile(r'\d')
+_LETTER_PATTERN = re.compile(r'[a-zA-Z]')
+
+
+class _TableSummary:
+    """
+    Ringkasan satu tabel Document Intelligence, dibangun sekali dalam satu pass atas cell-nya.
+
+    Berisi semua yang dibutuhkan deteksi continuation (headers, tipe kolom, halaman pertama,
+    ciri baris pertama) plus TableGrid berisi cell yang sudah dibersihkan, sehingga merge
+    dan serialisasi tidak perlu membaca table.cells lagi.
+    """
+
+    __slots__ = ("index", "column_count", "grid", "has_cells", "headers", "column_types",
+                 "first_page", "first_row_avg_len", "first_row_has_data")
+
+    def __init__(self, table: Any, index: int):
+        self.index = index
+        self.column_count = getattr(table, 'column_count', 0) or 0
+        self.grid = TableGrid(getattr(table, 'row_count', 0) or 0, self.column_count)
+        self.has_cells = False
+
+        # Hitungan per kolom (baris > 0) untuk klasifikasi tipe kolom
+        col_total: Dict[int, int] = {}
+        col_numbers: Dict[int, int] = {}
+        col_text: Dict[int, int] = {}
+        first_row_lengths = []
+        self.first_row_has_data = False
+
+        for cell in getattr(table, 'cells', None) or []:
+            r, c, raw = cell.row_index, cell.column_index, cell.content
+            self.grid.set(r, c, _clean_text(raw))
+            self.has_cells = True
+
+            if r == 0:
+                first_row_lengths.append(len(raw))
+                if not self.first_row_has_data and _TABLE_DATA_PATTERN.search(raw):
+                    self.first_row_has_data = True
+            else:
+                col_total[c] = col_total.get(c, 0) + 1
+                if _DIGIT_PATTERN.search(raw):
+                    col_numbers[c] = col_numbers.get(c, 0) + 1
+                if _LETTER_PATTERN.search(raw):
+                    col_text[c] = col_text.get(c, 0) + 1
+
+        self.headers = self.grid.row(0) if self.grid.row_count else []
+        self.first_row_avg_len = sum(first_row_lengths) / len(first_row_lengths) if first_row_lengths else 0.0
+
+        self.column_types = []
+        for col_idx in range(self.column_count):
+            total = col_total.get(col_idx, 0)
+            if not total:
+                self.column_types.append('empty')
+            elif col_numbers.get(col_idx, 0) > total * 0.7:
+                self.column_types.append('number')
+            elif col_text.get(col_idx, 0) > total * 0.7:
+                self.column_types.append('text')
+            else:
+                self.column_types.append('mixed')
+
+        regions = getattr(table, 'bounding_regions', None) or []
+        self.first_page = getattr(regions[0], 'page_number', None) if regions else None
+
+
+def _calculate_header_similarity(headers1: List[str], headers2: List[str]) -> float:
+    """Calculate similarity between two header lists."""
+    if len(headers1) != len(headers2):
+        return 0.0
+    
+    if not headers1:
+        return 0.0
+    
+    matches = sum(1 for h1, h2 in zip(headers1, headers2) if h1.lower() == h2.lower())
+    return matches / len(headers1)
+
+
+def _is_table_continuation(tail: _TableSummary, candidate: _TableSummary) -> bool:
+    """Detect if candidate is a continuation of tail (ekor rantai tabel yang sedang dibangun)."""
+
+    if not candidate.has_cells or tail.column_count != candidate.column_count:
+        return False
+
+    # Check page proximity (halaman pertama kedua tabel)
+    if tail.first_page and candidate.first_page:
+        if candidate.first_page > tail.first_page + 1:
+            return False
+
+    # Compare headers
+    if tail.headers and candidate.headers:
+        if tail.headers == candidate.headers:
+            print(f"  ✓ Identical headers detected")
+            return True
+
+        similarity = _calculate_header_similarity(tail.headers, candidate.headers)
+        if similarity > 0.8:
+            print(f"  ✓ Similar headers: {similarity:.2f}")
+            return True
+
+    # Check if first row is data
+    if candidate.headers:
+        if candidate.first_row_avg_len > 30:
+            print(f"  ✓ First row appears to be data")
+            return True
+
+        if candidate.first_row_has_data:
+            print(f"  ✓ First row contains data patterns")
+            return True
+
+    # Check column types
+    if tail.column_types and len(tail.column_types) == len(candidate.column_types):
+        type_match = sum(1 for t1, t2 in zip(tail.column_types, candidate.column_types) if t1 == t2)
+        type_ratio = type_match / len(tail.column_types)
+
+        if type_ratio > 0.7:
+            print(f"  ✓ Column types match: {type_ratio:.2f}")
+            return True
+
+    return False
+
+
+# Tabel per rantai continuation (tabel pertama + maksimal 2 continuation)
+MAX_TABLE_CHAIN = 3
+
+
+def _merge_table_chain(chain: List[_TableSummary]) -> TableGrid:
+    """Gabungkan grid dari rantai tabel; header tabel continuation dibuang."""
+    if len(chain) == 1:
+        return chain[0].grid
+
+    print(f"  Merging {len(chain)} tables into one")
+    return TableGrid.concat([summary.grid for summary in chain])
+
+
+def _merge_multi_page_tables(tables: List[Any]) -> List[Tuple[TableGrid, List[str]]]:
+    """
+    Merge tables that are continuations across pages.
+
+    Setiap tabel diringkas sekali (_TableSummary), lalu dirangkai dalam satu pass linear:
+    tabel datang dalam urutan baca, jadi satu-satunya kandidat continuation untuk ekor
+    rantai adalah tabel berikutnya, dan kedekatan halaman dicek dari halaman pertama
+    ringkasan. Total kerja O(jumlah tabel + jumlah cell).
+
+    Satu rantai maksimal MAX_TABLE_CHAIN tabel (jarak ke tabel pertama <= 2), supaya deretan
+    tabel lain yang kebetulan sama lebarnya tidak tergabung di bawah header tabel pertama.
+
+    Returns:
+        List (grid, headers) per tabel hasil merge
+    """
+    merged = []
+    chain: List[_TableSummary] = []
+
+    def flush():
+        if len(chain) > 1:
+            print(f"✓ Merged {len(chain)} tables")
+        merged.append((_merge_table_chain(chain), chain[0].headers))
+
+    for idx, table in enumerate(tables or []):
+        summary = _TableSummary(table, idx)
+
+        if chain and len(chain) < MAX_TABLE_CHAIN and _is_table_continuation(chain[-1], summary):
+            print(f"✓ Table {idx} detected as continuation of table {chain[0].index}")
+            chain.append(summary)
+            continue
+
+        if chain:
+            flush()
+        chain = [summary]
+
+    if chain:
+        flush()
+
+    return merged
+
+
+def _iter_counted_paragraphs(
+    paragraphs: Iterable[Tuple[str, Optional[str]]],
+    batch_size: int = 256,
+) -> Iterator[Tuple[int, str, Optional[str], int]]:
+    """(posisi, teks bersih, role, token) per paragraf; token dihitung sekali per batch."""
+    numbered = enumerate(paragraphs)
+    while True:
+        chunk = list(itertools.islice(numbered, batch_size))
+        if not chunk:
+            return
+
+        batch = []
+        for idx, (content, role) in chunk:
+            text = _clean_text(content)
+            if text: #or len(text) < 10:  # Skip very short content
+                batch.append((idx, text, role))
+
+        for (idx, text, role), tokens in zip(batch, tiktoken_lens([text for _, text, _ in batch])):
+            yield idx, text, role, tokens
+
+
+def _iter_sections(paragraphs: Iterable[Tuple[str, Optional[str]]]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Kelompokkan paragraf (teks, role) jadi section dan yield ("section", section) begitu
+    satu section selesai (heading berikutnya ditemukan). Dipakai Document Intelligence
+    maupun extractor lokal, sehingga struktur section-nya identik.
+    """
+    current_section = None
+    section_counter = 0
+
+    # Process paragraphs dengan context dan posisi - GENERAL approach
+    for idx, text, role, tokens in _iter_counted_paragraphs(paragraphs):
+        content_type = _classify_content_type(text, role)
+
+        section_data = {
+            "content": text,
+            "type": content_type,
+            "role": role,
+            "position": idx,
+            "tokens": tokens
+        }
+
+        # Jika heading, mulai section baru
+        if content_type in ["title", "heading", "section_header", "chapter", "subsection"]:
+            if current_section:
+                yield "section", current_section
+
+            current_section = {
+                "header": text,
+                "type": content_type,
+                "content_parts": [section_data],
+                "section_id": section_counter,
+                "total_tokens": tokens
+            }
+            section_counter += 1
+        else:
+            if current_section:
+                current_section["content_parts"].append(section_data)
+                current_section["total_tokens"] += tokens
+            else:
+                current_section = {
+                    "header": "Document Content",
+                    "type": "content",
+                    "content_parts": [section_data],
+                    "section_id": section_counter,
+                    "total_tokens": tokens
+                }
+                section_counter += 1
+
+    if current_section:
+        yield "section", current_section
+
+
+def _table_element(grid: TableGrid, table_id: int, headers: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Element tabel (format raw_tables) dari TableGrid berisi cell yang sudah dibersihkan.
+
+    Token dihitung sekali per baris (row_tokens, dipakai lagi oleh _split_large_table);
+    tokens tabel = jumlah token baris + satu token newline per pemisah baris.
+    Grid ikut disimpan di element untuk _split_large_table (tidak masuk extraction cache).
+    """
+    lines = grid.lines()
+    row_tokens = tiktoken_lens(lines)
+    if headers is None:
+        headers = grid.row(0) if grid.row_count else []
+    return {
+        "content": "\n".join(lines),
+        "headers": headers,
+        "table_id": table_id,
+        "tokens": sum(row_tokens) + max(len(lines) - 1, 0),
+        "row_tokens": row_tokens,
+        "row_count": len(lines),
+        "grid": grid,
+    }
+
+
+def _iter_docint_elements(res: Any) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Walk hasil Document Intelligence dan yield ("section", section) begitu satu section
+    selesai (heading berikutnya ditemukan), lalu ("table", table) per tabel.
+
+    Tidak ada salinan kedua dari paragraf: section yang sudah di-yield tidak disimpan lagi,
+    sehingga chunking bisa langsung jalan sambil paragraf berikutnya diproses.
+    """
+    yield from _iter_sections(
+        (para.content, getattr(para, "role", None))
+        for para in (getattr(res, "paragraphs", None) or [])
+    )
+
+    # Process tables dengan context yang lebih baik
+    tables = getattr(res, "tables", None)
+    if not tables:
+        return
+
+    print(f"📊 Found {len(tables)} raw tables, checking for continuations...")
+    merged_tables = _merge_multi_page_tables(tables)
+    print(f"📊 After merging: {len(merged_tables)} tables")
+
+    for table_idx, (grid, headers) in enumerate(merged_tables):
+        element = _table_element(grid, table_idx, headers)
+        if not element["row_count"]:
+            print(f"⚠️  Table {table_idx}: No cells found, skipping")
+            continue
+
+        print(f"✓ Table {table_idx}: Extracted {element['row_count']} rows, {len(headers)} columns")
+
+        yield "table", element
+
+
+def _doc_data_elements(doc_data: Dict[str, List[Dict[str, Any]]]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Ubah doc_data (format _extract_text_with_docint) jadi stream element."""
+    for section in doc_data.get("sections", []):
+        yield "section", section
+    for table in doc_data.get("raw_tables", []):
+        yield "table", table
+
+
+# === Content classifier: rule dari config, dikompilasi sekali saat import ===
+# Rule dievaluasi berurutan, rule pertama yang cocok menentukan type. Kondisi dalam satu rule
+# di-AND: roles (substring role DI), keywords (substring, case-insensitive),
+# pattern (regex di awal teks, case-insensitive), min_words / max_words.
+DEFAULT_CLASSIFIER_RULES: List[Dict[str, Any]] = [
+    # Deteksi berdasarkan role
+    {"type": "title", "roles": ["title"]},
+    {"type": "heading", "roles": ["heading"]},
+    # FIX: Enhanced core values detection
+    {"type": "core_values_header", "keywords": ["CORE VALUES", "NILAI INTI"]},
+    # FIX: Detect individual core value items (teks pendek = header, panjang = konten)
+    {"type": "core_value_item", "max_words": 9,
+     "keywords": ["HUMBLE", "CUSTOMER FOCUSED", "EMPLOYEE SATISFACTION", "SPEED", "PASSION", "INTEGRITY", "DISCIPLINE"]},
+    {"type": "core_value_content",
+     "keywords": ["HUMBLE", "CUSTOMER FOCUSED", "EMPLOYEE SATISFACTION", "SPEED", "PASSION", "INTEGRITY", "DISCIPLINE"]},
+    # Table of Contents patterns
+    {"type": "table_of_contents", "keywords": ["DAFTAR ISI", "TABLE OF CONTENTS", "CONTENTS", "INDEX", "INDEKS"]},
+    # Chapter/Section patterns
+    {"type": "chapter", "pattern": r"^(BAB|CHAPTER|SECTION|BAGIAN)\s*\d+"},
+    {"type": "section_header", "pattern": r"^\d+\."},  # Dimulai dengan nomor
+    {"type": "subsection_header", "pattern": r"^\d+\.\d+"},  # Sub section
+    # Appendix patterns
+    {"type": "appendix", "keywords": ["APPENDIX", "LAMPIRAN", "ANNEX", "ATTACHMENT"]},
+    # General important sections
+    {"type": "purpose_statement",
+     "keywords": ["PURPOSE", "TUJUAN", "VISION", "VISI", "MISSION", "MISI",
+                  "OBJECTIVE", "SASARAN", "GOAL", "TARGET", "INTRODUCTION",
+                  "PENDAHULUAN", "OVERVIEW", "RINGKASAN", "SUMMARY",
+                  "CONCLUSION", "KESIMPULAN", "RECOMMENDATION", "REKOMENDASI"]},
+    # Procedure/Process + Policy/Rule patterns
+    {"type": "detailed_content",
+     "keywords": ["PROCEDURE", "PROSEDUR", "PROCESS", "PROSES", "WORKFLOW",
+                  "LANGKAH", "TAHAP", "STEPS", "CARA",
+                  "POLICY", "KEBIJAKAN", "RULE", "ATURAN", "REGULATION",
+                  "REGULASI", "GUIDELINE", "PANDUAN"]},
+    # Long detailed content
+    {"type": "detailed_content", "min_words": 101},
+    # Table content detection
+    {"type": "table_content", "keywords": ["|", ":", "─", "┌", "└"]},
+]
+
+_CLASSIFIER_RULE_KEYS = {"type", "roles", "keywords", "pattern", "min_words", "max_words"}
+
+
+class ContentClassifier:
+    """
+    Klasifikasi jenis paragraf dengan rule dari config, disiapkan sekali saat init.
+
+    Keyword semua rule dicek sekali per paragraf lewat keyword-set lookup: keyword tanpa spasi
+    hanya bisa muncul di dalam satu token (teks uppercase di-split per whitespace), jadi
+    token -> keyword group yang dikandungnya cukup dihitung sekali per token unik dan
+    di-cache, sehingga per paragraf sisanya hanya operasi set. Keyword berspasi (mis. "CORE
+    VALUES") dicek dengan substring, hanya bila ada token yang berakhiran kata pertamanya.
+    Rule lalu dievaluasi berurutan terhadap himpunan group yang ditemukan.
+    """
+
+    TOKEN_CACHE_SIZE = 100_000
+
+    def __init__(self, rules: List[Dict[str, Any]], default: str = "content"):
+        self.default = default
+        self.rules = rules
+
+        groups: Dict[Tuple[str, ...], int] = {}
+        self._rules = []
+        for index, rule in enumerate(rules):
+            unknown = set(rule) - _CLASSIFIER_RULE_KEYS
+            if unknown or not rule.get("type"):
+                raise ValueError(f"Invalid classifier rule #{index}: {rule}")
+
+            keywords = tuple(k.upper() for k in rule.get("keywords") or ())
+            self._rules.append((
+                rule["type"],
+                tuple(role.lower() for role in rule.get("roles") or ()),
+                groups.setdefault(keywords, len(groups)) if keywords else None,
+                re.compile(rule["pattern"], re.IGNORECASE) if rule.get("pattern") else None,
+                int(rule["min_words"]) if rule.get("min_words") is not None else None,
+                int(rule["max_words"]) if rule.get("max_words") is not None else None,
+            ))
+
+        # Paragraf tanpa role dan tanpa keyword (mayoritas) hanya perlu rule pattern / jumlah kata
+        self._plain_rules = [rule for rule in self._rules if not rule[1] and rule[2] is None]
+
+        keywords = [(keyword, group) for key, group in groups.items() for keyword in key]
+        self._token_keywords = [(k, g) for k, g in keywords if k.split() == [k]]
+        # Keyword berspasi "A B" hanya bisa muncul bila ada token yang berakhiran "A";
+        # yang diawali whitespace (atau kosong) selalu dicek
+        self._phrase_keywords = [
+            (k, g, k.split()[0] if k[:1].strip() else None) for k, g in keywords if k.split() != [k]
+        ]
+        self._always_phrases = [(k, g) for k, g, head in self._phrase_keywords if head is None]
+        # Cache token -> (group keyword di dalam token, index phrase yang bisa dimulai dari token ini)
+        # dibaca sebagai satu snapshot supaya reset cache dari thread lain tidak tercampur
+        self._token_cache: Tuple[set, Dict[str, Tuple[List[int], List[int]]]] = (set(), {})
+        self._lock = threading.Lock()
+
+    def _keyword_groups(self, text: str) -> set:
+        """Index keyword group yang keyword-nya muncul (substring, case-insensitive) di teks."""
+        upper = text.upper()
+        tokens = upper.split()
+
+        # Token baru dicek sekali terhadap semua keyword; sesudahnya cukup operasi set
+        seen, token_hits = self._token_cache
+        if not seen.issuperset(tokens):
+            with self._lock:
+                seen, token_hits = self._token_cache
+                unseen = set(tokens) - seen
+                if len(seen) + len(unseen) > self.TOKEN_CACHE_SIZE:
+                    seen, token_hits = set(), {}
+                    unseen = set(tokens)
+                for token in unseen:
+                    token_groups = [g for k, g in self._token_keywords if k in token]
+                    phrases = [i for i, (_, _, head) in enumerate(self._phrase_keywords) if head and token.endswith(head)]
+                    if token_groups or phrases:
+                        token_hits[token] = (token_groups, phrases)
+                seen |= unseen
+                self._token_cache = (seen, token_hits)
+
+        found = set()
+        for token in token_hits.keys() & tokens:
+            token_groups, phrases = token_hits[token]
+            found.update(token_groups)
+            for i in phrases:
+                keyword, group, _ = self._phrase_keywords[i]
+                if group not in found and keyword in upper:
+                    found.add(group)
+        for keyword, group in self._always_phrases:
+            if group not in found and keyword in upper:
+                found.add(group)
+        return found
+
+    def classify(self, text: str, role: Optional[str] = None) -> str:
+        found = self._keyword_groups(text)
+        role = role.lower() if role else ""
+        stripped, words = None, None
+        rules = self._rules if found or role else self._plain_rules
+        for content_type, roles, group, pattern, min_words, max_words in rules:
+            if roles and not any(r in role for r in roles):
+                continue
+            if group is not None and group not in found:
+                continue
+            if pattern is not None:
+                if stripped is None:
+                    stripped = text.strip()
+                if not pattern.match(stripped):
+                    continue
+            if min_words is not None or max_words is not None:
+                if words is None:
+                    words = len(text.split())
+                if (min_words is not None and words < min_words) or (max_words is not None and words > max_words):
+                    continue
+            return content_type
+        return self.default
+
+    @classmethod
+    def from_config(cls, path: str) -> "ContentClassifier":
+        """Load rule dari file JSON: {"default": "content", "rules": [...]} atau list rule saja."""
+        with open(path, "r", encoding="utf-8") as fp:
+            config = json.load(fp)
+        if isinstance(config, list):
+            return cls(config)
+        return cls(config["rules"], default=config.get("default", "content"))
+
+
+def _load_content_classifier() -> ContentClassifier:
+    """Rule dari content-classifier-rules (file JSON) bila di-set, selain itu rule bawaan."""
+    path = settings.content_classifier_rules
+    if path:
+        try:
+            classifier = ContentClassifier.from_config(path)
+            print(f"✅ Content classifier rules loaded from {path}")
+            return classifier
+        except Exception as e:
+            print(f"⚠️ Could not load classifier rules from {path}, using defaults: {e}")
+    return ContentClassifier(DEFAULT_CLASSIFIER_RULES)
+
+
+content_classifier = _load_content_classifier()
+
+
+def _classify_content_type(text: str, role: Optional[str] = None) -> str:
+    """FIXED: Klasifikasi jenis konten dengan deteksi core values yang lebih baik."""
+    return content_classifier.classify(text, role)
+
+# === Cost-optimized intelligent chunking strategy ===
+CORE_VALUES_KEYWORDS = ["humble", "customer focused", "employee satisfaction",
+                        "speed", "passion", "integrity", "discipline"]
+
+# === Chunking profiles ===
+# Profil dipilih per dokumen saat indexing (chunking-profile, chunking-profile-prefixes) dan
+# namanya disimpan di payload (chunking_profile), sehingga dokumen di-chunk ulang bila profilnya
+# berganti. content_types berisi override per content type section (atau "table").
+#
+# Keyword group: section yang cocok (section_types = substring type, header_keywords = substring
+# header, keywords/section_keywords = substring isi) ditahan lalu digabung jadi satu chunk
+# "<name>_comprehensive"; paragraf section lain yang menyebut >= min_mentions keywords ikut masuk.
+DEFAULT_KEYWORD_GROUPS: List[Dict[str, Any]] = [
+    {
+        "name": "core_values",
+        "section_types": ["core"],
+        "header_keywords": ["core"],
+        "keywords": CORE_VALUES_KEYWORDS,
+        "section_keywords": ["core values"],
+        "min_mentions": 2,
+    },
+]
+
+CHUNKING_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Chunk besar untuk cost storage rendah (perilaku sebelum ada profil)
+    "default": {
+        "target_tokens": 3500, "max_tokens": 0, "overlap_tokens": 0, "snap_sentences": False,
+        "table_target_tokens": None, "table_split_tokens": 5000,
+        "keyword_groups": DEFAULT_KEYWORD_GROUPS, "content_types": {},
+    },
+    "balanced": {
+        "target_tokens": 1500, "max_tokens": 2500, "overlap_tokens": 150, "snap_sentences": True,
+        "table_target_tokens": 800, "table_split_tokens": 2500,
+        "keyword_groups": DEFAULT_KEYWORD_GROUPS, "content_types": {},
+    },
+    # Chunk kecil: prompt rag_answer jauh lebih pendek, jumlah point lebih banyak
+    "compact": {
+        "target_tokens": 700, "max_tokens": 1000, "overlap_tokens": 80, "snap_sentences": True,
+        "table_target_tokens": 400, "table_split_tokens": 1000,
+        "keyword_groups": DEFAULT_KEYWORD_GROUPS,
+        "content_types": {"purpose_statement": {"target_tokens": 1000}},
+    },
+}
+
+_CHUNKING_PROFILE_KEYS = set(CHUNKING_PROFILES["default"])
+_KEYWORD_GROUP_KEYS = {"name", "section_types", "header_keywords", "keywords", "section_keywords", "min_mentions"}
+
+
+def _load_chunking_profiles() -> Dict[str, Dict[str, Any]]:
+    """Profil bawaan + profil dari chunking-profiles-path (JSON {name: {...}}, key yang tidak
+    di-set diwarisi dari profil bawaan bernama sama atau "default")."""
+    profiles = dict(CHUNKING_PROFILES)
+    path = settings.chunking_profiles_path
+    if not path:
+        return profiles
+
+    try:
+        with open(path, "r", encoding="utf-8") as fp:
+            config = json.load(fp)
+        loaded = {}
+        for name, overrides in config.items():
+            unknown = set(overrides) - _CHUNKING_PROFILE_KEYS
+            for group in overrides.get("keyword_groups") or []:
+                unknown |= set(group) - _KEYWORD_GROUP_KEYS
+                if not group.get("name"):
+                    unknown.add("keyword_groups.name")
+            if unknown:
+                raise ValueError(f"profile '{name}': unknown keys {sorted(unknown)}")
+            loaded[name] = dict(profiles.get(name, profiles["default"]), **overrides)
+        profiles.update(loaded)
+        print(f"✅ Chunking profiles loaded from {path}: {sorted(loaded)}")
+    except Exception as e:
+        print(f"⚠️ Could not load chunking profiles from {path}, using built-in profiles: {e}")
+    return profiles
+
+
+chunking_profiles = _load_chunking_profiles()
+
+
+def _parse_profile_prefixes(spec: str) -> List[Tuple[str, str]]:
+    """"sop/=default,finance/=compact" -> [(prefix, profile)], prefix terpanjang lebih dulu."""
+    pairs = []
+    for item in (spec or "").split(","):
+        prefix, sep, name = item.strip().partition("=")
+        if not sep:
+            continue
+        if name.strip() not in chunking_profiles:
+            print(f"⚠️ Unknown chunking profile '{name.strip()}' for prefix '{prefix.strip()}', ignored")
+            continue
+        pairs.append((prefix.strip(), name.strip()))
+    return sorted(pairs, key=lambda pair: len(pair[0]), reverse=True)
+
+
+_chunking_profile_prefixes = _parse_profile_prefixes(settings.chunking_profile_prefixes)
+
+
+def chunking_profile_for(blob_name: str) -> str:
+    """Nama profil chunking untuk satu blob (prefix paling spesifik, lalu chunking-profile)."""
+    for prefix, name in _chunking_profile_prefixes:
+        if blob_name.startswith(prefix):
+            return name
+    return settings.chunking_profile if settings.chunking_profile in chunking_profiles else "default"
+
+
+def _profile_params(profile: Union[str, Dict[str, Any], None], content_type: str) -> Dict[str, Any]:
+    """Parameter chunking efektif untuk satu content type (profil + override content_types)."""
+    if not isinstance(profile, dict):
+        profile = chunking_profiles.get(profile or "default", chunking_profiles["default"])
+    override = (profile.get("content_types") or {}).get(content_type)
+    return dict(profile, **override) if override else profile
+
+
+def _keyword_mentions(content: str, keywords: List[str]) -> int:
+    content_lower = content.lower()
+    return sum(1 for keyword in keywords if keyword in content_lower)
+
+
+def _keyword_group_matches(section: Dict[str, Any], group: Dict[str, Any]) -> bool:
+    """Section yang cocok dengan keyword group dikumpulkan jadi satu chunk komprehensif."""
+    section_type = section.get("type", "")
+    header = section.get("header", "").lower()
+    if any(t in section_type for t in group.get("section_types") or []):
+        return True
+    if any(h in header for h in group.get("header_keywords") or []):
+        return True
+
+    # Check content parts for group keywords
+    keywords = list(group.get("keywords") or []) + list(group.get("section_keywords") or [])
+    for part in section.get("content_parts", []):
+        content = part.get("content", "").lower()
+        if any(keyword in content for keyword in keywords):
+            return True
+    return False
+
+
+def _table_rows(table: Dict[str, Any]) -> Tuple[List[str], List[int], List[List[str]]]:
+    """Baris tabel: (lines, token per line, nilai cell per baris).
+
+    Diambil dari TableGrid bila ada (element segar); element dari extraction cache hanya
+    punya content, jadi cell dipecah lagi dari " | ".
+    """
+    grid = table.get("grid")
+    if grid is not None:
+        cells = list(grid.rows())
+        lines = [" | ".join(values) for values in cells]
+    else:
+        lines = table["content"].split("\n")
+        cells = [line.split(" | ") for line in lines]
+
+    # Token per baris dari _table_element; hitung ulang (sekali, batched) bila tidak cocok
+    # (entry cache lama, atau sel yang berisi newline)
+    row_tokens = table.get("row_tokens")
+    if not row_tokens or len(row_tokens) != len(lines):
+        row_tokens = tiktoken_lens(lines)
+    return lines, row_tokens, cells
+
+
+def _row_keys(headers: List[str], width: int) -> List[str]:
+    """Nama kolom untuk payload per baris; header kosong/duplikat diganti col_<n>."""
+    keys, seen = [], set()
+    for idx in range(width):
+        key = headers[idx] if idx < len(headers) else ""
+        if not key or key in seen:
+            key = f"col_{idx + 1}"
+        seen.add(key)
+        keys.append(key)
+    return keys
+
+
+def _table_row_chunks(table: Dict[str, Any], target_tokens: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Mode table-chunk-mode=rows: tabel dipecah jadi kelompok baris (header diulang di tiap
+    kelompok) sampai target_tokens (default table-chunk-target-tokens), dengan data baris terstruktur di payload
+    (table_rows, row_start/row_end, total_rows).
+
+    Tabel tanpa baris data (hanya header) jadi satu chunk tabel biasa tanpa metadata baris.
+
+    Opt-in (table-row-points-max-rows > 0): tabel kecil juga mendapat satu point per baris
+    ("Header: nilai | ...") untuk pertanyaan lookup ("berapa biaya untuk item X"). Baris
+    tersebut juga ada di chunk kelompok barisnya, jadi ikut bersaing di slot rerank.
+    """
+    lines, row_tokens, cells = _table_rows(table)
+    if not lines:
+        return []
+
+    headers = table["headers"]
+    total_rows = len(lines) - 1
+    if total_rows == 0:
+        return [{
+            "content": f"=== TABLE ===\n{table['content']}",
+            "type": "table",
+            "metadata": {
+                "table_id": table["table_id"],
+                "headers": headers,
+                "row_count": table.get("row_count", 0),
+            },
+            "tokens": table["tokens"]
+        }]
+    target = max(target_tokens or settings.table_chunk_target_tokens, 1)
+    header_line, header_tokens = lines[0], row_tokens[0]
+
+    # Kelompok baris data [start, end) secara greedy; token newline dihitung per baris
+    groups = []
+    start, current = 1, header_tokens
+    for idx in range(1, len(lines)):
+        if idx > start and current + 1 + row_tokens[idx] > target:
+            groups.append((start, idx, current))
+            start, current = idx, header_tokens
+        current += 1 + row_tokens[idx]
+    groups.append((start, len(lines), current))
+
+    chunks = []
+    for part, (first, end, tokens) in enumerate(groups, 1):
+        if len(groups) == 1:
+            # Tabel muat satu chunk: format sama dengan mode blob (ID chunk tetap stabil)
+            title = "=== TABLE ==="
+        else:
+            title = f"=== TABLE (Rows {first}-{end - 1} of {total_rows}) ==="
+        metadata = {
+            "table_id": table["table_id"],
+            "headers": headers,
+            "row_count": table.get("row_count", 0),
+            "row_start": first,
+            "row_end": end - 1,
+            "total_rows": total_rows,
+            "table_rows": cells[first:end],
+        }
+        if len(groups) > 1:
+            metadata.update(is_partial_table=True, part=part, total_parts=len(groups))
+        chunks.append({
+            "content": "\n".join([title, header_line] + lines[first:end]),
+            "type": "table",
+            "metadata": metadata,
+            "tokens": tokens,
+        })
+
+    max_rows = settings.table_row_points_max_rows
+    if headers and 0 < total_rows <= max_rows:
+        row_texts, row_payloads = [], []
+        for idx in range(1, len(lines)):
+            keys = _row_keys(headers, len(cells[idx]))
+            row = {key: value for key, value in zip(keys, cells[idx]) if value}
+            if not row:
+                continue
+            row_texts.append(" | ".join(f"{key}: {value}" for key, value in row.items()))
+            row_payloads.append((idx, row))
+
+        for text, tokens, (idx, row) in zip(row_texts, tiktoken_lens(row_texts), row_payloads):
+            chunks.append({
+                "content": f"=== TABLE ROW ({idx} of {total_rows}) ===\n{text}",
+                "type": "table_row",
+                "metadata": {
+                    "table_id": table["table_id"],
+                    "headers": headers,
+                    "row_index": idx,
+                    "total_rows": total_rows,
+                    "row": row,
+                },
+                "tokens": tokens,
+            })
+
+    return chunks
+
+
+def _table_chunks(table: Dict[str, Any], params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Tabel jadi chunk terpisah (mode rows: kelompok baris; blob: tabel utuh, dipecah bila besar)."""
+    params = params or _profile_params("default", "table")
+    if settings.table_chunk_mode != "blob":
+        return _table_row_chunks(table, params.get("table_target_tokens"))
+
+    if table["tokens"] > params["table_split_tokens"]:
+        return _split_large_table(table, params["table_split_tokens"])
+
+    return [{
+        "content": f"=== TABLE ===\n{table['content']}",
+        "type": "table",
+        "metadata": {
+            "table_id": table["table_id"],
+            "headers": table["headers"],
+            "row_count": table.get("row_count", 0),
+        },
+        "tokens": table["tokens"]
+    }]
+
+
+def _iter_intelligent_chunks(
+    elements: Iterator[Tuple[str, Dict[str, Any]]],
+    profile: Union[str, Dict[str, Any], None] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming chunker: konsumsi element dari _iter_docint_elements dan yield chunk begitu
+    satu section/tabel selesai diproses, dengan ukuran chunk dari profil chunking.
+
+    Hanya section keyword group (mis. core values, + paragraf lain yang menyebut beberapa
+    keyword sekaligus) yang ditahan sampai semua section lewat, lalu dikeluarkan sebagai
+    satu chunk komprehensif per group sebelum chunk tabel. Duplikat dalam satu dokumen
+    di-skip (cost optimization).
+    """
+    if not isinstance(profile, dict):
+        profile = chunking_profiles.get(profile or "default", chunking_profiles["default"])
+    groups = profile.get("keyword_groups") or []
+    seen_hashes = set()
+    group_sections: List[List[Dict[str, Any]]] = [[] for _ in groups]
+    group_scattered: List[List[Dict[str, Any]]] = [[] for _ in groups]
+    groups_done = False
+
+    def unique(chunks):
+        for chunk in chunks:
+            content_hash = _chunk_content_hash(chunk["content"])
+            if content_hash not in seen_hashes:
+                seen_hashes.add(content_hash)
+                yield chunk
+
+    def keyword_group_chunks():
+        nonlocal groups_done
+        groups_done = True
+        chunks = [
+            _create_keyword_group_chunk(group, sections, scattered)
+            for group, sections, scattered in zip(groups, group_sections, group_scattered)
+        ]
+        return [chunk for chunk in chunks if chunk]
+
+    for kind, data in elements:
+        if kind == "section":
+            matched = next((i for i, group in enumerate(groups) if _keyword_group_matches(data, group)), None)
+            if matched is not None:
+                group_sections[matched].append(data)
+                continue
+
+            for group, scattered in zip(groups, group_scattered):
+                scattered.extend(
+                    part for part in data.get("content_parts", [])
+                    # Contains multiple group keywords
+                    if _keyword_mentions(part.get("content", ""), group.get("keywords") or []) >= group.get("min_mentions", 2)
+                )
+            yield from unique(_process_section_intelligently(data, _profile_params(profile, data.get("type", ""))))
+        else:
+            # Section selalu mendahului tabel: chunk keyword group sudah lengkap di sini
+            if not groups_done:
+                yield from unique(keyword_group_chunks())
+            yield from unique(_table_chunks(data, _profile_params(profile, "table")))
+
+    if not groups_done:
+        yield from unique(keyword_group_chunks())
+
+
+def _create_intelligent_chunks(doc_data: Dict[str, List[Dict]], profile: Optional[str] = None) -> List[Dict[str, Any]]:
+    """FIXED: Create chunks dengan special handling untuk core values."""
+    return list(_iter_intelligent_chunks(_doc_data_elements(doc_data), profile))
+
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+(?=\S)")
+
+
+def _token_windows(text: str, size: int) -> List[Dict[str, Any]]:
+    """Potong teks per `size` token (fallback bila satu kalimat pun melebihi target)."""
+    tokens = tokenizer.encode(text)
+    return [
+        {"content": tokenizer.decode(tokens[i:i + size]), "tokens": len(tokens[i:i + size])}
+        for i in range(0, len(tokens), size)
+    ]
+
+
+def _split_part(part: Dict[str, Any], size: int, snap_sentences: bool) -> List[Dict[str, Any]]:
+    """Pecah satu paragraf terlalu besar jadi potongan <= size token (di batas kalimat bila snap)."""
+    if not snap_sentences:
+        return _token_windows(part["content"], size)
+
+    sentences = _SENTENCE_BOUNDARY.split(part["content"])
+    pieces, current, current_tokens = [], [], 0
+    for sentence, tokens in zip(sentences, tiktoken_lens(sentences)):
+        if tokens > size:
+            if current:
+                pieces.append({"content": " ".join(current), "tokens": current_tokens})
+                current, current_tokens = [], 0
+            pieces.extend(_token_windows(sentence, size))
+            continue
+        if current and current_tokens + tokens > size:
+            pieces.append({"content": " ".join(current), "tokens": current_tokens})
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        pieces.append({"content": " ".join(current), "tokens": current_tokens})
+    return pieces
+
+
+def _overlap_tail(parts: List[Dict[str, Any]], overlap: int, snap_sentences: bool) -> List[Dict[str, Any]]:
+    """Ekor chunk sebelumnya (<= overlap token) yang diulang di awal chunk berikutnya.
+
+    Paragraf utuh diambil dari belakang selama muat (paragraf pertama tidak, supaya chunk
+    berikutnya tidak sama persis); sisanya diisi kalimat terakhir (snap_sentences) atau
+    token terakhir dari paragraf yang tidak muat.
+    """
+    carry, remaining = [], overlap
+    for idx in range(len(parts) - 1, -1, -1):
+        part = parts[idx]
+        if idx > 0 and part["tokens"] <= remaining:
+            carry.insert(0, part)
+            remaining -= part["tokens"]
+            continue
+
+        if snap_sentences:
+            sentences = _SENTENCE_BOUNDARY.split(part["content"])
+            tail, tail_tokens = [], 0
+            for sentence, tokens in zip(reversed(sentences[1:]), reversed(tiktoken_lens(sentences[1:]))):
+                if tail_tokens + tokens > remaining:
+                    break
+                tail.insert(0, sentence)
+                tail_tokens += tokens
+            if tail:
+                carry.insert(0, {"content": " ".join(tail), "tokens": tail_tokens})
+        elif remaining > 0:
+            tokens = tokenizer.encode(part["content"])
+            if len(tokens) > remaining:
+                carry.insert(0, {"content": tokenizer.decode(tokens[-remaining:]), "tokens": remaining})
+        break
+    return carry
+
+
+def _process_section_intelligently(section: Dict[str, Any], params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Process section sesuai profil chunking (default: chunk besar untuk reduce storage cost).
+
+    params: target_tokens, max_tokens (paragraf lebih besar dipecah; 0 = tidak dibatasi),
+    overlap_tokens (paragraf terakhir chunk sebelumnya diulang di chunk berikutnya),
+    snap_sentences (paragraf dipecah di batas kalimat, bukan di tengah kalimat).
+    """
+    params = params or _profile_params("default", section.get("type", ""))
+    chunks = []
+    section_header = section["header"]
+    content_parts = section["content_parts"]
+    target_chunk_size = params["target_tokens"]
+
+    # Jika section kecil atau medium, jadikan satu chunk
+    if section["total_tokens"] <= target_chunk_size:
+        full_content = f"=== {section_header} ===\n"
+        full_content += "\n\n".join([part["content"] for part in content_parts])
+        
+        chunks.append({
+            "content": full_content,
+            "type": section["type"],
+            "metadata": {
+                "section_header": section_header,
+                "section_id": section["section_id"],
+                "is_complete_section": True
+            },
+            "tokens": section["total_tokens"]
+        })
+        return chunks
+
+    overlap = params["overlap_tokens"]
+    header_tokens = _section_header_tokens(section_header)
+
+    # Paragraf yang melebihi max_tokens (atau target, bila snap_sentences) dipecah dulu;
+    # ukuran potongan menyisakan ruang untuk header dan overlap
+    split_above = params["max_tokens"] or (target_chunk_size if params["snap_sentences"] else 0)
+    if split_above:
+        piece_size = max(target_chunk_size - header_tokens - overlap, 1)
+        units = []
+        for part in content_parts:
+            if part["tokens"] > split_above:
+                units.extend(_split_part(part, piece_size, params["snap_sentences"]))
+            else:
+                units.append(part)
+    else:
+        units = content_parts
+
+    current_chunk_parts = []
+    current_tokens = header_tokens
+
+    def emit():
+        chunk_content = f"=== {section_header} ===\n"
+        chunk_content += "\n\n".join([p["content"] for p in current_chunk_parts])
+        chunks.append({
+            "content": chunk_content,
+            "type": section["type"],
+            "metadata": {
+                "section_header": section_header,
+                "section_id": section["section_id"],
+                "is_partial_section": True,
+                "chunk_part": len(chunks) + 1
+            },
+            "tokens": current_tokens
+        })
+
+    for part in units:
+        if current_tokens + part["tokens"] > target_chunk_size:
+            carry = []
+            if current_chunk_parts:
+                emit()
+                carry = _overlap_tail(current_chunk_parts, overlap, params["snap_sentences"]) if overlap else []
+                if header_tokens + sum(p["tokens"] for p in carry) + part["tokens"] > target_chunk_size:
+                    carry = []
+
+            # Start new chunk
+            current_chunk_parts = carry + [part]
+            current_tokens = header_tokens + sum(p["tokens"] for p in current_chunk_parts)
+        else:
+            current_chunk_parts.append(part)
+            current_tokens += part["tokens"]
+
+    # Add final chunk if exists
+    if current_chunk_parts:
+        emit()
+
+    return chunks
+
+def _create_keyword_group_chunk(
+    group: Dict[str, Any],
+    sections: List[Dict],
+    scattered_parts: List[Dict],
+) -> Optional[Dict[str, Any]]:
+    """Gabungkan semua section satu keyword group (mis. core values) jadi satu chunk komprehensif.
+
+    scattered_parts: paragraf dari section lain yang menyebut beberapa keyword sekaligus.
+    """
+    if not sections:
+        return None
+
+    name = group["name"]
+    header_keywords = group.get("header_keywords") or []
+    all_content = []
+    total_tokens = 0
+
+    # Collect all group content
+    for section in sections:
+        section_header = section.get("header", "")
+        if section_header and any(h in section_header.lower() for h in header_keywords):
+            all_content.append(f"=== {section_header} ===")
+        
+        for part in section.get("content_parts", []):
+            content = part.get("content", "")
+            if content:
+                all_content.append(content)
+                total_tokens += part.get("tokens", 0)
+    
+    # Also include scattered group content from other sections
+    for part in scattered_parts:
+        content = part.get("content", "")
+        all_content.append(content)
+        total_tokens += part["tokens"] if "tokens" in part else tiktoken_len(content)
+    
+    if not all_content:
+        return None
+    
+    return {
+        "content": "\n\n".join(all_content),
+        "type": f"{name}_comprehensive",
+        "metadata": {
+            f"is_{name}": True,
+            "is_comprehensive": True,
+            "content_type": f"{name}_comprehensive",
+            "keyword_group": name
+        },
+        "tokens": total_tokens
+    }
+
+def _split_large_table(table: Dict[str, Any], target_size: int = 5000) -> List[Dict[str, Any]]:
+    """Split table besar dengan preserve headers dan target size yang lebih besar."""
+    chunks = []
+    lines, line_tokens_list, _ = _table_rows(table)
+    headers = lines[0] if lines else ""
+    header_tokens = line_tokens_list[0] if lines else 0
+    
+    current_chunk_lines = [headers]  # Always include headers
+    current_tokens = header_tokens
+    
+    for line, line_tokens in zip(lines[1:], line_tokens_list[1:]):  # Skip header line
+        if current_tokens + line_tokens > target_size:
+            # Create chunk
+            chunk_content = f"=== TABLE (Part {len(chunks) + 1}) ===\n"
+            chunk_content += "\n".join(current_chunk_lines)
+            
+            chunks.append({
+                "content": chunk_content,
+                "type": "table",
+                "metadata": {
+                    "table_id": table["table_id"],
+                    "headers": table["headers"],
+                    "is_partial_table": True,
+                    "part": len(chunks) + 1,
+                    "row_count": table.get("row_count", 0),
+                    "total_parts": None
+                },
+                "tokens": current_tokens
+            })
+            
+            # Start new chunk with headers
+            current_chunk_lines = [headers, line]
+            current_tokens = header_tokens + line_tokens
+        else:
+            current_chunk_lines.append(line)
+            current_tokens += line_tokens
+    
+    # Add final chunk
+    if len(current_chunk_lines) > 1:  # More than just headers
+        chunk_content = f"=== TABLE (Part {len(chunks) + 1}) ===\n"
+        chunk_content += "\n".join(current_chunk_lines)
+        
+        chunks.append({
+            "content": chunk_content,
+            "type": "table",
+            "metadata": {
+                "table_id": table["table_id"],
+                "headers": table["headers"],
+                "is_partial_table": True,
+                "part": len(chunks) + 1,
+                "row_count": table.get("row_count", 0),
+                "total_parts": None
+            },
+            "tokens": current_tokens
+        })
+    for chunk in chunks:
+        chunk["metadata"]["total_parts"] = len(chunks)
+    
+    return chunks
+
+def _chunk_content_hash(text: str) -> str:
+    """MD5 isi chunk: dipakai untuk dedup dan sebagai key embedding cache."""
+    return hashlib.md5(text.encode()).hexdigest()
@@ -4,10 +4,14 @@ from azure.storage.blob import BlobServiceClient, ContentSettings
 import os
 from typing import List, Dict, Any, Optional, Set
 import json
+import re
 import uuid
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Impor Klien Qdrant & Model ---
-from internal_assistant_core import blob_container, settings, qdrant_client
+from internal_assistant_core import blob_container, settings, qdrant_client, resolve_qdrant_collection
 from qdrant_client.http.models import (
     Filter, 
     FieldCondition, 
@@ -15,9 +19,12 @@ from qdrant_client.http.models import (
     PointsSelector, 
     PointIdsList,
     ScrollRequest,
-    MatchText
+    MatchText,
+    MatchAny,
+    FilterSelector
 )
 from qdrant_client.http import models as qdrant_models
+from qdrant_profiles import COLLECTION_PROFILES, _collection_profile_config, iter_qdrant_points
 
 def _detect_mime(path: str) -> str:
     """Detect MIME type from file extension (TETAP SAMA)"""
@@ -38,26 +45,37 @@ def _detect_mime(path: str) -> str:
 # FUNGSI UPLOAD & INDEXING - FIXED!
 # ==============================================
 
-def upload_file_to_blob(file_path: str, blob_name: str, blob_container) -> Dict[str, Any]:
-    """Upload single file to Azure Blob Storage (TETAP SAMA)"""
+def _stream_size(stream) -> int:
+    """Ukuran file object tanpa membacanya ke memori."""
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+def upload_file_to_blob(file_path: str, blob_name: str, blob_container, max_concurrency: Optional[int] = None) -> Dict[str, Any]:
+    """Upload single file to Azure Blob Storage (streamed dari disk, tidak dibaca utuh ke memori)"""
+    started = time.perf_counter()
     try:
-        with open(file_path, "rb") as fp:
-            data = fp.read()
-        
         content_type = _detect_mime(file_path)
         blob_client = blob_container.get_blob_client(blob_name)
+        size = os.path.getsize(file_path)
         
-        blob_client.upload_blob(
-            data,
-            overwrite=True,
-            content_settings=ContentSettings(content_type=content_type),
-        )
+        with open(file_path, "rb") as fp:
+            blob_client.upload_blob(
+                fp,
+                length=size,
+                overwrite=True,
+                content_settings=ContentSettings(content_type=content_type),
+                max_concurrency=max_concurrency or settings.blob_upload_max_concurrency,
+            )
         
         return {
             "success": True,
             "blob_name": blob_name,
-            "size": len(data),
+            "size": size,
             "content_type": content_type,
+            "seconds": round(time.perf_counter() - started, 3),
             "message": f"Successfully uploaded {blob_name}"
         }
     except Exception as e:
@@ -65,28 +83,43 @@ def upload_file_to_blob(file_path: str, blob_name: str, blob_container) -> Dict[
             "success": False,
             "blob_name": blob_name,
             "error": str(e),
+            "seconds": round(time.perf_counter() - started, 3),
             "message": f"Failed to upload {blob_name}: {str(e)}"
         }
 
-def upload_file_data_to_blob(file_data: Dict[str, Any], blob_name: str, blob_container) -> Dict[str, Any]:
-    """Upload file data directly to Azure Blob Storage"""
+def upload_file_data_to_blob(file_data: Dict[str, Any], blob_name: str, blob_container, max_concurrency: Optional[int] = None) -> Dict[str, Any]:
+    """Upload file data directly to Azure Blob Storage.
+
+    file_data berisi "data" (bytes) atau "stream" (file object, mis. spool UploadFile).
+    Stream di-upload per block langsung dari spool tanpa dibaca utuh ke memori.
+    """
+    started = time.perf_counter()
     try:
-        data = file_data["data"]
         content_type = file_data["content_type"]
-        
         blob_client = blob_container.get_blob_client(blob_name)
         
+        if "stream" in file_data:
+            data = file_data["stream"]
+            data.seek(0)
+            size = file_data.get("size") or _stream_size(data)
+        else:
+            data = file_data["data"]
+            size = len(data)
+        
         blob_client.upload_blob(
             data,
+            length=size,
             overwrite=True,
             content_settings=ContentSettings(content_type=content_type),
+            max_concurrency=max_concurrency or settings.blob_upload_max_concurrency,
         )
         
         return {
             "success": True,
             "blob_name": blob_name,
-            "size": len(data),
+            "size": size,
             "content_type": content_type,
+            "seconds": round(time.perf_counter() - started, 3),
             "message": f"Successfully uploaded {blob_name}"
         }
     except Exception as e:
@@ -94,11 +127,50 @@ def upload_file_data_to_blob(file_data: Dict[str, Any], blob_name: str, blob_con
             "success": False,
             "blob_name": blob_name,
             "error": str(e),
+            "seconds": round(time.perf_counter() - started, 3),
             "message": f"Failed to upload {blob_name}: {str(e)}"
         }
 
-def batch_upload_files(files: List, prefix: str, blob_container) -> Dict[str, Any]:
-    """Upload multiple files to blob storage - handles both file paths and file data"""
+def _upload_one(f, prefix: str, blob_container, max_concurrency: Optional[int]) -> Dict[str, Any]:
+    """Upload satu entry batch (file data dict atau file path)"""
+    try:
+        # Check if it's file data dict or file path
+        if isinstance(f, dict) and "filename" in f and ("data" in f or "stream" in f):
+            # Handle file data from FastAPI
+            fname = f["filename"]
+            blob_name = f"{prefix}{fname}"
+            upload_result = upload_file_data_to_blob(f, blob_name, blob_container, max_concurrency)
+        else:
+            # Handle file path (original logic)
+            local_path = getattr(f, "name", None) or str(f)
+            fname = os.path.basename(local_path)
+            blob_name = f"{prefix}{fname}"
+            upload_result = upload_file_to_blob(local_path, blob_name, blob_container, max_concurrency)
+        upload_result["file"] = fname
+        return upload_result
+    except Exception as e:
+        return {
+            "success": False,
+            "file": str(f),
+            "error": str(e),
+            "message": f"Failed to upload {f}: {str(e)}"
+        }
+
+def batch_upload_files(
+    files: List,
+    prefix: str,
+    blob_container,
+    parallelism: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Upload multiple files to blob storage - handles both file paths and file data.
+
+    Args:
+        parallelism: Jumlah file yang di-upload bersamaan (default settings.blob_upload_parallelism)
+        max_concurrency: Block-level parallelism per file untuk file besar
+            (default settings.blob_upload_max_concurrency)
+    """
     if not prefix.endswith("/"):
         prefix += "/"
     
@@ -115,43 +187,50 @@ def batch_upload_files(files: List, prefix: str, blob_container) -> Dict[str, An
         results["message"] = "No files provided for upload"
         return results
     
-    for f in files:
-        try:
-            # Check if it's file data dict or file path
-            if isinstance(f, dict) and "filename" in f and "data" in f:
-                # Handle file data from FastAPI
-                fname = f["filename"]
-                blob_name = f"{prefix}{fname}"
-                upload_result = upload_file_data_to_blob(f, blob_name, blob_container)
-            else:
-                # Handle file path (original logic)
-                local_path = getattr(f, "name", None) or str(f)
-                fname = os.path.basename(local_path)
-                blob_name = f"{prefix}{fname}"
-                upload_result = upload_file_to_blob(local_path, blob_name, blob_container)
-            
-            results["details"].append(upload_result)
-            
-            if upload_result["success"]:
-                results["successful_uploads"] += 1
-                results["uploaded_files"].append(blob_name)
-            else:
-                results["failed_uploads"] += 1
-                results["failed_files"].append({
-                    "file": fname,
-                    "error": upload_result["error"]
-                })
-                
-        except Exception as e:
+    parallelism = max(1, min(parallelism or settings.blob_upload_parallelism, len(files)))
+    started = time.perf_counter()
+    
+    # pool.map menjaga urutan details sesuai urutan input
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        upload_results = list(pool.map(lambda f: _upload_one(f, prefix, blob_container, max_concurrency), files))
+    
+    elapsed = time.perf_counter() - started
+    total_bytes = 0
+    latencies = []
+    for upload_result in upload_results:
+        results["details"].append(upload_result)
+        if "seconds" in upload_result:
+            latencies.append(upload_result["seconds"])
+        
+        if upload_result["success"]:
+            results["successful_uploads"] += 1
+            results["uploaded_files"].append(upload_result["blob_name"])
+            total_bytes += upload_result.get("size") or 0
+        else:
             results["failed_uploads"] += 1
             results["failed_files"].append({
-                "file": str(f),
-                "error": str(e)
+                "file": upload_result["file"],
+                "error": upload_result["error"]
             })
     
+    results["parallelism"] = parallelism
+    results["total_bytes"] = total_bytes
+    results["elapsed_seconds"] = round(elapsed, 3)
+    results["throughput_mb_per_second"] = round(total_bytes / (1024 * 1024) / elapsed, 2) if elapsed > 0 else 0.0
+    results["latency_seconds"] = {
+        "avg": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "max": max(latencies) if latencies else 0.0,
+    }
     results["message"] = f"Upload completed: {results['successful_uploads']} successful, {results['failed_uploads']} failed"
     return results
 
+def _point_source(point) -> Optional[str]:
+    """Ambil source dari payload (metadata.source, fallback ke source langsung)."""
+    payload = point.payload or {}
+    metadata = payload.get('metadata', {})
+    source_metadata = metadata.get('source') if isinstance(metadata, dict) else None
+    return source_metadata or payload.get('source')
+
 def get_indexed_documents_in_qdrant(settings, qdrant_client) -> Set[str]:
     """
     🔧 BARU: Mendapatkan daftar semua dokumen yang sudah diindeks di Qdrant.
@@ -162,24 +241,15 @@ def get_indexed_documents_in_qdrant(settings, qdrant_client) -> Set[str]:
         
         indexed_sources = set()
         
-        # Scroll through all points to get unique sources
-        results, next_offset = qdrant_client.scroll(
-            collection_name=settings.qdrant_collection,
-            limit=1000,
-            with_payload=True,
-            with_vectors=False
-        )
-        
-        for point in results:
-            # Check both direct source and metadata.source
-            source_direct = point.payload.get('source')
-            metadata = point.payload.get('metadata', {})
-            source_metadata = metadata.get('source') if isinstance(metadata, dict) else None
-            
-            if source_direct:
-                indexed_sources.add(source_direct)
-            if source_metadata:
-                indexed_sources.add(source_metadata)
+        # Scroll through all points (paginated), hanya ambil field source
+        for point in iter_qdrant_points(
+            qdrant_client,
+            settings.qdrant_collection,
+            payload_fields=["source", "metadata.source"]
+        ):
+            source = _point_source(point)
+            if source:
+                indexed_sources.add(source)
         
         print(f"📊 Found {len(indexed_sources)} unique documents already indexed:")
         for source in sorted(indexed_sources):
@@ -191,159 +261,165 @@ def get_indexed_documents_in_qdrant(settings, qdrant_client) -> Set[str]:
         print(f"❌ Error checking indexed documents: {str(e)}")
         return set()
 
-def process_and_index_documents_incremental(prefix: str = "sop/", blob_container=None, settings=None, specific_files: List[str] = None) -> Dict[str, Any]:
+def _collection_sources(qdrant_client, collection_name: str) -> Set[str]:
+    """Semua source di satu collection, termasuk dokumen tanpa point (seluruhnya near-duplicate)."""
+    from rag_modul import near_duplicate_index
+
+    sources = {
+        source
+        for point in iter_qdrant_points(qdrant_client, collection_name, payload_fields=["source", "metadata.source"])
+        for source in [_point_source(point)]
+        if source
+    }
+    sources.update(near_duplicate_index.fingerprints(collection_name))
+    return sources
+
+def get_indexed_document_fingerprints(settings, qdrant_client) -> Dict[str, Dict[str, Any]]:
+    """
+    Mendapatkan fingerprint (blob_etag, blob_md5, content_hash, chunking_profile) per dokumen di Qdrant.
+    Dokumen lama yang diindeks sebelum ada fingerprint tetap muncul dengan nilai None.
+    Dokumen yang seluruh chunk-nya di-skip sebagai near-duplicate (tanpa point) diambil dari
+    index near-duplicate.
+    """
+    fingerprints: Dict[str, Dict[str, Any]] = {}
+    fields = ["blob_etag", "blob_md5", "content_hash", "chunking_profile"]
+
+    try:
+        print("🔍 Collecting document fingerprints from Qdrant...")
+
+        for point in iter_qdrant_points(
+            qdrant_client,
+            settings.qdrant_collection,
+            payload_fields=["source", "metadata.source"] + [f"metadata.{f}" for f in fields]
+        ):
+            source = _point_source(point)
+            if not source:
+                continue
+
+            metadata = point.payload.get('metadata', {})
+            metadata = metadata if isinstance(metadata, dict) else {}
+            entry = fingerprints.setdefault(source, {f: None for f in fields})
+            for f in fields:
+                if metadata.get(f) and not entry[f]:
+                    entry[f] = metadata[f]
+            # Point dengan content_hash berbeda = indexing dokumen ini pernah terputus di tengah
+            if metadata.get("content_hash") and metadata["content_hash"] != entry["content_hash"]:
+                entry["mixed"] = True
+
+        from rag_modul import near_duplicate_index, _near_dup_namespace
+        for source, fingerprint in near_duplicate_index.fingerprints(_near_dup_namespace(settings.qdrant_collection)).items():
+            if source not in fingerprints:
+                fingerprints[source] = {f: fingerprint.get(f) for f in fields}
+
+        print(f"📊 Found fingerprints for {len(fingerprints)} indexed documents")
+        return fingerprints
+
+    except Exception as e:
+        print(f"❌ Error collecting document fingerprints: {str(e)}")
+        return {}
+
+def _chunking_profile_changed(blob_name: str, fingerprint: Dict[str, Any]) -> bool:
+    """Profil chunking blob ini berbeda dari profil saat terakhir di-index (point lama = default)."""
+    from rag_modul import chunking_profile_for
+
+    return (fingerprint.get("chunking_profile") or "default") != chunking_profile_for(blob_name)
+
+def _is_blob_unchanged(blob, fingerprint: Dict[str, Any]) -> bool:
+    """Bandingkan BlobProperties dengan fingerprint yang tersimpan di payload."""
+    from rag_modul import _blob_fingerprint
+
+    current = _blob_fingerprint(blob)
+    if fingerprint.get("mixed") or _chunking_profile_changed(blob.name, fingerprint):
+        return False
+    if fingerprint.get("blob_etag") and fingerprint["blob_etag"] == current["blob_etag"]:
+        return True
+    if fingerprint.get("blob_md5") and fingerprint["blob_md5"] == current["blob_md5"]:
+        return True
+    return False
+
+def process_and_index_documents_incremental(prefix: str = "sop/", blob_container=None, settings=None, specific_files: List[str] = None, force_reindex: bool = False, progress_callback=None) -> Dict[str, Any]:
     """
     🔧 DIPERBAIKI: Memproses dan mengindeks dokumen dengan incremental indexing.
-    Hanya mengindeks file baru atau file yang specified.
+    Hanya mengindeks file baru, file yang berubah (ETag/MD5/content hash), atau file yang specified.
     
     Args:
         prefix: Prefix untuk blob storage
         blob_container: Azure blob container
         settings: Settings object
         specific_files: List blob names spesifik yang ingin diindeks (jika ada)
+        force_reindex: Index ulang semua file di prefix tanpa cek perubahan
+        progress_callback: Dipanggil (blob_name, outcome) setiap satu file selesai
     """
     try:
         # Import RAG module
         from rag_modul import process_and_index_docs
+
+        # Payload index dipakai oleh replace-in-place (filter per source)
+        ensure_payload_indexes(settings, qdrant_client)
         
         if specific_files:
             # Mode: Index specific files only
             print(f"🎯 Mode: Indexing specific files: {specific_files}")
             
-            # Create temporary function untuk process specific files
-            def process_specific_files():
-                indexed, skipped, errors = 0, 0, []
-                total_chunks = 0
-                
-                for blob_name in specific_files:
-                    try:
-                        print(f"Processing specific file: {blob_name}")
-                        
-                        # Get blob client and content
-                        blob_client = blob_container.get_blob_client(blob_name)
-                        
-                        if not blob_client.exists():
-                            print(f"❌ Blob {blob_name} does not exist, skipping...")
-                            skipped += 1
-                            continue
-                        
-                        content_bytes = blob_client.download_blob().readall()
-                        
-                        # Extract dengan struktur yang comprehensive
-                        from rag_modul import _extract_text_with_docint, _create_intelligent_chunks, _make_safe_doc_id
-                        
-                        doc_data = _extract_text_with_docint(content_bytes)
-                        
-                        if not doc_data.get("sections") and not doc_data.get("raw_tables"):
-                            skipped += 1
-                            print(f"Skipped {blob_name}: No content extracted")
-                            continue
-
-                        # Create chunks
-                        chunks = _create_intelligent_chunks(doc_data)
-                        
-                        if not chunks:
-                            skipped += 1
-                            print(f"Skipped {blob_name}: No chunks created")
-                            continue
-
-                        # Index each chunk
-                        from internal_assistant_core import vectorstoreQ
-                        
-                        for i, chunk_data in enumerate(chunks):
-                            unique_string_id = f"{_make_safe_doc_id(blob_name)}_{i}"
-                            chunk_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, unique_string_id))
-                            
-                            base_metadata = {
-                                "source": blob_name,
-                                "chunk_index": i,
-                                "content_type": chunk_data["type"],
-                                "token_count": chunk_data["tokens"],
-                                "total_chunks": len(chunks)
-                            }
-                            
-                            base_metadata.update(chunk_data.get("metadata", {}))
-                            
-                            try:
-                                print(f"Attempting to index chunk {chunk_id} for {blob_name}...")
-                                vectorstoreQ.add_texts(
-                                    [chunk_data["content"]], 
-                                    metadatas=[base_metadata], 
-                                    ids=[chunk_id]
-                                )
-                                print(f"Successfully indexed chunk {chunk_id}.")
-                            except Exception as e:
-                                print(f"Error indexing chunk {chunk_id}: {e}")
-                                continue
-                        
-                        total_chunks += len(chunks)
-                        print(f"✅ Indexed {blob_name}: {len(chunks)} chunks")
-                        indexed += 1
-                        
-                    except Exception as e:
-                        error_msg = f"{blob_name}: {str(e)}"
-                        errors.append(error_msg)
-                        print(f"❌ Error processing {blob_name}: {e}")
-
-                return {
-                    "indexed": indexed, 
-                    "skipped": skipped, 
-                    "errors": errors,
-                    "total_chunks": total_chunks,
-                    "avg_chunks_per_doc": total_chunks / max(indexed, 1)
-                }
-            
-            index_report = process_specific_files()
+            # Index specific files lewat concurrent ingestion pipeline
+            from rag_modul import index_blobs
+            index_report = index_blobs(specific_files, progress_callback=progress_callback)
             
         else:
-            # Mode: Incremental indexing - hanya index file baru
-            print(f"🔄 Mode: Incremental indexing for prefix: '{prefix}'")
+            # Mode: Incremental indexing - hanya index file baru atau berubah
+            print(f"🔄 Mode: Incremental indexing for prefix: '{prefix}' (force={force_reindex})")
+            from rag_modul import index_blobs, _is_system_blob
             
-            # 1. Get list of indexed documents in Qdrant
-            indexed_documents = get_indexed_documents_in_qdrant(settings, qdrant_client)
+            # 1. Get fingerprints of indexed documents in Qdrant
+            fingerprints = {} if force_reindex else get_indexed_document_fingerprints(settings, qdrant_client)
             
             # 2. Get list of all documents in blob storage
             if not prefix.endswith("/"):
                 prefix += "/"
                 
-            blob_list = list(blob_container.list_blobs(name_starts_with=prefix))
-            blob_names = [b.name for b in blob_list]
+            blob_list = [b for b in blob_container.list_blobs(name_starts_with=prefix) if not _is_system_blob(b.name)]
             
-            print(f"📊 Found {len(blob_names)} documents in blob storage")
+            print(f"📊 Found {len(blob_list)} documents in blob storage")
             
-            # 3. Filter out already indexed documents
-            new_documents = []
-            for blob_name in blob_names:
-                if blob_name not in indexed_documents:
-                    new_documents.append(blob_name)
-                    print(f"🆕 New document to index: {blob_name}")
+            # 3. Filter out documents that have not changed since they were indexed
+            to_index = []
+            known_hashes = {}
+            up_to_date = 0
+            for blob in blob_list:
+                fingerprint = fingerprints.get(blob.name)
+                if fingerprint is None:
+                    to_index.append(blob.name)
+                    print(f"🆕 New document to index: {blob.name}")
+                elif _is_blob_unchanged(blob, fingerprint):
+                    up_to_date += 1
+                    print(f"⏭️  Unchanged, skipping: {blob.name}")
                 else:
-                    print(f"⏭️  Already indexed, skipping: {blob_name}")
+                    to_index.append(blob.name)
+                    # Isi sama tapi profil chunking berganti tetap harus di-chunk ulang
+                    if (fingerprint.get("content_hash") and not fingerprint.get("mixed")
+                            and not _chunking_profile_changed(blob.name, fingerprint)):
+                        known_hashes[blob.name] = fingerprint["content_hash"]
+                    print(f"♻️  Changed document to re-index: {blob.name}")
             
-            if not new_documents:
-                print("✅ No new documents to index. All documents are up to date.")
+            if not to_index:
+                print("✅ No new or changed documents to index. All documents are up to date.")
                 return {
                     "success": True,
                     "prefix": prefix,
                     "index_report": {
                         "indexed": 0,
-                        "skipped": len(blob_names),
+                        "skipped": len(blob_list),
                         "errors": [],
                         "total_chunks": 0,
-                        "message": "No new documents to index"
+                        "message": "No new or changed documents to index"
                     },
-                    "message": f"No new documents to index in {prefix}. All {len(blob_names)} documents are already indexed."
+                    "message": f"No new or changed documents to index in {prefix}. All {len(blob_list)} documents are up to date."
                 }
             
-            # 4. Index only new documents
-            print(f"🔄 Indexing {len(new_documents)} new documents...")
-            index_report = process_and_index_documents_incremental(
-                prefix=prefix, 
-                blob_container=blob_container, 
-                settings=settings, 
-                specific_files=new_documents
-            )
-            return index_report
+            # 4. Index new + changed documents (content hash dicek lagi setelah download)
+            print(f"🔄 Indexing {len(to_index)} new/changed documents...")
+            index_report = index_blobs(to_index, known_hashes=known_hashes, progress_callback=progress_callback)
+            index_report["up_to_date"] = up_to_date
         
         return {
             "success": True,
@@ -362,11 +438,11 @@ def process_and_index_documents_incremental(prefix: str = "sop/", blob_container
             "message": f"Failed to index documents: {str(e)}"
         }
 
-def process_and_index_documents(prefix: str = "sop/", blob_container=None, settings=None) -> Dict[str, Any]:
+def process_and_index_documents(prefix: str = "sop/", blob_container=None, settings=None, force_reindex: bool = False) -> Dict[str, Any]:
     """
     🔧 DIPERBAIKI: Wrapper function yang menggunakan incremental indexing.
     """
-    return process_and_index_documents_incremental(prefix, blob_container, settings)
+    return process_and_index_documents_incremental(prefix, blob_container, settings, force_reindex=force_reindex)
 
 def upload_and_index_complete_incremental(files: List, prefix: str, blob_container, settings) -> Dict[str, Any]:
     """
@@ -417,6 +493,35 @@ def upload_and_index_complete(files: List, prefix: str, blob_container, settings
     """
     return upload_and_index_complete_incremental(files, prefix, blob_container, settings)
 
+def run_indexing_job(job: Dict[str, Any], progress_callback) -> Dict[str, Any]:
+    """
+    Runner untuk IndexingJobManager.
+    Job 'files' mengindeks file tertentu, job 'prefix' menjalankan incremental indexing per prefix,
+    job 'rebuild' membangun ulang index (blue/green atau in place).
+    """
+    options = job.get("options") or {}
+    if job["kind"] == "rebuild":
+        return rebuild_qdrant_index(
+            settings,
+            qdrant_client,
+            prefix=job.get("prefix") or "",
+            mode=options.get("mode", "in_place"),
+            progress_callback=progress_callback,
+            force_swap=options.get("force_swap", False),
+            profile=options.get("profile"),
+            resume=options.get("resume", False),
+        )
+
+    specific_files = list(job.get("files") or {}) if job["kind"] == "files" else None
+    return process_and_index_documents_incremental(
+        prefix=job.get("prefix") or "",
+        blob_container=blob_container,
+        settings=settings,
+        specific_files=specific_files,
+        force_reindex=options.get("force_reindex", False),
+        progress_callback=progress_callback,
+    )
+
 # ==============================================
 # FUNGSI LISTING DOKUMEN (TETAP SAMA)
 # ==============================================
@@ -476,16 +581,8 @@ def debug_all_qdrant_sources(settings, qdrant_client) -> List[Dict[str, Any]]:
     try:
         print(f"\n🐛 DEBUG: Retrieving ALL points from Qdrant collection...")
         
-        results, next_offset = qdrant_client.scroll(
-            collection_name=settings.qdrant_collection,
-            limit=1000,
-            with_payload=True,
-            with_vectors=False
-        )
-        
         all_sources = []
-        print(f"📊 Found {len(results)} total points in collection:")
-        for i, point in enumerate(results):
+        for i, point in enumerate(iter_qdrant_points(qdrant_client, settings.qdrant_collection)):
             source_value = point.payload.get('source', 'NO_SOURCE')
             metadata = point.payload.get('metadata', {})
             metadata_source = metadata.get('source', 'NO_METADATA_SOURCE') if isinstance(metadata, dict) else 'INVALID_METADATA'
@@ -500,6 +597,7 @@ def debug_all_qdrant_sources(settings, qdrant_client) -> List[Dict[str, Any]]:
             print(f"     Direct source: '{source_value}'")
             print(f"     Metadata source: '{metadata_source}'")
             
+        print(f"📊 Found {len(all_sources)} total points in collection")
         return all_sources
         
     except Exception as e:
@@ -520,15 +618,14 @@ def search_documents_in_qdrant(blob_name: str, settings, qdrant_client) -> List[
         
         for strategy_name, qdrant_filter in strategies:
             try:
-                results, next_offset = qdrant_client.scroll(
-                    collection_name=settings.qdrant_collection,
-                    scroll_filter=qdrant_filter,
-                    limit=1000,
-                    with_payload=True,
-                    with_vectors=False
-                )
-                
-                strategy_point_ids = [point.id for point in results]
+                strategy_point_ids = [
+                    point.id for point in iter_qdrant_points(
+                        qdrant_client,
+                        settings.qdrant_collection,
+                        scroll_filter=qdrant_filter,
+                        with_payload=False
+                    )
+                ]
                 
                 if strategy_point_ids:
                     print(f"✅ Strategy '{strategy_name}' found {len(strategy_point_ids)} points")
@@ -567,6 +664,81 @@ def delete_points_from_qdrant(point_ids: List[str], settings, qdrant_client) ->
         print(f"❌ Error deleting points from Qdrant: {str(e)}")
         return False
 
+# Keyword payload index supaya filter per dokumen tidak perlu full scan
+PAYLOAD_INDEX_FIELDS = [
+    "metadata.source", "metadata.content_type", "source", "metadata.near_duplicate_of", "metadata.content_hash",
+]
+_payload_indexes_ready: Set[str] = set()
+
+def ensure_payload_indexes(settings, qdrant_client, collection_name: Optional[str] = None) -> bool:
+    """Buat keyword payload index (idempotent) sekali per collection per proses."""
+    collection_name = collection_name or settings.qdrant_collection
+    if collection_name in _payload_indexes_ready:
+        return True
+
+    try:
+        for field_name in PAYLOAD_INDEX_FIELDS:
+            qdrant_client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=qdrant_models.PayloadSchemaType.KEYWORD,
+                wait=True
+            )
+        _payload_indexes_ready.add(collection_name)
+        print(f"✅ Payload indexes ready on {collection_name}: {PAYLOAD_INDEX_FIELDS}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error creating payload indexes on {collection_name}: {str(e)}")
+        return False
+
+def _sources_filter(blob_names: List[str]) -> Filter:
+    """Filter semua point dari satu atau banyak dokumen (metadata.source atau source lama)."""
+    if len(blob_names) == 1:
+        match = MatchValue(value=blob_names[0])
+    else:
+        match = MatchAny(any=list(blob_names))
+
+    return Filter(should=[
+        FieldCondition(key="metadata.source", match=match),
+        FieldCondition(key="source", match=match),
+    ])
+
+def delete_points_by_source(blob_names: List[str], settings, qdrant_client) -> int:
+    """
+    Hapus semua point milik dokumen-dokumen ini dengan satu filter-selector delete.
+    Return jumlah point yang terhapus.
+    """
+    if not blob_names:
+        return 0
+
+    ensure_payload_indexes(settings, qdrant_client)
+    qdrant_filter = _sources_filter(blob_names)
+
+    matched = qdrant_client.count(
+        collection_name=settings.qdrant_collection,
+        count_filter=qdrant_filter,
+        exact=True
+    ).count
+
+    if matched:
+        qdrant_client.delete(
+            collection_name=settings.qdrant_collection,
+            points_selector=FilterSelector(filter=qdrant_filter),
+            wait=True
+        )
+
+    # Signature near-duplicate ikut dihapus; dokumen yang chunk-nya menunjuk chunk dokumen ini
+    # dilepas dari link-nya dan di-index ulang pada incremental run berikutnya
+    from rag_modul import near_duplicate_index, _near_dup_namespace, _release_near_duplicate_dependents
+    namespace = _near_dup_namespace(settings.qdrant_collection)
+    released = near_duplicate_index.remove_sources(namespace, blob_names)
+    if released["sources"] or released["canonical_ids"]:
+        _release_near_duplicate_dependents(released, settings.qdrant_collection, namespace)
+
+    print(f"✅ Deleted {matched} points from Qdrant for {len(blob_names)} document(s).")
+    return matched
+
 def get_qdrant_collection_info(settings, qdrant_client) -> Dict[str, Any]:
     """Get Qdrant collection info"""
     try:
@@ -574,6 +746,7 @@ def get_qdrant_collection_info(settings, qdrant_client) -> Dict[str, Any]:
         
         return {
             "collection_name": settings.qdrant_collection,
+            "active_collection": resolve_qdrant_collection(qdrant_client, settings.qdrant_collection),
             "status": str(info.status),
             "points_count": info.points_count,
             "vectors_config": dict(info.config.params.vectors),
@@ -597,16 +770,15 @@ def delete_document_complete(blob_name: str, blob_container, settings, qdrant_cl
     try:
         print(f"\n🔄 Starting deletion process for: {blob_name}")
         
-        # Step 1: Find related points in Qdrant
-        point_ids = search_documents_in_qdrant(blob_name, settings, qdrant_client)
-        result["debug_info"]["found_point_ids"] = point_ids
-        
-        # Step 2: Delete from Qdrant
-        if point_ids:
-            if delete_points_from_qdrant(point_ids, settings, qdrant_client):
-                result["search_documents_deleted"] = len(point_ids)
-            else:
-                result["search_deletion_errors"] = True
+        # Step 1-2: Delete related points in Qdrant with a single filter delete
+        try:
+            deleted = delete_points_by_source([blob_name], settings, qdrant_client)
+            result["search_documents_deleted"] = deleted
+            result["debug_info"]["matched_points"] = deleted
+        except Exception as e:
+            print(f"❌ Error deleting points from Qdrant: {str(e)}")
+            result["search_deletion_errors"] = True
+            result["debug_info"]["search_error"] = str(e)
 
         # Step 3: Delete from blob storage
         blob_deleted = delete_document_from_blob(blob_name, blob_container)
@@ -627,20 +799,51 @@ def delete_document_complete(blob_name: str, blob_container, settings, qdrant_cl
     
     return result
 
-def batch_delete_documents(blob_names: List[str], blob_container, settings, qdrant_client) -> Dict[str, Any]:
-    """Delete multiple documents in batch"""
+def batch_delete_documents(blob_names: List[str], blob_container, settings, qdrant_client, max_workers: int = 8) -> Dict[str, Any]:
+    """
+    Delete multiple documents in batch.
+    Qdrant: satu should-filter delete untuk seluruh batch. Blob: dihapus concurrent.
+    """
     results = {
         "total_requested": len(blob_names),
         "successful_deletions": 0,
         "failed_deletions": 0,
+        "search_documents_deleted": 0,
         "details": []
     }
-    
-    for blob_name in blob_names:
-        delete_result = delete_document_complete(blob_name, blob_container, settings, qdrant_client)
-        results["details"].append(delete_result)
-        
-        if delete_result["success"]:
+
+    if not blob_names:
+        return results
+
+    print(f"\n🔄 Starting batch deletion for {len(blob_names)} documents")
+
+    # Step 1: Delete all related points in Qdrant in one request
+    search_error = None
+    try:
+        results["search_documents_deleted"] = delete_points_by_source(blob_names, settings, qdrant_client)
+    except Exception as e:
+        search_error = str(e)
+        print(f"❌ Error deleting points from Qdrant: {search_error}")
+
+    # Step 2: Delete blobs concurrently
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(blob_names)))) as pool:
+        blob_deleted = list(pool.map(lambda name: delete_document_from_blob(name, blob_container), blob_names))
+
+    # Step 3: Per-document result
+    for blob_name, deleted in zip(blob_names, blob_deleted):
+        success = deleted and search_error is None
+        detail = {
+            "blob_name": blob_name,
+            "blob_deleted": deleted,
+            "search_deletion_errors": search_error is not None,
+            "success": success,
+            "message": "✅ Document successfully deleted." if success else "❌ Failed to completely delete document."
+        }
+        if search_error:
+            detail["debug_info"] = {"error": search_error}
+
+        results["details"].append(detail)
+        if success:
             results["successful_deletions"] += 1
         else:
             results["failed_deletions"] += 1
@@ -689,37 +892,343 @@ def inspect_qdrant_collection_sample(settings, qdrant_client, blob_name: Optiona
     except Exception as e:
         return {"error": f"Failed to inspect Qdrant collection: {str(e)}"}
 
-def rebuild_qdrant_index(settings, qdrant_client, prefix: str = "sop/") -> Dict[str, Any]:
-    """Rebuild entire Qdrant index - DANGEROUS OPERATION"""
+def _create_index_collection(settings, qdrant_client, collection_name: str, profile: Optional[str] = None):
+    """Buat collection indeks dokumen (sesuai profil) lengkap dengan payload index."""
+    profile = profile or settings.qdrant_collection_profile
+    print(f"Creating collection {collection_name} with profile '{profile}'")
+    qdrant_client.create_collection(collection_name=collection_name, **_collection_profile_config(profile))
+    _payload_indexes_ready.discard(collection_name)
+    ensure_payload_indexes(settings, qdrant_client, collection_name)
+
+def _delete_index_collection(qdrant_client, collection_name: str):
+    """Hapus collection fisik beserta namespace near-duplicate-nya (signature ikut collection)."""
+    from rag_modul import near_duplicate_index
+
+    qdrant_client.delete_collection(collection_name=collection_name)
+    near_duplicate_index.drop_collection(collection_name)
+
+def list_collection_versions(qdrant_client, alias: str) -> List[str]:
+    """Collection versi blue/green ({alias}_v{timestamp}), urut dari yang paling lama."""
+    pattern = re.compile(rf"^{re.escape(alias)}_v\d{{14}}$")
+    names = [c.name for c in qdrant_client.get_collections().collections]
+    return sorted(name for name in names if pattern.match(name))
+
+def _migrate_legacy_collection(settings, qdrant_client, alias: str) -> Optional[str]:
+    """
+    Collection lama (sebelum blue/green) memakai nama alias sebagai collection fisik.
+    Salin isinya (vector + payload) ke {alias}_v{timestamp} sebelum build pertama, supaya
+    collection lama bisa di-retire saat swap tanpa kehilangan data dan salinannya jadi
+    versi rollback. Return nama salinan, atau None bila alias bukan collection legacy.
+    """
+    if resolve_qdrant_collection(qdrant_client, alias) != alias:
+        return None
+
+    copy_name = f"{alias}_v{datetime.now(timezone.utc):%Y%m%d%H%M%S}"
+    print(f"📦 Copying legacy collection '{alias}' to {copy_name} before first alias swap")
+    config = qdrant_client.get_collection(collection_name=alias).config
+    qdrant_client.create_collection(
+        collection_name=copy_name,
+        vectors_config=config.params.vectors,
+        quantization_config=config.quantization_config,
+    )
+    _payload_indexes_ready.discard(copy_name)
+    ensure_payload_indexes(settings, qdrant_client, copy_name)
+
+    batch = []
+    for point in iter_qdrant_points(qdrant_client, alias, page_size=256, with_vectors=True):
+        batch.append(qdrant_models.PointStruct(id=point.id, vector=point.vector, payload=point.payload))
+        if len(batch) >= 256:
+            qdrant_client.upsert(collection_name=copy_name, points=batch, wait=True)
+            batch = []
+    if batch:
+        qdrant_client.upsert(collection_name=copy_name, points=batch, wait=True)
+
+    source_points = qdrant_client.count(collection_name=alias, exact=True).count
+    copied_points = qdrant_client.count(collection_name=copy_name, exact=True).count
+    if copied_points != source_points:
+        _delete_index_collection(qdrant_client, copy_name)
+        raise RuntimeError(
+            f"Legacy collection copy incomplete ({copied_points}/{source_points} points); '{alias}' left untouched"
+        )
+    print(f"✓ Legacy collection copied: {copied_points} points")
+    return copy_name
+
+def swap_collection_alias(qdrant_client, alias: str, collection_name: str, legacy_copy: Optional[str] = None) -> Optional[str]:
+    """
+    Arahkan alias ke collection_name secara atomic (delete + create alias dalam satu request).
+    Return collection yang sebelumnya aktif.
+
+    Bila alias masih berupa collection legacy, collection itu hanya di-retire kalau sudah
+    disalin (legacy_copy, lihat _migrate_legacy_collection); salinan itu yang dikembalikan
+    sebagai previous sehingga rollback tetap bisa.
+    """
+    previous = resolve_qdrant_collection(qdrant_client, alias)
+    operations = []
+
+    if previous == alias:
+        if not legacy_copy or not qdrant_client.collection_exists(legacy_copy):
+            raise RuntimeError(
+                f"'{alias}' is a legacy collection; copy it with _migrate_legacy_collection before swapping the alias"
+            )
+        # Nama alias masih dipakai collection legacy: harus dihapus sebelum alias bisa dibuat.
+        # Isinya sudah ada di legacy_copy; bila pembuatan alias gagal, alias diarahkan ke salinan.
+        print(f"WARNING: Retiring legacy collection '{alias}' (copied to {legacy_copy}) to replace it with an alias")
+        _delete_index_collection(qdrant_client, alias)
+        previous = legacy_copy
+        try:
+            qdrant_client.update_collection_aliases(change_aliases_operations=[
+                qdrant_models.CreateAliasOperation(
+                    create_alias=qdrant_models.CreateAlias(collection_name=collection_name, alias_name=alias)
+                )
+            ])
+        except Exception:
+            print(f"❌ Alias creation failed, pointing '{alias}' at legacy copy {legacy_copy}")
+            qdrant_client.update_collection_aliases(change_aliases_operations=[
+                qdrant_models.CreateAliasOperation(
+                    create_alias=qdrant_models.CreateAlias(collection_name=legacy_copy, alias_name=alias)
+                )
+            ])
+            raise
+        print(f"🔀 Alias '{alias}' -> {collection_name} (was: legacy collection, kept as {legacy_copy})")
+        return previous
+
+    if previous:
+        operations.append(qdrant_models.DeleteAliasOperation(
+            delete_alias=qdrant_models.DeleteAlias(alias_name=alias)
+        ))
+
+    operations.append(qdrant_models.CreateAliasOperation(
+        create_alias=qdrant_models.CreateAlias(collection_name=collection_name, alias_name=alias)
+    ))
+    qdrant_client.update_collection_aliases(change_aliases_operations=operations)
+    print(f"🔀 Alias '{alias}' -> {collection_name} (was: {previous})")
+    return previous
+
+def _prune_collection_versions(settings, qdrant_client, alias: str, active: str) -> List[str]:
+    """Simpan collection aktif + (qdrant_keep_versions - 1) versi sebelumnya untuk rollback."""
+    older = [name for name in list_collection_versions(qdrant_client, alias) if name != active]
+    keep = max(settings.qdrant_keep_versions - 1, 0)
+    to_delete = older[:-keep] if keep else older
+
+    for name in to_delete:
+        print(f"🗑️ Deleting old collection version: {name}")
+        _delete_index_collection(qdrant_client, name)
+    return to_delete
+
+def rollback_collection_alias(settings, qdrant_client) -> Dict[str, Any]:
+    """Kembalikan alias ke versi collection sebelum versi yang aktif sekarang."""
     try:
-        collection_name = settings.qdrant_collection
-        
+        alias = settings.qdrant_collection
+        active = resolve_qdrant_collection(qdrant_client, alias)
+        older = [name for name in list_collection_versions(qdrant_client, alias) if active is None or name < active]
+
+        if not older:
+            return {"success": False, "alias": alias, "active_collection": active,
+                    "message": "No previous collection version to roll back to"}
+
+        swap_collection_alias(qdrant_client, alias, older[-1])
+        return {
+            "success": True,
+            "alias": alias,
+            "active_collection": older[-1],
+            "rolled_back_from": active,
+            "message": f"Alias {alias} rolled back to {older[-1]}"
+        }
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return {"success": False, "error": f"Failed to roll back alias: {str(e)}"}
+
+def _rebuild_in_place(settings, qdrant_client, prefix: str, progress_callback=None, profile: Optional[str] = None, resume: bool = False) -> Dict[str, Any]:
+    """
+    Hapus dan buat ulang collection aktif lalu index ulang (retrieval kosong selama rebuild).
+
+    Run di-checkpoint (IndexRunManifest). Dengan resume=True rebuild sebelumnya yang crash
+    di tengah jalan dilanjutkan: collection tidak dihapus lagi dan blob yang sudah selesai di-skip.
+    """
+    from rag_modul import process_and_index_docs, IndexRunManifest, _default_run_key
+
+    # Alias tetap menunjuk collection yang sama; yang di-recreate collection fisiknya
+    collection_name = resolve_qdrant_collection(qdrant_client, settings.qdrant_collection) or settings.qdrant_collection
+    manifest = IndexRunManifest(_default_run_key("rebuild", prefix, collection_name), resume=resume)
+    
+    if manifest.resumed and qdrant_client.collection_exists(collection_name):
+        print(f"♻️ Resuming rebuild of {collection_name} (run {manifest.run_id}), collection is kept")
+    else:
         # 1. Delete collection
         print(f"WARNING: Deleting collection: {collection_name}...")
-        qdrant_client.delete_collection(collection_name=collection_name)
+        _delete_index_collection(qdrant_client, collection_name)
         
         # 2. Recreate collection
         print(f"Re-creating collection: {collection_name}...")
-        qdrant_client.create_collection(
-            collection_name=collection_name,
-            vectors_config=qdrant_models.VectorParams(
-                size=3072,
-                distance=qdrant_models.Distance.COSINE
-            )
-        )
-        
-        # 3. Reindex all documents
-        print(f"Starting re-indexing of all documents from prefix: {prefix}...")
-        from rag_modul import process_and_index_docs
-        index_report = process_and_index_docs(prefix=prefix)
-        
+        _create_index_collection(settings, qdrant_client, collection_name, profile)
+        # Manifest kosong ditulis sebelum indexing: crash setelah titik ini = resume
+        manifest.data["completed"] = {}
+        manifest.checkpoint(status="running")
+    ensure_payload_indexes(settings, qdrant_client, collection_name)
+    
+    # 3. Reindex all documents
+    print(f"Starting re-indexing of all documents from prefix: {prefix}...")
+    index_report = process_and_index_docs(
+        prefix=prefix, manifest=manifest, collection_name=collection_name, progress_callback=progress_callback
+    )
+    
+    return {
+        "success": True,
+        "mode": "in_place",
+        "message": f"Successfully rebuilt index {collection_name}.",
+        "index_report": index_report
+    }
+
+def _rebuild_blue_green(settings, qdrant_client, prefix: str, progress_callback=None, force_swap: bool = False, profile: Optional[str] = None, resume: bool = False) -> Dict[str, Any]:
+    """
+    Build ke collection versi baru selagi collection lama tetap melayani query,
+    validasi jumlah point, lalu swap alias secara atomic.
+    Dengan resume=True build yang crash dilanjutkan ke collection target yang sama
+    (manifest menyimpan target); tanpa resume target build lama yang tidak selesai dibuang.
+    """
+    from rag_modul import process_and_index_docs, IndexRunManifest, _default_run_key, _is_system_blob
+
+    alias = settings.qdrant_collection
+    manifest = IndexRunManifest(_default_run_key("bluegreen", prefix, alias), resume=resume)
+    active = resolve_qdrant_collection(qdrant_client, alias)
+
+    previous_run = manifest.previous or {}
+    if previous_run.get("status") != "completed":
+        for stale in (previous_run.get("target_collection"), previous_run.get("legacy_copy")):
+            if stale and stale != active and qdrant_client.collection_exists(stale):
+                print(f"🗑️ Deleting unfinished build collection {stale}")
+                _delete_index_collection(qdrant_client, stale)
+
+    # Swap pertama dari collection legacy: salin dulu (sebelum target dibuat, jadi versinya
+    # lebih lama dari target dan bisa dipakai rollback); validasi dibandingkan dengan salinan
+    legacy_copy = None
+    if active == alias:
+        legacy_copy = manifest.data.get("legacy_copy")
+        if not (manifest.resumed and legacy_copy and qdrant_client.collection_exists(legacy_copy)):
+            legacy_copy = _migrate_legacy_collection(settings, qdrant_client, alias)
+            manifest.data["legacy_copy"] = legacy_copy
+            manifest.data.pop("target_collection", None)
+        active = legacy_copy
+
+    target = manifest.data.get("target_collection")
+    if manifest.resumed and target and qdrant_client.collection_exists(target):
+        print(f"♻️ Resuming blue/green build into {target} (run {manifest.run_id})")
+    else:
+        target = f"{alias}_v{datetime.now(timezone.utc):%Y%m%d%H%M%S}"
+        print(f"Creating new collection version: {target} (active: {active})")
+        _create_index_collection(settings, qdrant_client, target, profile)
+        manifest.data["completed"] = {}
+        manifest.data["target_collection"] = target
+        manifest.checkpoint(status="running")
+
+    print(f"Starting indexing into {target} from prefix: {prefix}...")
+    index_report = process_and_index_docs(
+        prefix=prefix, manifest=manifest, collection_name=target, progress_callback=progress_callback
+    )
+
+    # Validasi: semua chunk yang tercatat di manifest harus ada di collection baru
+    indexed_sources = {
+        name for name, entry in manifest.data["completed"].items() if entry.get("status") == "indexed"
+    }
+    expected_points = sum(manifest.data["completed"][name].get("chunks", 0) for name in indexed_sources)
+    target_points = qdrant_client.count(collection_name=target, exact=True).count
+    active_points = qdrant_client.count(collection_name=active, exact=True).count if active else 0
+
+    # Coverage per dokumen: dokumen yang ada di collection aktif dan masih ada di blob storage
+    # harus ter-index di collection baru (rasio jumlah point saja tidak menangkap dokumen hilang)
+    missing_sources = []
+    if active:
+        current_blobs = {
+            b.name for b in blob_container.list_blobs(name_starts_with=prefix) if not _is_system_blob(b.name)
+        }
+        active_sources = {name for name in _collection_sources(qdrant_client, active) if name.startswith(prefix)}
+        missing_sources = sorted((active_sources & current_blobs) - indexed_sources)
+
+    validation = {
+        "expected_points": expected_points,
+        "target_points": target_points,
+        "active_points": active_points,
+        "min_ratio": settings.qdrant_swap_min_ratio,
+        "errors": len(index_report["errors"]),
+        "no_content_sources": index_report.get("no_content_sources", []),
+        "missing_sources": missing_sources,
+    }
+    problems = []
+    if index_report["errors"]:
+        problems.append(f"{len(index_report['errors'])} indexing errors (rerun with resume=true)")
+    if index_report.get("no_content_sources"):
+        problems.append(f"{len(index_report['no_content_sources'])} documents with no content extracted")
+    if missing_sources:
+        problems.append(f"{len(missing_sources)} documents indexed in {active} are missing from {target}")
+    if target_points != expected_points:
+        problems.append(f"point count {target_points} != expected {expected_points}")
+    if target_points == 0:
+        problems.append("new collection is empty")
+    elif active_points and target_points < active_points * settings.qdrant_swap_min_ratio:
+        problems.append(f"point count {target_points} below {settings.qdrant_swap_min_ratio:.0%} of active ({active_points})")
+    validation["problems"] = problems
+
+    if problems and not force_swap:
+        print(f"❌ Validation failed, alias not swapped: {problems}")
         return {
-            "success": True,
-            "message": f"Successfully rebuilt index {collection_name}.",
+            "success": False,
+            "mode": "blue_green",
+            "alias": alias,
+            "active_collection": active,
+            "target_collection": target,
+            "validation": validation,
+            "message": f"Validation failed, {alias} still serves {active}: {'; '.join(problems)}",
             "index_report": index_report
         }
+
+    previous = swap_collection_alias(qdrant_client, alias, target, legacy_copy=legacy_copy)
+    pruned = _prune_collection_versions(settings, qdrant_client, alias, target)
+
+    return {
+        "success": True,
+        "mode": "blue_green",
+        "alias": alias,
+        "active_collection": target,
+        "previous_collection": previous,
+        "pruned_collections": pruned,
+        "validation": validation,
+        "message": f"Alias {alias} now serves {target}; roll back with rollback_collection_alias.",
+        "index_report": index_report
+    }
+
+def rebuild_qdrant_index(
+    settings,
+    qdrant_client,
+    prefix: str = "sop/",
+    mode: str = "in_place",
+    progress_callback=None,
+    force_swap: bool = False,
+    profile: Optional[str] = None,
+    resume: bool = False,
+) -> Dict[str, Any]:
+    """
+    Rebuild entire Qdrant index.
+
+    Args:
+        mode: 'in_place' (default, hapus + buat ulang collection aktif - DANGEROUS OPERATION) atau
+            'blue_green' (zero downtime via alias swap; build pertama menyalin collection legacy
+            ke {alias}_v{timestamp} dulu, lihat _migrate_legacy_collection)
+        force_swap: Tetap swap alias walaupun validasi jumlah point gagal
+        profile: Profil collection baru (COLLECTION_PROFILES), default settings.qdrant_collection_profile
+        resume: Lanjutkan rebuild sebelumnya yang belum selesai (crash) alih-alih mulai dari awal
+    """
+    try:
+        if profile:
+            _collection_profile_config(profile)  # validasi nama profil sebelum menyentuh collection
+        if mode == "in_place":
+            return _rebuild_in_place(settings, qdrant_client, prefix, progress_callback, profile, resume)
+        if mode == "blue_green":
+            return _rebuild_blue_green(settings, qdrant_client, prefix, progress_callback, force_swap, profile, resume)
+        return {"success": False, "error": f"Unknown rebuild mode: {mode}"}
         
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return {"error": f"Failed to rebuild index: {str(e)}"}
\ No newline at end of file
+        return {"success": False, "error": f"Failed to rebuild index: {str(e)}"}
@@ -0,0 +1,312 @@
+"""
+Indexing Job Queue
+Endpoint upload/reindex hanya enqueue job dan langsung mengembalikan job id;
+worker lokal memproses antrian di background.
+Redis dipakai bila tersedia (berbagi state antar replika), fallback ke in-process queue.
+"""
+from depedencies import *
+from typing import List, Dict, Any, Optional, Callable
+import queue
+import threading
+import time
+import uuid
+
+JOB_KEY_PREFIX = "indexing_job:"
+JOB_INDEX_KEY = "indexing_jobs"
+JOB_QUEUE_KEY = "indexing_jobs:queue"
+# Lease per job yang sedang jalan, diperpanjang worker; lease hilang = worker mati (crash/restart)
+JOB_LEASE_PREFIX = "indexing_job_lease:"
+JOB_LEASE_SECONDS = 60
+
+# runner(job, progress_callback) -> hasil akhir (dict) yang disimpan di job["result"]
+JobRunner = Callable[[Dict[str, Any], Callable[[str, Dict[str, Any]], None]], Dict[str, Any]]
+
+
+class IndexingJobManager:
+    """
+    Menyimpan status job indexing dan menjalankan worker yang memproses antrian.
+    - Redis: job disimpan sebagai JSON (TTL), sorted set untuk listing, list sebagai antrian
+    - Fallback: dict + queue.Queue di memori proses (hilang saat restart)
+    Worker memproses satu job sekaligus; paralelisme ada di dalam pipeline indexing.
+    Job Redis yang sedang jalan punya lease ber-TTL; saat startup job "running" tanpa lease
+    (worker-nya mati) dimasukkan lagi ke antrian dengan opsi resume.
+    """
+
+    def __init__(self, runner: JobRunner, redis_client: Optional[redis.Redis] = None, job_ttl: int = 7 * 24 * 3600):
+        self.runner = runner
+        self.redis_client = redis_client
+        self.job_ttl = job_ttl
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+
+    @property
+    def backend(self) -> str:
+        return "redis" if self.redis_client else "memory"
+
+    # ---------- Storage ----------
+
+    def _save(self, job: Dict[str, Any]):
+        if self.redis_client:
+            self.redis_client.setex(f"{JOB_KEY_PREFIX}{job['id']}", self.job_ttl, json.dumps(job))
+        else:
+            self._jobs[job["id"]] = job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if self.redis_client:
+            raw = self.redis_client.get(f"{JOB_KEY_PREFIX}{job_id}")
+            return json.loads(raw) if raw else None
+        job = self._jobs.get(job_id)
+        return json.loads(json.dumps(job)) if job else None
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Job terbaru lebih dulu, tanpa detail per file"""
+        if self.redis_client:
+            job_ids = self.redis_client.zrevrange(JOB_INDEX_KEY, 0, max(limit, 1) - 1)
+            jobs = [self.get_job(job_id) for job_id in job_ids]
+            stale = [job_id for job_id, job in zip(job_ids, jobs) if job is None]
+            if stale:
+                # Job yang sudah expire dibersihkan dari index
+                self.redis_client.zrem(JOB_INDEX_KEY, *stale)
+            jobs = [job for job in jobs if job]
+        else:
+            jobs = sorted(self._jobs.values(), key=lambda j: j["created_at"], reverse=True)[:limit]
+
+        return [{k: v for k, v in job.items() if k != "files"} for job in jobs]
+
+    def _update(self, job_id: str, mutate: Callable[[Dict[str, Any]], None]) -> Optional[Dict[str, Any]]:
+        # Hanya worker yang menulis job, jadi lock lokal cukup untuk read-modify-write
+        with self._lock:
+            job = self.get_job(job_id)
+            if job is None:
+                return None
+            mutate(job)
+            job["updated_at"] = datetime.now(timezone.utc).isoformat()
+            self._save(job)
+            return job
+
+    # ---------- Queue ----------
+
+    def enqueue(
+        self,
+        kind: str,
+        prefix: str = "",
+        files: Optional[List[str]] = None,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Daftarkan job baru dan masukkan ke antrian.
+
+        Args:
+            kind: 'files' (index file tertentu) atau 'prefix' (incremental per prefix)
+            prefix: Prefix blob
+            files: Blob names untuk job 'files'
+            options: Opsi tambahan untuk runner (mis. force_reindex)
+        """
+        now = datetime.now(timezone.utc)
+        files = files or []
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "prefix": prefix,
+            "options": options or {},
+            "created_at": now.isoformat(),
+            "updated_at": now.isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "progress": {"total": len(files) or None, "done": 0, "indexed": 0, "unchanged": 0, "skipped": 0, "errors": 0},
+            "files": {name: {"status": "queued"} for name in files},
+            "result": None,
+            "error": None,
+        }
+
+        with self._lock:
+            self._save(job)
+        if self.redis_client:
+            self.redis_client.zadd(JOB_INDEX_KEY, {job["id"]: now.timestamp()})
+            self.redis_client.rpush(JOB_QUEUE_KEY, job["id"])
+        else:
+            self._queue.put(job["id"])
+
+        print(f"[JOBS] Enqueued {kind} job {job['id']} ({len(files)} files, prefix='{prefix}')")
+        return job
+
+    def _poll_timeout(self) -> int:
+        """
+        Timeout BLPOP harus di bawah socket_timeout client; kalau tidak, poll saat antrian
+        kosong berakhir dengan TimeoutError dari socket, bukan None.
+        """
+        socket_timeout = self.redis_client.connection_pool.connection_kwargs.get("socket_timeout")
+        if not socket_timeout:
+            return 5
+        return max(1, min(5, int(socket_timeout) - 2))
+
+    def _next_job_id(self, timeout: int = 5) -> Optional[str]:
+        if self.redis_client:
+            item = self.redis_client.blpop(JOB_QUEUE_KEY, timeout=min(timeout, self._poll_timeout()))
+            return item[1] if item else None
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    # ---------- Recovery ----------
+
+    def _lease_key(self, job_id: str) -> str:
+        return f"{JOB_LEASE_PREFIX}{job_id}"
+
+    def _hold_lease(self, job_id: str, stop: threading.Event):
+        """Perpanjang lease job selama job berjalan (thread terpisah dari runner)."""
+        while not stop.wait(JOB_LEASE_SECONDS / 3):
+            try:
+                self.redis_client.setex(self._lease_key(job_id), JOB_LEASE_SECONDS, "1")
+            except Exception as e:
+                print(f"[JOBS] ⚠️ Lease refresh failed for {job_id}: {e}")
+
+    def recover_jobs(self) -> List[str]:
+        """
+        Masukkan lagi ke antrian job yang ditinggal worker yang mati: status "running" tanpa
+        lease, atau "queued" yang sudah diambil dari antrian tapi belum sempat mulai.
+        Job di-requeue dengan options.resume=True supaya rebuild melanjutkan checkpoint-nya.
+        """
+        if not self.redis_client:
+            return []  # Antrian in-process ikut hilang bersama prosesnya
+
+        recovered = []
+        queued_ids = set(self.redis_client.lrange(JOB_QUEUE_KEY, 0, -1))
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=JOB_LEASE_SECONDS)
+
+        for job_id in self.redis_client.zrange(JOB_INDEX_KEY, 0, -1):
+            job = self.get_job(job_id)
+            if job is None:
+                continue
+            if job["status"] == "running":
+                if self.redis_client.exists(self._lease_key(job_id)):
+                    continue  # Masih dikerjakan replika lain
+            elif job["status"] == "queued":
+                if job_id in queued_ids or datetime.fromisoformat(job["updated_at"]) > stale_before:
+                    continue
+            else:
+                continue
+
+            def requeue(j):
+                j["status"] = "queued"
+                j["recovered"] = j.get("recovered", 0) + 1
+                j["options"] = dict(j.get("options") or {}, resume=True)
+                # Progress dihitung ulang oleh run berikutnya
+                j["progress"] = dict(j["progress"], total=len(j["files"]) or None, done=0, indexed=0, unchanged=0, skipped=0, errors=0)
+
+            self._update(job_id, requeue)
+            self.redis_client.rpush(JOB_QUEUE_KEY, job_id)
+            recovered.append(job_id)
+            print(f"[JOBS] ♻️ Re-queued interrupted {job['kind']} job {job_id} (was {job['status']})")
+
+        return recovered
+
+    # ---------- Worker ----------
+
+    def _record_progress(self, job_id: str, blob_name: str, outcome: Dict[str, Any]):
+        status = outcome.get("status", "error")
+        entry = {"status": status}
+        for field in ("chunks", "new_chunks", "deleted_chunks", "seconds", "reason", "cache_hit", "extractor", "chunking_profile", "near_duplicates", "skipped_near_duplicates"):
+            if outcome.get(field) is not None:
+                entry[field] = outcome[field]
+
+        def mutate(job):
+            job["files"][blob_name] = entry
+            progress = job["progress"]
+            progress["done"] += 1
+            counter = {"indexed": "indexed", "unchanged": "unchanged", "skipped": "skipped"}.get(status, "errors")
+            progress[counter] += 1
+
+        self._update(job_id, mutate)
+
+    def run_job(self, job_id: str):
+        """Jalankan satu job sampai selesai (dipanggil oleh worker)"""
+        # Lease dipasang sebelum status "running" supaya recover_jobs replika lain tidak me-requeue
+        lease_stop = threading.Event()
+        if self.redis_client:
+            self.redis_client.setex(self._lease_key(job_id), JOB_LEASE_SECONDS, "1")
+        job = self._update(job_id, lambda j: j.update(status="running", started_at=datetime.now(timezone.utc).isoformat()))
+        if job is None:
+            print(f"[JOBS] ⚠️ Job {job_id} not found (expired?), skipping")
+            return
+
+        print(f"[JOBS] ▶️ Running {job['kind']} job {job_id}")
+        started = time.perf_counter()
+        if self.redis_client:
+            threading.Thread(target=self._hold_lease, args=(job_id, lease_stop), daemon=True).start()
+        try:
+            result = self.runner(job, lambda name, outcome: self._record_progress(job_id, name, outcome))
+            status = "completed" if result.get("success", True) else "failed"
+            error = None if status == "completed" else result.get("error") or result.get("message")
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            result, status, error = None, "failed", str(e)
+        finally:
+            lease_stop.set()
+
+        def finish(j):
+            report = (result or {}).get("index_report") or {}
+            # Chunk yang gagal di-embed/upsert baru ketahuan setelah flush terakhir
+            for name in report.get("failed_sources", []):
+                entry = j["files"].setdefault(name, {})
+                if entry.get("status") == "indexed":
+                    j["progress"]["indexed"] -= 1
+                    j["progress"]["errors"] += 1
+                entry.update(status="error", reason="embedding/upsert failed")
+            if j["progress"]["total"] is None:
+                j["progress"]["total"] = j["progress"]["done"]
+            j.update(
+                status=status,
+                error=error,
+                result=result,
+                finished_at=datetime.now(timezone.utc).isoformat(),
+                elapsed_seconds=round(time.perf_counter() - started, 2),
+            )
+
+        self._update(job_id, finish)
+        if self.redis_client:
+            self.redis_client.delete(self._lease_key(job_id))
+        print(f"[JOBS] {'✅' if status == 'completed' else '❌'} Job {job_id} {status} in {time.perf_counter() - started:.1f}s")
+
+    def _worker_loop(self):
+        while True:
+            try:
+                job_id = self._next_job_id()
+            except Exception as e:
+                print(f"[JOBS] ❌ Queue read failed: {e}")
+                time.sleep(5)
+                continue
+            if job_id:
+                self.run_job(job_id)
+
+    def start_worker(self):
+        """Start worker thread (idempotent); job yang terputus oleh crash sebelumnya di-requeue dulu."""
+        if self._worker and self._worker.is_alive():
+            return
+        try:
+            self.recover_jobs()
+        except Exception as e:
+            print(f"[JOBS] ⚠️ Job recovery failed: {e}")
+        self._worker = threading.Thread(target=self._worker_loop, name="indexing-job-worker", daemon=True)
+        self._worker.start()
+        print(f"[JOBS] ✅ Indexing worker started (backend: {self.backend})")
+
+
+def initialize_job_manager(runner: JobRunner, redis_client=None, settings=None) -> IndexingJobManager:
+    """
+    Initialize job manager; pakai Redis bila koneksi memory manager tersedia
+
+    Args:
+        runner: Fungsi yang menjalankan job indexing
+        redis_client: Redis client dari initialize_memory_clients (boleh None)
+        settings: Settings object (untuk TTL job)
+    """
+    job_ttl = getattr(settings, "index_job_ttl_seconds", 7 * 24 * 3600)
+    if redis_client is None:
+        print("⚠️ Indexing jobs: Redis not available, using in-process queue")
+    return IndexingJobManager(runner=runner, redis_client=redis_client, job_ttl=job_ttl)
@@ -6,11 +6,13 @@ from internal_assistant_core import (
     get_or_create_agent, settings,
     blob_container,
     qdrant_client,  
-    memory_manager  
+    memory_manager,
+    redis_client
 )
 
 from rag_modul import (
-    rag_answer, process_and_index_docs
+    rag_answer, process_and_index_docs,
+    list_dead_letters, replay_dead_letters
 )
 
 # Project management imports dengan alias untuk menghindari konflik
@@ -53,15 +55,19 @@ def set_user_token(token_data: dict, user_id: str = None):
 
 from documentManagement import (
     upload_file_to_blob,
+    upload_file_data_to_blob,
     batch_upload_files,
     process_and_index_documents,
+    run_indexing_job,
     upload_and_index_complete,
     list_documents_in_blob,
     delete_document_complete,     
     batch_delete_documents,       
     inspect_qdrant_collection_sample, 
     get_qdrant_collection_info,     
-    rebuild_qdrant_index            
+    rebuild_qdrant_index,
+    rollback_collection_alias,
+    COLLECTION_PROFILES
 )
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
@@ -72,9 +78,17 @@ from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timezone
 import os
+from starlette.concurrency import run_in_threadpool
+from indexing_jobs import initialize_job_manager
 
 app = FastAPI(title="Internal Assistant – LangChain + Azure + UI")
 
+job_manager = initialize_job_manager(run_indexing_job, redis_client, settings)
+
+@app.on_event("startup")
+def start_indexing_worker():
+    job_manager.start_worker()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -272,28 +286,41 @@ def list_documents(prefix: str = "sop/"):
 
 @app.post("/documents/upload")
 async def upload_documents(files: List[UploadFile] = File(...), prefix: str = Form("sop/")):
-    """Upload multiple documents to blob storage and index them"""
+    """Upload multiple documents to blob storage, lalu enqueue job indexing (non-blocking)"""
     try:
         if not prefix.endswith("/"):
             prefix += "/"
         
         files_data = []
         for file in files:
-            # Reset file pointer to beginning
+            # Reset file pointer to beginning; isi file tetap di spool UploadFile
             await file.seek(0)
-            content = await file.read()
             
-            print(f"DEBUG: File {file.filename} - Size: {len(content)} bytes, Content-Type: {file.content_type}")
-            print(f"DEBUG: First 100 bytes: {content[:100]}")
+            print(f"DEBUG: File {file.filename} - Size: {file.size} bytes, Content-Type: {file.content_type}")
             
             files_data.append({
                 "filename": file.filename,
-                "data": content,
+                "stream": file.file,
+                "size": file.size,
                 "content_type": file.content_type or _detect_mime(file.filename)
             })
         
-        result = upload_and_index_complete(files_data, prefix, blob_container, settings)
-        return result
+        # Upload tetap sinkron (stream request harus dibaca sebelum response), indexing di background
+        upload_results = await run_in_threadpool(batch_upload_files, files_data, prefix, blob_container)
+        
+        job = None
+        if upload_results["successful_uploads"] > 0:
+            job = job_manager.enqueue("files", prefix=prefix, files=upload_results["uploaded_files"])
+        
+        return {
+            "upload_results": upload_results,
+            "job_id": job["id"] if job else None,
+            "job_status_url": f"/jobs/{job['id']}" if job else None,
+            "overall_success": job is not None,
+            "message": f"Upload: {upload_results['message']}. " + (
+                "Indexing queued." if job else "Indexing skipped."
+            )
+        }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading documents: {str(e)}")
@@ -338,42 +365,126 @@ def get_index_schema():
 def reindex_documents(prefix: str = Query(default="sop/"), force: bool = Query(default=False)):
     try:
         print(f"[REINDEX] prefix={prefix}, force={force}")  # Debug log
-        result = process_and_index_documents(prefix, blob_container, settings, force_reindex=force)
-        return result
+        job = job_manager.enqueue("prefix", prefix=prefix, options={"force_reindex": force})
+        return {
+            "success": True,
+            "prefix": prefix,
+            "job_id": job["id"],
+            "job_status_url": f"/jobs/{job['id']}",
+            "message": "Reindex job queued"
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reindexing documents: {str(e)}")
 
+@app.post("/documents/rebuild")
+def rebuild_index(
+    prefix: str = Query(default="sop/"),
+    mode: str = Query(default="in_place"),
+    force_swap: bool = Query(default=False),
+    profile: Optional[str] = Query(default=None),
+    resume: bool = Query(default=False)
+):
+    """
+    Rebuild index di background; in_place (default) membuat ulang collection aktif,
+    blue_green membangun collection baru lalu swap alias.
+    resume=true melanjutkan rebuild sebelumnya yang terputus (crash) dari checkpoint terakhir.
+    """
+    if mode not in ("blue_green", "in_place"):
+        raise HTTPException(status_code=400, detail="mode must be 'blue_green' or 'in_place'")
+    if profile and profile not in COLLECTION_PROFILES:
+        raise HTTPException(status_code=400, detail=f"profile must be one of {sorted(COLLECTION_PROFILES)}")
+    try:
+        job = job_manager.enqueue(
+            "rebuild", prefix=prefix, options={"mode": mode, "force_swap": force_swap, "profile": profile, "resume": resume}
+        )
+        return {
+            "success": True,
+            "prefix": prefix,
+            "mode": mode,
+            "job_id": job["id"],
+            "job_status_url": f"/jobs/{job['id']}",
+            "message": "Rebuild job queued"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error queueing rebuild: {str(e)}")
+
+@app.post("/documents/rebuild/rollback")
+def rollback_index():
+    """Kembalikan alias collection ke versi sebelumnya"""
+    result = rollback_collection_alias(settings, qdrant_client)
+    if not result.get("success") and "error" in result:
+        raise HTTPException(status_code=500, detail=result["error"])
+    return result
+
+@app.get("/documents/dead-letters")
+def get_dead_letters():
+    """Batch chunk yang gagal di-embed/upsert setelah semua retry"""
+    try:
+        items = list_dead_letters()
+        return {"dead_letters": items, "total": len(items), "total_chunks": sum(i["chunks"] for i in items)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing dead letters: {str(e)}")
+
+@app.post("/documents/dead-letters/replay")
+def replay_dead_letter_chunks(request: Optional[Dict[str, List[str]]] = None):
+    """Replay dead letters (semua, atau {"names": [...]}); dokumen yang perlu di-diff ulang di-index lewat job"""
+    try:
+        result = replay_dead_letters((request or {}).get("names"))
+        if result["reindex_sources"]:
+            job = job_manager.enqueue("files", files=result["reindex_sources"])
+            result["reindex_job_id"] = job["id"]
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error replaying dead letters: {str(e)}")
+
 @app.post("/upload-and-index")
 async def upload_and_index(
     files: List[UploadFile] = File(...),
     prefix: str = Form("sop/")
 ):
-    uploaded = []
-    errors = []
     if not prefix.endswith("/"):
         prefix += "/"
+    files_data = []
     for f in files:
-        try:
-            fname = f.filename
-            blob_name = f"{prefix}{fname}"
-            data = await f.read()
-            content_type = _detect_mime(fname)
-            blob_client = blob_container.get_blob_client(blob_name)
-            blob_client.upload_blob(
-                data,
-                overwrite=True,
-                content_settings=ContentSettings(content_type=content_type),
-            )
-            uploaded.append(blob_name)
-        except Exception as e:
-            errors.append(f"{fname}: {e}")
-    index_report = process_and_index_docs(prefix=prefix)
+        await f.seek(0)
+        files_data.append({
+            "filename": f.filename,
+            "stream": f.file,
+            "size": f.size,
+            "content_type": _detect_mime(f.filename)
+        })
+    upload_results = await run_in_threadpool(batch_upload_files, files_data, prefix, blob_container)
+    uploaded = upload_results["uploaded_files"]
+    job = job_manager.enqueue("prefix", prefix=prefix) if uploaded else None
     return {
         "uploaded": uploaded,
-        "upload_errors": errors,
-        "index_report": index_report
+        "upload_errors": [f"{item['file']}: {item['error']}" for item in upload_results["failed_files"]],
+        "throughput_mb_per_second": upload_results["throughput_mb_per_second"],
+        "job_id": job["id"] if job else None,
+        "job_status_url": f"/jobs/{job['id']}" if job else None
     }
 
+# ========== INDEXING JOB ENDPOINTS ==========
+@app.get("/jobs")
+def list_indexing_jobs(limit: int = 20):
+    """List job indexing terbaru (tanpa detail per file)"""
+    try:
+        jobs = job_manager.list_jobs(limit=limit)
+        return {"backend": job_manager.backend, "jobs": jobs, "total": len(jobs)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing jobs: {str(e)}")
+
+@app.get("/jobs/{job_id}")
+def get_indexing_job(job_id: str):
+    """Status job indexing: progress per file, jumlah chunk, dan timing"""
+    try:
+        job = job_manager.get_job(job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting job: {str(e)}")
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
 # ========== RAG CHAT ENDPOINT ==========
 @app.post("/rag-chat")
 def rag_chat(req: dict):
@@ -1,75 +1,6 @@
 from depedencies import *
 
-# Load env & Settings
-load_dotenv()
-
-# Konfigurasi Settings
-class Settings(BaseModel):
-    # Azure OpenAI
-    openai_key: str = os.getenv("azure-openai-api-key", "")
-    openai_endpoint: str = os.getenv("azure-openai-endpoint", "")
-    openai_api_version: str = os.getenv("azure-openai-api-version", "2024-05-01-preview")
-    openai_deployment: str = os.getenv("azure-openai-deployment", "gpt-4o-mini")
-    openai_embed_deployment: str = os.getenv("azure-openai-embed-deployment", "text-embedding-3-large")
-
-    # Cognitive Search
-    search_endpoint: str = os.getenv("azure-search-endpoint", "")
-    search_key: str = os.getenv("azure-search-key", "")
-    search_index: str = os.getenv("azure-search-index-name", "internal-docs-index")
-
-    # Blob
-    blob_conn: str = os.getenv("azure-blob-connection-string", "")
-    blob_container: str = os.getenv("azure-blob-container", "internal-docs")
-
-    # Document Intelligence
-    docint_endpoint: str = os.getenv("azure-docint-endpoint", "")
-    docint_key: str = os.getenv("azure-docint-key", "")
-
-    # Azure Function (preprocess)
-    func_preprocess_url: str = os.getenv("azure-function-preprocess-url", "")
-    func_preprocess_key: str = os.getenv("azure-function-preprocess-key", "")
-
-    # SQL
-    sql_server: str = os.getenv("azure-sql-server", "")
-    sql_db: str = os.getenv("azure-sql-database", "")
-    sql_user: str = os.getenv("azure-sql-username", "")
-    sql_password: str = os.getenv("azure-sql-password", "")
-
-        # === Load dari .env ===
-    MS_CLIENT_ID : str = os.getenv("ms-client-id","")
-    MS_CLIENT_SECRET : str = os.getenv("ms-client-secret","")
-    MS_TENANT_ID : str = os.getenv("ms-tenant-id","")
-    MS_GRAPH_SCOPE : str = os.getenv("ms-graph-scope", "https://graph.microsoft.com/.default")
-    MS_GROUP_ID : str = os.getenv("ms-group-id","")  # opsional, bisa kosong
-
-    @property
-    def ms_authority(self) -> str:
-        return f"https://login.microsoftonline.com/{self.MS_TENANT_ID}"
-    
-
-    # Notifications
-    notify_webhook: str = os.getenv("notify-webhook-url", "")
-
-    debug: bool = os.getenv("app-debug", "false").lower() == "true"
-
-    #qdrant
-    qdrant_url: str = os.getenv("qdrant-url","")
-    qdrant_api_key: str = os.getenv("qdrant-api-key","")
-    qdrant_collection: str = os.getenv("qdrant-collection","internal-docs-index")
-
-    # Redis (Memory - Short Term)
-    redis_host: str = os.getenv("redis-host", "")
-    redis_port: int = int(os.getenv("redis-port", "6380"))
-    redis_password: str = os.getenv("redis-password", "")
-    redis_ssl: bool = os.getenv("redis-ssl", "true").lower() == "true"
-
-    # Cosmos DB (Memory - Long Term)
-    cosmos_endpoint: str = os.getenv("cosmos-endpoint", "")
-    cosmos_key: str = os.getenv("cosmos-key", "")
-    cosmos_database: str = os.getenv("cosmos-database", "internal_assistant")
-    cosmos_container: str = os.getenv("cosmos-container", "conversation_history")
-
-settings = Settings()
+from app_config import Settings, settings
 
 
 # =====================
@@ -102,6 +33,55 @@ embeddings = AzureOpenAIEmbeddings(
 from qdrant_client import QdrantClient
 import requests
 
+from qdrant_client.http import models as qdrant_models
+from langchain_core.embeddings import Embeddings
+from qdrant_profiles import truncate_embedding
+import time
+
+def qdrant_vector_size(client: QdrantClient, name: str) -> int:
+    """Dimensi vektor (unnamed vector) collection atau alias."""
+    return client.get_collection(collection_name=name).config.params.vectors.size
+
+class MatryoshkaEmbeddings(Embeddings):
+    """
+    Embedding query yang mengikuti dimensi collection aktif (di-cache `ttl` detik),
+    sehingga query tetap cocok setelah alias di-swap ke collection berdimensi lain.
+    """
+
+    def __init__(self, base: Embeddings, dims_resolver, ttl: float = 60.0):
+        self.base = base
+        self.dims_resolver = dims_resolver
+        self.ttl = ttl
+        self._dims: Optional[int] = None
+        self._resolved_at = 0.0
+
+    def _current_dims(self) -> Optional[int]:
+        now = time.monotonic()
+        if self._dims is None or now - self._resolved_at > self.ttl:
+            try:
+                self._dims = self.dims_resolver()
+            except Exception as e:
+                print(f"⚠️ Could not resolve collection vector size: {e}")
+            self._resolved_at = now
+        return self._dims
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        dims = self._current_dims()
+        return [truncate_embedding(v, dims) for v in self.base.embed_documents(texts)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return truncate_embedding(self.base.embed_query(text), self._current_dims())
+
+def resolve_qdrant_collection(client: QdrantClient, name: str) -> Optional[str]:
+    """
+    Nama collection fisik untuk `name`: collection di balik alias (blue/green rebuild),
+    `name` sendiri bila collection biasa, atau None bila tidak ada.
+    """
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return name if client.collection_exists(name) else None
+
 print(f"🔗 Connecting to Qdrant at {settings.qdrant_url}")
 
 try:
@@ -127,16 +107,28 @@ try:
     print(f"✅ Connected to Qdrant. Collections: {len(collections.collections)}")
 
     # Initialize VectorStore with lazy loading
+    # Query embedding dipotong ke dimensi collection aktif (profil Matryoshka)
     vectorstoreQ = QdrantVectorStore(
         client=qdrant_client,
         collection_name=settings.qdrant_collection,
-        embedding=embeddings,
+        embedding=MatryoshkaEmbeddings(
+            embeddings, lambda: qdrant_vector_size(qdrant_client, settings.qdrant_collection)
+        ),
     )
     
-    # Test if collection exists
-    if qdrant_client.collection_exists(settings.qdrant_collection):
-        retriever = vectorstoreQ.as_retriever(search_type="similarity", k=3)
-        print("✅ Qdrant VectorStore initialized successfully")
+    # Test if collection exists (qdrant_collection boleh berupa alias)
+    active_collection = resolve_qdrant_collection(qdrant_client, settings.qdrant_collection)
+    if active_collection:
+        # Collection quantized: rescoring dengan vektor asli (diabaikan oleh collection float32)
+        search_params = qdrant_models.SearchParams(
+            quantization=qdrant_models.QuantizationSearchParams(
+                rescore=True, oversampling=settings.qdrant_search_oversampling
+            )
+        )
+        retriever = vectorstoreQ.as_retriever(
+            search_type="similarity", k=3, search_kwargs={"search_params": search_params}
+        )
+        print(f"✅ Qdrant VectorStore initialized successfully (collection: {active_collection})")
     else:
         print(f"⚠️ Collection '{settings.qdrant_collection}' not found")
         retriever = None
@@ -0,0 +1,467 @@
+"""
+Near-duplicate Detection
+MinHash (word 3-shingle, one-permutation hashing) + LSH band index persisten per collection,
+dipakai pipeline indexing untuk menandai / melewati chunk yang hampir sama dengan chunk
+dokumen lain. Modul ini tidak bergantung pada client Qdrant/Azure; payload Qdrant diurus rag_modul.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+
+_SHINGLE_WORD = re.compile(r"\w+")
+MINHASH_BINS = 64
+LSH_BANDS = 16  # 16 band x 4 baris: pasangan dengan Jaccard >= 0.8 hampir pasti jadi kandidat
+_MINHASH_VALUE_BITS = 58
+_MINHASH_EMPTY = 1 << _MINHASH_VALUE_BITS
+
+
+def minhash(text: str) -> Optional[List[int]]:
+    """
+    MinHash 64 bin dari word 3-shingle (lowercase), one-permutation hashing: tiap shingle
+    di-hash sekali, 6 bit bawah memilih bin, sisanya jadi nilai; bin kosong diisi dari bin
+    terisi berikutnya (densification) dengan jarak bin di 6 bit atas.
+    Fraksi bin yang sama antara dua signature = estimasi Jaccard similarity.
+    """
+    words = _SHINGLE_WORD.findall(text.lower())
+    if len(words) < 3:
+        shingles = set(words)
+    else:
+        shingles = {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+    if not shingles:
+        return None
+
+    sketch = [_MINHASH_EMPTY] * MINHASH_BINS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        b, v = h & (MINHASH_BINS - 1), h >> 6
+        if v < sketch[b]:
+            sketch[b] = v
+
+    if _MINHASH_EMPTY in sketch:
+        filled = [i for i, v in enumerate(sketch) if v != _MINHASH_EMPTY]
+        dense = list(sketch)
+        for i, v in enumerate(sketch):
+            if v == _MINHASH_EMPTY:
+                # Bin terisi berikutnya (melingkar) + jarak bin supaya tidak identik
+                j = next((f for f in filled if f > i), filled[0])
+                distance = (j - i) % MINHASH_BINS
+                dense[i] = sketch[j] | (distance << _MINHASH_VALUE_BITS)
+        sketch = dense
+    return sketch
+
+
+def _minhash_similarity(a: List[int], b: List[int]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / MINHASH_BINS
+
+
+def _lsh_band_keys(sketch: List[int]) -> List[int]:
+    """Satu key 63-bit per band (hash dari nilai-nilai bin di band tersebut)."""
+    rows = MINHASH_BINS // LSH_BANDS
+    return [
+        int.from_bytes(
+            hashlib.blake2b(array("Q", sketch[band * rows:(band + 1) * rows]).tobytes(), digest_size=8).digest(), "big"
+        ) >> 1
+        for band in range(LSH_BANDS)
+    ]
+
+
+def _pack_sketch(sketch: List[int]) -> bytes:
+    return array("Q", sketch).tobytes()
+
+
+def _unpack_sketch(blob: bytes) -> List[int]:
+    sketch = array("Q")
+    sketch.frombytes(blob)
+    return sketch.tolist()
+
+
+class NearDuplicateIndex:
+    """
+    Index signature MinHash persisten per collection untuk deteksi near-duplicate lintas korpus.
+
+    LSH banding: 64 bin dipecah jadi 16 band x 4 baris; kandidat = chunk yang sama persis di
+    minimal satu band, lalu diverifikasi dengan estimasi Jaccard >= threshold.
+
+    Hanya chunk kanonik (bukan duplikat) yang disimpan. Untuk setiap chunk duplikat dicatat
+    link ke chunk kanoniknya (semua mode), supaya saat chunk kanonik hilang (dokumen dihapus
+    atau di-index ulang dengan isi lain) dokumen yang bergantung padanya bisa di-index ulang.
+
+    Namespace = nama collection fisik (bukan alias); ikut dihapus bersama collection-nya.
+    Backend: sqlite (file lokal, default), redis (berbagi antar replika), atau off.
+    """
+
+    def __init__(self, backend: str, path: str = "", threshold: float = 0.8, redis_options: Optional[Dict[str, Any]] = None):
+        self.backend = backend
+        self.path = path
+        self.threshold = threshold
+        self.redis_options = redis_options or {}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._redis = None
+
+    def _sqlite(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS signatures (
+                    collection TEXT NOT NULL, chunk_id TEXT NOT NULL, source TEXT NOT NULL,
+                    sketch BLOB NOT NULL, PRIMARY KEY (collection, chunk_id));
+                CREATE INDEX IF NOT EXISTS signatures_source ON signatures (collection, source);
+                CREATE TABLE IF NOT EXISTS bands (
+                    collection TEXT NOT NULL, band INTEGER NOT NULL, key INTEGER NOT NULL, chunk_id TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS bands_lookup ON bands (collection, band, key);
+                CREATE INDEX IF NOT EXISTS bands_chunk ON bands (collection, chunk_id);
+                CREATE TABLE IF NOT EXISTS duplicate_links (
+                    collection TEXT NOT NULL, source TEXT NOT NULL, canonical_id TEXT NOT NULL,
+                    canonical_source TEXT NOT NULL, PRIMARY KEY (collection, source, canonical_id));
+                CREATE INDEX IF NOT EXISTS duplicate_links_canonical ON duplicate_links (collection, canonical_id);
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    collection TEXT NOT NULL, source TEXT NOT NULL, fingerprint TEXT NOT NULL,
+                    PRIMARY KEY (collection, source));
+            """)
+        return self._conn
+
+    def _redis_client(self):
+        if self._redis is None:
+            self._redis = redis.Redis(socket_timeout=5, socket_connect_timeout=5, **self.redis_options)
+        return self._redis
+
+    def _key(self, collection: str, *parts: Any) -> str:
+        return ":".join(["neardup", collection] + [str(p) for p in parts])
+
+    def _candidates(self, collection: str, sketches: List[List[int]], exclude_source: str) -> List[List[Tuple[str, str, List[int]]]]:
+        """Per sketch: list (chunk_id, source, sketch) yang sama di minimal satu band."""
+        if self.backend == "sqlite":
+            where = " OR ".join(["(b.band = ? AND b.key = ?)"] * LSH_BANDS)
+            query = (
+                "SELECT DISTINCT s.chunk_id, s.source, s.sketch FROM bands b "
+                "JOIN signatures s ON s.collection = b.collection AND s.chunk_id = b.chunk_id "
+                f"WHERE b.collection = ? AND s.source != ? AND ({where})"
+            )
+            results = []
+            with self._lock:
+                conn = self._sqlite()
+                for sketch in sketches:
+                    params = [collection, exclude_source]
+                    for band, key in enumerate(_lsh_band_keys(sketch)):
+                        params += [band, key]
+                    results.append([
+                        (chunk_id, source, _unpack_sketch(blob))
+                        for chunk_id, source, blob in conn.execute(query, params).fetchall()
+                    ])
+            return results
+
+        client = self._redis_client()
+        pipe = client.pipeline(transaction=False)
+        for sketch in sketches:
+            for band, key in enumerate(_lsh_band_keys(sketch)):
+                pipe.smembers(self._key(collection, "band", band, key))
+        members = pipe.execute()
+
+        per_sketch = [set().union(*members[i * LSH_BANDS:(i + 1) * LSH_BANDS]) for i in range(len(sketches))]
+        chunk_ids = sorted(set().union(*per_sketch)) if per_sketch else []
+        signatures = {}
+        if chunk_ids:
+            pipe = client.pipeline(transaction=False)
+            for chunk_id in chunk_ids:
+                pipe.hmget(self._key(collection, "sig", chunk_id.decode()), "source", "sketch")
+            for chunk_id, (source, blob) in zip(chunk_ids, pipe.execute()):
+                if source and blob:
+                    signatures[chunk_id] = (source.decode(), _unpack_sketch(blob))
+        return [
+            [(cid.decode(), signatures[cid][0], signatures[cid][1]) for cid in ids
+             if cid in signatures and signatures[cid][0] != exclude_source]
+            for ids in per_sketch
+        ]
+
+    def find_many(self, collection: str, sketches: List[Optional[List[int]]], exclude_source: str) -> List[Optional[Tuple[str, str, float]]]:
+        """
+        Near-duplicate paling mirip (chunk_id, source, similarity) per sketch dari dokumen lain,
+        atau None. Chunk dokumen itu sendiri (versi sebelumnya) tidak dihitung.
+        """
+        matches: List[Optional[Tuple[str, str, float]]] = [None] * len(sketches)
+        wanted = [(i, s) for i, s in enumerate(sketches) if s is not None]
+        if self.backend == "off" or not wanted:
+            return matches
+
+        try:
+            candidates = self._candidates(collection, [s for _, s in wanted], exclude_source)
+        except Exception as e:
+            print(f"⚠️ Near-duplicate index read failed: {e}")
+            return matches
+
+        for (i, sketch), found in zip(wanted, candidates):
+            best = None
+            for chunk_id, source, other in found:
+                similarity = _minhash_similarity(sketch, other)
+                if similarity >= self.threshold and (best is None or similarity > best[2]):
+                    best = (chunk_id, source, similarity)
+            matches[i] = best
+        return matches
+
+    def replace_source(
+        self,
+        collection: str,
+        source: str,
+        signatures: List[Tuple[str, List[int]]],
+        links: Optional[Dict[str, str]] = None,
+        fingerprint: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, List[str]]:
+        """
+        Ganti semua signature, link near-duplicate dan fingerprint satu dokumen dengan versi
+        yang baru di-index.
+
+        links: {ID chunk kanonik: dokumen kanonik} yang dipakai chunk dokumen ini (semua mode).
+        fingerprint: disimpan hanya untuk dokumen tanpa point (semua chunk di-skip sebagai
+        duplikat), supaya incremental indexing tetap bisa melihat dokumen itu tidak berubah.
+
+        Return {"sources": dokumen lain yang chunk-nya menunjuk chunk kanonik dokumen ini yang
+        sekarang hilang, "canonical_ids": chunk kanonik yang hilang tersebut}.
+        """
+        released: Dict[str, List[str]] = {"sources": [], "canonical_ids": []}
+        if self.backend == "off":
+            return released
+        links = links or {}
+        new_sketches = {chunk_id: _pack_sketch(sketch) for chunk_id, sketch in signatures}
+        fingerprint_json = json.dumps(fingerprint, sort_keys=True) if fingerprint else None
+
+        try:
+            if self.backend == "sqlite":
+                with self._lock:
+                    conn = self._sqlite()
+                    with conn:
+                        old_sketches = dict(conn.execute(
+                            "SELECT chunk_id, sketch FROM signatures WHERE collection = ? AND source = ?", (collection, source)
+                        ).fetchall())
+                        # Hilang = ID tidak ada lagi atau isinya berubah (chunk ID mode position)
+                        gone = sorted(cid for cid, blob in old_sketches.items() if new_sketches.get(cid) != blob)
+                        dependents, gone_linked = set(), set()
+                        for i in range(0, len(gone), 500):
+                            part = gone[i:i + 500]
+                            marks = ",".join("?" * len(part))
+                            for dependent, canonical_id in conn.execute(
+                                f"SELECT source, canonical_id FROM duplicate_links WHERE collection = ? "
+                                f"AND canonical_id IN ({marks}) AND source != ?",
+                                [collection] + part + [source],
+                            ).fetchall():
+                                dependents.add(dependent)
+                                gone_linked.add(canonical_id)
+                            conn.execute(
+                                f"DELETE FROM duplicate_links WHERE collection = ? AND canonical_id IN ({marks})",
+                                [collection] + part,
+                            )
+                            conn.execute(
+                                f"DELETE FROM bands WHERE collection = ? AND chunk_id IN ({marks})", [collection] + part
+                            )
+                            conn.execute(
+                                f"DELETE FROM signatures WHERE collection = ? AND chunk_id IN ({marks})", [collection] + part
+                            )
+
+                        added = [
+                            (chunk_id, sketch) for chunk_id, sketch in signatures
+                            if old_sketches.get(chunk_id) != new_sketches[chunk_id]
+                        ]
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO signatures (collection, chunk_id, source, sketch) VALUES (?, ?, ?, ?)",
+                            [(collection, chunk_id, source, new_sketches[chunk_id]) for chunk_id, _ in added],
+                        )
+                        conn.executemany(
+                            "INSERT INTO bands (collection, band, key, chunk_id) VALUES (?, ?, ?, ?)",
+                            [
+                                (collection, band, key, chunk_id)
+                                for chunk_id, sketch in added
+                                for band, key in enumerate(_lsh_band_keys(sketch))
+                            ],
+                        )
+                        conn.execute("DELETE FROM duplicate_links WHERE collection = ? AND source = ?", (collection, source))
+                        conn.executemany(
+                            "INSERT OR IGNORE INTO duplicate_links (collection, source, canonical_id, canonical_source) VALUES (?, ?, ?, ?)",
+                            [(collection, source, cid, csource) for cid, csource in links.items()],
+                        )
+                        conn.execute("DELETE FROM fingerprints WHERE collection = ? AND source = ?", (collection, source))
+                        if fingerprint_json:
+                            conn.execute(
+                                "INSERT INTO fingerprints (collection, source, fingerprint) VALUES (?, ?, ?)",
+                                (collection, source, fingerprint_json),
+                            )
+            else:
+                dependents, gone_linked = self._redis_replace_source(
+                    collection, source, signatures, new_sketches, links, fingerprint_json
+                )
+
+        except Exception as e:
+            print(f"⚠️ Near-duplicate index write failed ({source}): {e}")
+            return released
+
+        released["sources"] = sorted(dependents)
+        released["canonical_ids"] = sorted(gone_linked)
+        return released
+
+    def _redis_replace_source(
+        self,
+        collection: str,
+        source: str,
+        signatures: List[Tuple[str, List[int]]],
+        new_sketches: Dict[str, bytes],
+        links: Dict[str, str],
+        fingerprint_json: Optional[str],
+    ) -> Tuple[set, set]:
+        client = self._redis_client()
+        source_key = self._key(collection, "source", source)
+        links_key = self._key(collection, "links", source)
+        old_ids = sorted(cid.decode() for cid in client.smembers(source_key))
+        old_links = [cid.decode() for cid in client.hkeys(links_key)]
+
+        pipe = client.pipeline(transaction=False)
+        for chunk_id in old_ids:
+            pipe.hget(self._key(collection, "sig", chunk_id), "sketch")
+            pipe.smembers(self._key(collection, "dependents", chunk_id))
+        fetched = pipe.execute() if old_ids else []
+        old_sketches = {chunk_id: fetched[2 * i] for i, chunk_id in enumerate(old_ids)}
+
+        dependents, gone_linked = set(), set()
+        pipe = client.pipeline(transaction=False)
+        for i, chunk_id in enumerate(old_ids):
+            blob, members = fetched[2 * i], fetched[2 * i + 1]
+            if new_sketches.get(chunk_id) == blob:
+                continue
+            if blob:
+                for band, key in enumerate(_lsh_band_keys(_unpack_sketch(blob))):
+                    pipe.srem(self._key(collection, "band", band, key), chunk_id)
+            others = {m.decode() for m in members} - {source}
+            if others:
+                dependents |= others
+                gone_linked.add(chunk_id)
+            pipe.delete(self._key(collection, "sig", chunk_id), self._key(collection, "dependents", chunk_id))
+            pipe.srem(source_key, chunk_id)
+
+        for chunk_id, sketch in signatures:
+            if old_sketches.get(chunk_id) == new_sketches[chunk_id]:
+                continue
+            pipe.hset(self._key(collection, "sig", chunk_id), mapping={"source": source, "sketch": new_sketches[chunk_id]})
+            pipe.sadd(source_key, chunk_id)
+            for band, key in enumerate(_lsh_band_keys(sketch)):
+                pipe.sadd(self._key(collection, "band", band, key), chunk_id)
+
+        for canonical_id in old_links:
+            pipe.srem(self._key(collection, "dependents", canonical_id), source)
+        pipe.delete(links_key)
+        if links:
+            pipe.hset(links_key, mapping=links)
+            for canonical_id in links:
+                pipe.sadd(self._key(collection, "dependents", canonical_id), source)
+
+        if fingerprint_json:
+            pipe.hset(self._key(collection, "fingerprints"), source, fingerprint_json)
+        else:
+            pipe.hdel(self._key(collection, "fingerprints"), source)
+        pipe.execute()
+        return dependents, gone_linked
+
+    def remove_sources(self, collection: str, sources: List[str]) -> Dict[str, List[str]]:
+        """
+        Hapus signature, link dan fingerprint dokumen yang dihapus dari index.
+        Return dokumen lain yang menunjuk chunk kanonik dokumen ini (lihat replace_source).
+        """
+        dependents, canonical_ids = set(), set()
+        for source in sources:
+            released = self.replace_source(collection, source, [])
+            dependents.update(released["sources"])
+            canonical_ids.update(released["canonical_ids"])
+        return {"sources": sorted(dependents - set(sources)), "canonical_ids": sorted(canonical_ids)}
+
+    def fingerprints(self, collection: str) -> Dict[str, Dict[str, Any]]:
+        """Fingerprint dokumen tanpa point (semua chunk di-skip sebagai near-duplicate)."""
+        if self.backend == "off":
+            return {}
+        try:
+            if self.backend == "sqlite":
+                with self._lock:
+                    rows = self._sqlite().execute(
+                        "SELECT source, fingerprint FROM fingerprints WHERE collection = ?", (collection,)
+                    ).fetchall()
+            else:
+                rows = [
+                    (source.decode(), value.decode())
+                    for source, value in self._redis_client().hgetall(self._key(collection, "fingerprints")).items()
+                ]
+            return {source: json.loads(value) for source, value in rows}
+        except Exception as e:
+            print(f"⚠️ Near-duplicate index read failed: {e}")
+            return {}
+
+    def update_fingerprint(self, collection: str, source: str, fingerprint: Optional[Dict[str, Any]]):
+        """Update (atau hapus bila None) fingerprint dokumen tanpa point; dokumen lain tidak tersentuh."""
+        if self.backend == "off":
+            return
+        try:
+            if self.backend == "sqlite":
+                with self._lock:
+                    conn = self._sqlite()
+                    with conn:
+                        if fingerprint is None:
+                            conn.execute("DELETE FROM fingerprints WHERE collection = ? AND source = ?", (collection, source))
+                        else:
+                            conn.execute(
+                                "UPDATE fingerprints SET fingerprint = ? WHERE collection = ? AND source = ?",
+                                (json.dumps(fingerprint, sort_keys=True), collection, source),
+                            )
+            else:
+                client = self._redis_client()
+                key = self._key(collection, "fingerprints")
+                if fingerprint is None:
+                    client.hdel(key, source)
+                elif client.hexists(key, source):
+                    client.hset(key, source, json.dumps(fingerprint, sort_keys=True))
+        except Exception as e:
+            print(f"⚠️ Near-duplicate index write failed ({source}): {e}")
+
+    def drop_collection(self, collection: str):
+        """Hapus seluruh namespace satu collection (dipanggil saat collection Qdrant-nya dihapus)."""
+        if self.backend == "off":
+            return
+        try:
+            if self.backend == "sqlite":
+                with self._lock:
+                    conn = self._sqlite()
+                    with conn:
+                        for table in ("signatures", "bands", "duplicate_links", "fingerprints"):
+                            conn.execute(f"DELETE FROM {table} WHERE collection = ?", (collection,))
+            else:
+                client = self._redis_client()
+                keys = list(client.scan_iter(match=self._key(collection, "*"), count=1000))
+                for i in range(0, len(keys), 500):
+                    client.delete(*keys[i:i + 500])
+            print(f"🗑️ Near-duplicate index cleared for {collection}")
+        except Exception as e:
+            print(f"⚠️ Near-duplicate index cleanup failed ({collection}): {e}")
+
+
+def initialize_near_duplicate_index(settings) -> NearDuplicateIndex:
+    """
+    Initialize index near-duplicate sesuai settings (near-dup-mode off = backend off)
+
+    Args:
+        settings: Settings object (mode, backend, path, threshold, koneksi Redis)
+    """
+    backend = settings.near_dup_index_backend if settings.near_dup_mode != "off" else "off"
+    redis_options = None
+    if backend == "redis":
+        # Client terpisah dari memory manager: sketch biner butuh decode_responses=False
+        redis_options = {
+            "host": settings.redis_host,
+            "port": settings.redis_port,
+            "password": settings.redis_password,
+            "ssl": settings.redis_ssl,
+        }
+    return NearDuplicateIndex(backend, settings.near_dup_index_path, settings.near_dup_threshold, redis_options)
@@ -0,0 +1,97 @@
+"""
+Qdrant Profiles
+Profil collection (dimensi Matryoshka + quantization), argumen create_collection per profil,
+pemotongan vektor embedding dan scroll seluruh collection. Modul ini tidak membuat client;
+client Qdrant diberikan oleh pemanggil (documentManagement, benchmark).
+"""
+import math
+from typing import Any, Dict, List, Optional
+
+from qdrant_client.http import models as qdrant_models
+
+# Dimensi text-embedding-3-large
+INDEX_VECTOR_SIZE = 3072
+
+# Profil collection: dims < 3072 = Matryoshka (vektor dipotong + dinormalisasi ulang).
+# Profil quantized menyimpan vektor asli di disk dan quantized vector di RAM untuk rescoring.
+COLLECTION_PROFILES: Dict[str, Dict[str, Any]] = {
+    "float32": {"dims": INDEX_VECTOR_SIZE, "quantization": None, "on_disk": False},
+    "int8": {"dims": INDEX_VECTOR_SIZE, "quantization": "int8", "on_disk": True, "hnsw_m": 16, "hnsw_ef_construct": 128},
+    "binary": {"dims": INDEX_VECTOR_SIZE, "quantization": "binary", "on_disk": True, "hnsw_m": 16, "hnsw_ef_construct": 128},
+    "int8-1536": {"dims": 1536, "quantization": "int8", "on_disk": True, "hnsw_m": 16, "hnsw_ef_construct": 128},
+    "binary-1536": {"dims": 1536, "quantization": "binary", "on_disk": True, "hnsw_m": 16, "hnsw_ef_construct": 128},
+}
+
+def _collection_profile_config(profile_name: str) -> Dict[str, Any]:
+    """Argumen create_collection untuk satu profil."""
+    if profile_name not in COLLECTION_PROFILES:
+        raise ValueError(f"Unknown collection profile '{profile_name}'. Available: {sorted(COLLECTION_PROFILES)}")
+    profile = COLLECTION_PROFILES[profile_name]
+
+    config = {
+        "vectors_config": qdrant_models.VectorParams(
+            size=profile["dims"],
+            distance=qdrant_models.Distance.COSINE,
+            on_disk=profile["on_disk"]
+        )
+    }
+    if profile.get("hnsw_m"):
+        config["hnsw_config"] = qdrant_models.HnswConfigDiff(
+            m=profile["hnsw_m"],
+            ef_construct=profile["hnsw_ef_construct"]
+        )
+    if profile["quantization"] == "int8":
+        config["quantization_config"] = qdrant_models.ScalarQuantization(
+            scalar=qdrant_models.ScalarQuantizationConfig(
+                type=qdrant_models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True
+            )
+        )
+    elif profile["quantization"] == "binary":
+        config["quantization_config"] = qdrant_models.BinaryQuantization(
+            binary=qdrant_models.BinaryQuantizationConfig(always_ram=True)
+        )
+    return config
+
+
+def truncate_embedding(vector: List[float], dims: Optional[int]) -> List[float]:
+    """Matryoshka: potong vektor text-embedding-3 ke `dims` pertama lalu normalisasi ulang."""
+    if not dims or dims >= len(vector):
+        return vector
+    head = vector[:dims]
+    norm = math.sqrt(sum(x * x for x in head)) or 1.0
+    return [x / norm for x in head]
+
+
+def iter_qdrant_points(
+    qdrant_client,
+    collection_name: str,
+    scroll_filter: Optional[qdrant_models.Filter] = None,
+    payload_fields: Optional[List[str]] = None,
+    with_payload: bool = True,
+    page_size: int = 1000,
+    with_vectors: bool = False,
+):
+    """
+    Generator yang scroll seluruh collection halaman per halaman (mengikuti next_offset).
+    payload_fields membatasi field payload yang dikirim Qdrant, sehingga memori tetap
+    konstan berapa pun jumlah point di collection.
+    """
+    offset = None
+
+    while True:
+        results, offset = qdrant_client.scroll(
+            collection_name=collection_name,
+            scroll_filter=scroll_filter,
+            limit=page_size,
+            offset=offset,
+            with_payload=payload_fields if payload_fields is not None else with_payload,
+            with_vectors=with_vectors
+        )
+
+        for point in results:
+            yield point
+
+        if offset is None:
+            break
@@ -1,832 +1,1962 @@
 from depedencies import *
 from depedencies import detect, DetectorFactory
-from internal_assistant_core import llm, retriever, vectorstoreQ, blob_container, doc_client, settings
+from internal_assistant_core import llm, retriever, vectorstoreQ, blob_container, doc_client, settings, embeddings, qdrant_client
+from internal_assistant_core import qdrant_vector_size, truncate_embedding, resolve_qdrant_collection
+from qdrant_client.http import models as qdrant_models
 import base64
 import re
-import tiktoken
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple, Union, IO, Callable, Iterator, Iterable
 import hashlib
+import itertools
 import time
+import gzip
+import tempfile
 import sys
 from io import BytesIO
 import contextlib
 import uuid
+import threading
+import random
+import sqlite3
+from array import array
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from azure.core.exceptions import ResourceNotFoundError
 from difflib import SequenceMatcher
+from pypdf import PdfReader, PdfWriter
+from docx import Document as DocxDocument
+from openpyxl import load_workbook
+from near_duplicates import minhash, initialize_near_duplicate_index
+from chunking import (
+    tiktoken_len, _clean_text, TableGrid, _iter_sections, _table_element, _iter_docint_elements,
+    chunking_profile_for, _iter_intelligent_chunks, _chunk_content_hash,
+)
 
-tokenizer = tiktoken.get_encoding("cl100k_base")
-def tiktoken_len(text):
-    return len(tokenizer.encode(text))
 
 def _make_safe_doc_id(blob_name: str) -> str:
     return base64.urlsafe_b64encode(blob_name.encode()).decode()
 
-# === Advanced text cleaning dengan preserve struktur ===
-def _clean_text(text: str) -> str:
-    if not text:
-        return ""
-    
-    # Preserve struktur dokumen yang penting
-    txt = text.replace("\u00a0", " ")            # Non-breaking space
-    txt = re.sub(r"[•●▪∙◦]", "- ", txt)          # Bullet points dengan spasi
-    txt = re.sub(r'[ \t]+', ' ', txt)            # Multiple spaces jadi single space
-    txt = re.sub(r'\n{4,}', '\n\n\n', txt)       # Max 3 newlines berturut-turut
-    
-    # Preserve numbering dan struktur hierarki
-    txt = re.sub(r'(\d+)\.(\s*)', r'\1. ', txt)  # Normalize numbering
-    txt = re.sub(r'(\d+\.\d+)\.(\s*)', r'\1. ', txt)  # Sub-numbering
-    
-    return txt.strip()
-
-# ============Table Handler============
-# === Table Continuation Detection Functions ===
 
-def _extract_table_headers(table: Any) -> List[str]:
-    """Extract header row from table."""
-    if not hasattr(table, 'cells') or not table.cells:
-        return []
-    
-    header_cells = sorted(
-        [c for c in table.cells if c.row_index == 0],
-        key=lambda c: c.column_index
-    )
-    
-    return [_clean_text(c.content) for c in header_cells]
+# === Ekstraksi teks yang comprehensive dan general ===
 
+def _pdf_page_count(document: IO[bytes]) -> Optional[int]:
+    """Jumlah halaman PDF (baca xref saja, tanpa render); None bila bukan PDF / tidak terbaca."""
+    document.seek(0)
+    is_pdf = document.read(5) == b"%PDF-"
+    document.seek(0)
+    if not is_pdf:
+        return None
 
-def _calculate_header_similarity(headers1: List[str], headers2: List[str]) -> float:
-    """Calculate similarity between two header lists."""
-    if len(headers1) != len(headers2):
-        return 0.0
-    
-    if not headers1:
-        return 0.0
-    
-    matches = sum(1 for h1, h2 in zip(headers1, headers2) if h1.lower() == h2.lower())
-    return matches / len(headers1)
+    try:
+        return len(PdfReader(document).pages)
+    except Exception as e:
+        print(f"⚠️ Could not read PDF page count: {e}")
+        return None
+    finally:
+        document.seek(0)
 
 
-def _analyze_column_types(table: Any) -> List[str]:
-    """Analyze content type of each column."""
-    if not hasattr(table, 'cells') or not table.cells:
-        return []
-    
-    col_count = getattr(table, 'column_count', 0)
-    if not col_count:
-        return []
-    
-    column_types = []
-    
-    for col_idx in range(col_count):
-        col_cells = [c for c in table.cells if c.column_index == col_idx and c.row_index > 0]
-        
-        if not col_cells:
-            column_types.append('empty')
-            continue
-        
-        has_numbers = sum(1 for c in col_cells if re.search(r'\d', c.content))
-        has_text = sum(1 for c in col_cells if re.search(r'[a-zA-Z]', c.content))
-        
-        total = len(col_cells)
-        
-        if has_numbers > total * 0.7:
-            column_types.append('number')
-        elif has_text > total * 0.7:
-            column_types.append('text')
-        else:
-            column_types.append('mixed')
-    
-    return column_types
+def _page_ranges(page_count: int, pages_per_range: int) -> List[Tuple[int, int]]:
+    """[(first, last), ...] 1-based inklusif, mis. 120 halaman / 50 -> 1-50, 51-100, 101-120."""
+    return [
+        (first, min(first + pages_per_range - 1, page_count))
+        for first in range(1, page_count + 1, pages_per_range)
+    ]
 
 
-def _is_table_continuation(table1: Any, table2: Any, distance: int = 1) -> bool:
-    """Detect if table2 is a continuation of table1."""
-    
-    if distance > 2:
-        return False
-    
-    # Check column count
-    if not (hasattr(table1, 'column_count') and hasattr(table2, 'column_count')):
-        return False
-    
-    if table1.column_count != table2.column_count:
-        return False
-    
-    # Check page proximity
-    page1 = getattr(table1, 'bounding_regions', [None])[0]
-    page2 = getattr(table2, 'bounding_regions', [None])[0]
-    
-    if page1 and page2:
-        page1_num = getattr(page1, 'page_number', None)
-        page2_num = getattr(page2, 'page_number', None)
-        
-        if page1_num and page2_num:
-            if page2_num > page1_num + 1:
-                return False
-    
-    # Compare headers
-    headers1 = _extract_table_headers(table1)
-    headers2 = _extract_table_headers(table2)
-    
-    if headers1 and headers2:
-        if headers1 == headers2:
-            print(f"  ✓ Identical headers detected")
-            return True
-        
-        similarity = _calculate_header_similarity(headers1, headers2)
-        if similarity > 0.8:
-            print(f"  ✓ Similar headers: {similarity:.2f}")
-            return True
-    
-    # Check if first row is data
-    if hasattr(table2, 'cells') and table2.cells:
-        first_row_cells = [c for c in table2.cells if c.row_index == 0]
-        
-        if first_row_cells:
-            avg_length = sum(len(c.content) for c in first_row_cells) / len(first_row_cells)
-            
-            if avg_length > 30:
-                print(f"  ✓ First row appears to be data")
-                return True
-            
-            has_data_pattern = any(
-                bool(re.search(r'\d+[.,]\d+|\d{4}|IDR|Rp|\%', c.content))
-                for c in first_row_cells
-            )
-            
-            if has_data_pattern:
-                print(f"  ✓ First row contains data patterns")
-                return True
-    
-    # Check column types
-    col_types1 = _analyze_column_types(table1)
-    col_types2 = _analyze_column_types(table2)
-    
-    if col_types1 and col_types2 and len(col_types1) == len(col_types2):
-        type_match = sum(1 for t1, t2 in zip(col_types1, col_types2) if t1 == t2)
-        type_ratio = type_match / len(col_types1)
-        
-        if type_ratio > 0.7:
-            print(f"  ✓ Column types match: {type_ratio:.2f}")
-            return True
-    
-    return False
+class DocumentAnalysisError(Exception):
+    """Layout analysis gagal untuk sebagian dokumen (mis. satu range halaman); dokumen tidak di-index."""
 
 
-def _merge_table_list(tables: List[Any]) -> Any:
-    """Merge multiple table objects into one."""
-    if len(tables) == 1:
-        return tables[0]
-    
-    print(f"  Merging {len(tables)} tables into one")
-    
-    all_rows = {}
-    current_row_offset = 0
-    
-    for table_idx, table in enumerate(tables):
-        if not hasattr(table, 'cells'):
-            continue
-        
-        # Skip header for continuation tables
-        start_row = 1 if table_idx > 0 else 0
-        
-        for cell in table.cells:
-            if cell.row_index < start_row:
-                continue
-            
-            adjusted_row = cell.row_index - start_row + current_row_offset
-            
-            if adjusted_row not in all_rows:
-                all_rows[adjusted_row] = {}
-            
-            all_rows[adjusted_row][cell.column_index] = _clean_text(cell.content)
-        
-        max_row = max((c.row_index for c in table.cells), default=0)
-        current_row_offset += (max_row - start_row + 1)
-    
-    # Create pseudo-table object
-    class MergedTable:
-        def __init__(self, rows_dict, column_count, original_table):
-            self.rows_dict = rows_dict
-            self.column_count = column_count
-            self.row_count = len(rows_dict)
-            self.bounding_regions = getattr(original_table, 'bounding_regions', [])
-            
-        @property
-        def cells(self):
-            cells = []
-            for row_idx, row_data in self.rows_dict.items():
-                for col_idx, content in row_data.items():
-                    cell = type('Cell', (), {
-                        'row_index': row_idx,
-                        'column_index': col_idx,
-                        'content': content
-                    })()
-                    cells.append(cell)
-            return cells
-    
-    return MergedTable(all_rows, tables[0].column_count, tables[0])
+class _StitchedAnalyzeResult:
+    """
+    Gabungan AnalyzeResult beberapa range halaman, urut sesuai halaman.
 
+    Nomor halaman tiap range sudah digeser ke nomor absolut (_offset_page_numbers), jadi
+    cukup disambung: posisi paragraf dihitung ulang saat di-walk dan
+    _merge_multi_page_tables melihat tabel lintas batas range sebagai satu daftar.
+    """
 
-def _merge_multi_page_tables(tables: List[Any]) -> List[Any]:
-    """Merge tables that are continuations across pages."""
-    if not tables or len(tables) < 2:
-        return list(tables)
-    
-    merged = []
-    i = 0
-    
-    while i < len(tables):
-        current_table = tables[i]
-        continuation_tables = [current_table]
-        j = i + 1
-        
-        while j < len(tables):
-            is_continuation = _is_table_continuation(
-                continuation_tables[-1], 
-                tables[j],
-                j - i
-            )
-            
-            if is_continuation:
-                print(f"✓ Table {j} detected as continuation of table {i}")
-                continuation_tables.append(tables[j])
-                j += 1
-            else:
+    def __init__(self, results: List[Any]):
+        self.pages = [page for res in results for page in (getattr(res, "pages", None) or [])]
+        self.paragraphs = [para for res in results for para in (getattr(res, "paragraphs", None) or [])]
+        self.tables = [table for res in results for table in (getattr(res, "tables", None) or [])]
+
+
+def _offset_page_numbers(res: Any, offset: int):
+    """PDF potongan mulai dari halaman 1: geser nomor halaman ke posisi di dokumen asli."""
+    if not offset:
+        return
+    for page in getattr(res, "pages", None) or []:
+        if getattr(page, "page_number", None):
+            page.page_number += offset
+
+    tables = getattr(res, "tables", None) or []
+    cells = (cell for table in tables for cell in (getattr(table, "cells", None) or []))
+    for item in itertools.chain(getattr(res, "paragraphs", None) or [], tables, cells):
+        for region in getattr(item, "bounding_regions", None) or []:
+            if getattr(region, "page_number", None):
+                region.page_number += offset
+
+
+def _split_pdf_range(reader: PdfReader, reader_lock: threading.Lock, first: int, last: int) -> IO[bytes]:
+    """Tulis halaman first..last (1-based) sebagai PDF tersendiri ke spool (disk di atas index-spool-max-bytes)."""
+    writer = PdfWriter()
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.index_spool_max_bytes)
+    # PdfReader membaca stream sumber secara lazy dan tidak thread-safe
+    with reader_lock:
+        for index in range(first - 1, last):
+            writer.add_page(reader.pages[index])
+        writer.write(spool)
+    spool.seek(0)
+    return spool
+
+
+def _analyze_page_range(reader: PdfReader, reader_lock: threading.Lock, first: int, last: int) -> Any:
+    """
+    Analisis satu range halaman (di-upload hanya halaman range tersebut). Error sementara
+    di-retry dengan backoff; bila tetap gagal raise DocumentAnalysisError supaya dokumen
+    gagal secara eksplisit, bukan ter-index tanpa sebagian halamannya.
+    """
+    with _split_pdf_range(reader, reader_lock, first, last) as part:
+        for attempt in range(settings.docint_range_max_retries + 1):
+            t0 = time.perf_counter()
+            try:
+                part.seek(0)
+                poller = doc_client.begin_analyze_document("prebuilt-layout", document=part)
+                res = poller.result()
                 break
-        
-        if len(continuation_tables) > 1:
-            merged_table = _merge_table_list(continuation_tables)
-            merged.append(merged_table)
-            print(f"✓ Merged {len(continuation_tables)} tables")
-        else:
-            merged.append(current_table)
-        
-        i = j
-    
-    return merged
+            except Exception as e:
+                if attempt >= settings.docint_range_max_retries or not _is_retryable_error(e):
+                    raise DocumentAnalysisError(f"pages {first}-{last}: {e}") from e
+                delay = _retry_after_seconds(e)
+                if delay is None:
+                    delay = min(30.0, 2.0 ** attempt) * (0.5 + random.random() / 2)
+                print(f"⚠️ Pages {first}-{last} attempt {attempt + 1} failed ({_error_status_code(e)}): {e}; "
+                      f"retrying in {round(delay, 2)}s")
+                time.sleep(delay)
 
+    _offset_page_numbers(res, first - 1)
+    print(f"  📄 Pages {first}-{last} analyzed in {time.perf_counter() - t0:.1f}s")
+    return res
 
-# === Ekstraksi teks yang comprehensive dan general ===
 
-def _extract_text_with_docint(binary: bytes) -> Dict[str, List[Dict[str, Any]]]:
-    """Extract structured text dengan metadata posisi dan context - GENERAL untuk semua dokumen."""
+def _analyze_page_ranges(document: IO[bytes], page_count: int) -> Any:
+    """
+    Analisis PDF besar per range halaman secara paralel lalu sambung hasilnya.
+    PDF dipecah lokal per range (pypdf), jadi tiap request hanya membawa halamannya sendiri
+    dan dokumen tidak pernah dibaca utuh ke memori.
+    """
+    ranges = _page_ranges(page_count, settings.docint_pages_per_range)
+    workers = max(1, min(settings.docint_range_concurrency, len(ranges)))
+    print(f"📑 Splitting {page_count} pages into {len(ranges)} ranges ({workers} concurrent)")
+
+    document.seek(0)
+    reader = PdfReader(document)
+    reader_lock = threading.Lock()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda r: _analyze_page_range(reader, reader_lock, *r), ranges))
+
+    return _StitchedAnalyzeResult(results)
+
+
+def _analyze_document(document: Union[bytes, IO[bytes]]) -> Optional[Any]:
+    """Layout analysis Document Intelligence; return AnalyzeResult atau None bila gagal.
+
+    document boleh bytes atau file object (mis. spool dari _download_blob_to_spool);
+    file object di-stream langsung ke Document Intelligence tanpa dibaca ulang ke memori.
+    PDF di atas docint-pages-per-range halaman dipecah per range dan dianalisis paralel;
+    range yang tetap gagal setelah retry me-raise DocumentAnalysisError (tidak jadi None).
+    """
+    if isinstance(document, (bytes, bytearray)):
+        document = BytesIO(document)
+    else:
+        document.seek(0)
+
     try:
-        # ✅ Force baca semua halaman
-        poller = doc_client.begin_analyze_document(
-            "prebuilt-layout",
-            document=BytesIO(binary)   # lebih aman untuk file besar
-        )
-        res = poller.result()
+        page_count = _pdf_page_count(document) if settings.docint_pages_per_range > 0 else None
+        if page_count and page_count > settings.docint_pages_per_range:
+            res = _analyze_page_ranges(document, page_count)
+        else:
+            # ✅ Force baca semua halaman
+            poller = doc_client.begin_analyze_document(
+                "prebuilt-layout",
+                document=document
+            )
+            res = poller.result()
+    except DocumentAnalysisError as e:
+        print(f"❌ Error analyzing document: {e}")
+        raise
     except Exception as e:
         print(f"Error analyzing document: {e}")
-        return {"sections": [], "raw_tables": [], "document_structure": []}
+        return None
 
     # ✅ Debug jumlah halaman yang berhasil dibaca
     if hasattr(res, "pages"):
         print(f"✅ Document Intelligence extracted {len(res.pages)} pages")
 
-    processed = {
-        "sections": [],  # Semua bagian dengan metadata
-        "raw_tables": [],
-        "document_structure": []  # Struktur hierarki dokumen
-    }
+    return res
 
-    current_section = None
-    section_counter = 0
 
-    # Process paragraphs dengan context dan posisi - GENERAL approach
-    if hasattr(res, "paragraphs"):
-        for idx, para in enumerate(res.paragraphs):
-            role = getattr(para, "role", None)
-            text = _clean_text(para.content)
-            if not text: #or len(text) < 10:  # Skip very short content
-                continue
 
-            content_type = _classify_content_type(text, role)
-            
-            section_data = {
-                "content": text,
-                "type": content_type,
-                "role": role,
-                "position": idx,
-                "tokens": tiktoken_len(text)
-            }
+def _serializable_element(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Salinan element tanpa TableGrid (in-memory saja) supaya bisa di-json.dumps."""
+    if "grid" not in data:
+        return data
+    return {k: v for k, v in data.items() if k != "grid"}
 
-            # Jika heading, mulai section baru
-            if content_type in ["title", "heading", "section_header", "chapter", "subsection"]:
-                if current_section:
-                    processed["sections"].append(current_section)
-                
-                current_section = {
-                    "header": text,
-                    "type": content_type,
-                    "content_parts": [section_data],
-                    "section_id": section_counter,
-                    "total_tokens": tiktoken_len(text)
-                }
-                section_counter += 1
-            else:
-                if current_section:
-                    current_section["content_parts"].append(section_data)
-                    current_section["total_tokens"] += tiktoken_len(text)
-                else:
-                    current_section = {
-                        "header": "Document Content",
-                        "type": "content",
-                        "content_parts": [section_data],
-                        "section_id": section_counter,
-                        "total_tokens": tiktoken_len(text)
-                    }
-                    section_counter += 1
-
-            processed["document_structure"].append(section_data)
-
-        if current_section:
-            processed["sections"].append(current_section)
-
-    # Process tables dengan context yang lebih baik
-    if hasattr(res, "tables"):
-        print(f"📊 Found {len(res.tables)} raw tables, checking for continuations...")
-        merged_tables = _merge_multi_page_tables(res.tables)
-        print(f"📊 After merging: {len(merged_tables)} tables")
-
-        for table_idx, table in enumerate(merged_tables):
-            if not hasattr(table, 'cells') or not table.cells:
-                print(f"⚠️  Table {table_idx}: No cells found, skipping")
-                continue
-            rows = {}
-            headers = []
-            
-            for cell in table.cells:
-                content = _clean_text(cell.content)
-                if cell.row_index not in rows:
-                    rows[cell.row_index] = {}
-                rows[cell.row_index][cell.column_index] = content
-                
-                if cell.row_index == 0:
-                    headers.append(content)
 
-            table_rows = []
-            for r in sorted(rows.keys()):
-                row_data = [rows[r].get(c, "") for c in sorted(rows[r].keys())]
-                table_rows.append(" | ".join(row_data))
-            
-            table_text = "\n".join(table_rows)
-            actual_rows = len(rows)
+def _extract_text_with_docint(document: Union[bytes, IO[bytes]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Extract structured text dengan metadata posisi dan context - GENERAL untuk semua dokumen.
 
-            print(f"✓ Table {table_idx}: Extracted {actual_rows} rows, {len(headers)} columns")
-            
-            processed["raw_tables"].append({
-                "content": table_text,
-                "headers": headers,
-                "table_id": table_idx,
-                "tokens": tiktoken_len(table_text),
-                "row_count": len(rows)
-            })
+    Versi non-streaming (dipakai test_extraction.py): kumpulkan semua section dan tabel
+    dari _iter_docint_elements ke satu dict.
+    """
+    processed = {"sections": [], "raw_tables": []}
+
+    res = _analyze_document(document)
+    if res is None:
+        return processed
+
+    for kind, data in _iter_docint_elements(res):
+        processed["sections" if kind == "section" else "raw_tables"].append(_serializable_element(data))
 
     return processed
 
 
-def _classify_content_type(text: str, role: Optional[str] = None) -> str:
-    """FIXED: Klasifikasi jenis konten dengan deteksi core values yang lebih baik."""
-    text_upper = text.upper()
-    text_lower = text.lower()
-    
-    # Deteksi berdasarkan role
-    if role and "title" in role.lower():
+# === Native extractors: parser lokal per MIME type, Document Intelligence sebagai fallback ===
+# Heading bernomor / BAB x di PDF/TXT tanpa style: mulai paragraf baru walau tanpa baris kosong
+_HEADING_LINE_PATTERN = re.compile(r"^((BAB|CHAPTER|SECTION|BAGIAN)\s*\d+|\d+(\.\d+)*\.?\s+\S)", re.IGNORECASE)
+
+
+def _split_plain_paragraphs(text: str) -> List[str]:
+    """Pecah teks polos jadi paragraf: baris kosong, atau baris pendek yang mirip heading."""
+    paragraphs = []
+    for block in re.split(r"\n\s*\n", text):
+        current = []
+        for line in block.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if len(line.split()) <= 12 and _HEADING_LINE_PATTERN.match(line):
+                if current:
+                    paragraphs.append(" ".join(current))
+                    current = []
+                paragraphs.append(line)
+                continue
+            current.append(line)
+        if current:
+            paragraphs.append(" ".join(current))
+    return paragraphs
+
+
+def _extract_plain_text(document: IO[bytes]) -> Optional[Iterator[Tuple[str, Dict[str, Any]]]]:
+    raw = document.read()
+    for encoding in ("utf-8-sig", "cp1252", "latin-1"):
+        try:
+            text = raw.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+
+    paragraphs = _split_plain_paragraphs(text)
+    if not paragraphs:
+        return None
+    return _iter_sections((p, None) for p in paragraphs)
+
+
+def _docx_role(style_name: str) -> Optional[str]:
+    """Style Word -> role ala Document Intelligence (dipakai _classify_content_type)."""
+    name = (style_name or "").lower()
+    if name == "title":
         return "title"
-    if role and "heading" in role.lower():
-        return "heading"
-    
-    # FIX: Enhanced core values detection
-    if any(keyword in text_upper for keyword in ["CORE VALUES", "NILAI INTI"]):
-        return "core_values_header"
-    
-    # FIX: Detect individual core value items
-    core_value_items = ["HUMBLE", "CUSTOMER FOCUSED", "EMPLOYEE SATISFACTION", 
-                       "SPEED", "PASSION", "INTEGRITY", "DISCIPLINE"]
-    if any(cv in text_upper for cv in core_value_items):
-        # Check if it's a header or detailed content
-        if len(text.split()) < 10:  # Short text, likely header
-            return "core_value_item"
-        else:  # Longer text with core value content
-            return "core_value_content"
-    
-    # Pattern umum untuk berbagai bahasa dan jenis dokumen
-    # Table of Contents patterns
-    if any(keyword in text_upper for keyword in 
-           ["DAFTAR ISI", "TABLE OF CONTENTS", "CONTENTS", "INDEX", "INDEKS"]):
-        return "table_of_contents"
-    
-    # Chapter/Section patterns
-    if re.match(r'^(BAB|CHAPTER|SECTION|BAGIAN)\s*\d+', text_upper):
-        return "chapter"
-    
-    if re.match(r'^\d+\.', text.strip()):  # Dimulai dengan nomor
-        return "section_header"
-    
-    if re.match(r'^\d+\.\d+', text.strip()):  # Sub section
-        return "subsection_header"
-    
-    # Appendix patterns
-    if any(keyword in text_upper for keyword in 
-           ["APPENDIX", "LAMPIRAN", "ANNEX", "ATTACHMENT"]):
-        return "appendix"
-    
-    # General important sections
-    if any(keyword in text_upper for keyword in 
-           ["PURPOSE", "TUJUAN", "VISION", "VISI", "MISSION", "MISI", 
-            "OBJECTIVE", "SASARAN", "GOAL", "TARGET", "INTRODUCTION", 
-            "PENDAHULUAN", "OVERVIEW", "RINGKASAN", "SUMMARY",
-            "CONCLUSION", "KESIMPULAN", "RECOMMENDATION", "REKOMENDASI"]):
-        return "purpose_statement"
-    
-    # Procedure/Process patterns
-    if any(keyword in text_upper for keyword in 
-           ["PROCEDURE", "PROSEDUR", "PROCESS", "PROSES", "WORKFLOW",
-            "LANGKAH", "TAHAP", "STEPS", "CARA"]):
-        return "detailed_content"
-    
-    # Policy/Rule patterns
-    if any(keyword in text_upper for keyword in 
-           ["POLICY", "KEBIJAKAN", "RULE", "ATURAN", "REGULATION",
-            "REGULASI", "GUIDELINE", "PANDUAN"]):
-        return "detailed_content"
-    
-    # Long detailed content
-    if len(text.split()) > 100:
-        return "detailed_content"
-    
-    # Table content detection
-    if any(char in text for char in ["|", ":", "─", "┌", "└"]) or \
-       (text.count("|") > 2 and "\n" in text):
-        return "table_content"
-    
-    # List content
-    if text.count("- ") > 2 or text.count("• ") > 2:
-        return "content"
-    
-    return "content"
+    if name.startswith("heading"):
+        return "sectionHeading"
+    return None
 
-# === Cost-optimized intelligent chunking strategy ===
-def _create_intelligent_chunks(doc_data: Dict[str, List[Dict]]) -> List[Dict[str, Any]]:
-    """FIXED: Create chunks dengan special handling untuk core values."""
-    chunks = []
-    
-    # FIX: Detect and group core values content
-    core_values_sections = []
-    other_sections = []
-    
-    for section in doc_data.get("sections", []):
-        section_type = section.get("type", "")
-        section_header = section.get("header", "").lower()
-        
-        # Check if this section contains core values
-        is_core_values = False
-        if "core" in section_type or "core" in section_header:
-            is_core_values = True
-        else:
-            # Check content parts for core values keywords
-            for part in section.get("content_parts", []):
-                content = part.get("content", "").lower()
-                if any(cv in content for cv in ["humble", "customer focused", "employee satisfaction",
-                                              "speed", "passion", "integrity", "discipline", "core values"]):
-                    is_core_values = True
-                    break
-        
-        if is_core_values:
-            core_values_sections.append(section)
+
+def _extract_docx(document: IO[bytes]) -> Optional[Iterator[Tuple[str, Dict[str, Any]]]]:
+    doc = DocxDocument(document)
+    paragraphs = [
+        (p.text, _docx_role(p.style.name if p.style is not None else ""))
+        for p in doc.paragraphs
+        if p.text.strip()
+    ]
+
+    tables = []
+    for table in doc.tables:
+        rows = []
+        for row in table.rows:
+            # Sel merged muncul berulang di row.cells; ambil sekali per sel fisik
+            seen, cells = set(), []
+            for cell in row.cells:
+                if id(cell._tc) in seen:
+                    continue
+                seen.add(id(cell._tc))
+                cells.append(_clean_text(cell.text))
+            if any(cells):
+                rows.append(cells)
+        if rows:
+            tables.append(TableGrid.from_rows(rows))
+
+    if not paragraphs and not tables:
+        # Kemungkinan isi berupa gambar -> serahkan ke Document Intelligence (OCR)
+        return None
+
+    def elements():
+        yield from _iter_sections(paragraphs)
+        for table_id, grid in enumerate(tables):
+            yield "table", _table_element(grid, table_id)
+
+    return elements()
+
+
+def _extract_xlsx(document: IO[bytes]) -> Optional[Iterator[Tuple[str, Dict[str, Any]]]]:
+    workbook = load_workbook(document, read_only=True, data_only=True)
+    tables = []
+    try:
+        for sheet in workbook.worksheets:
+            # Baris langsung masuk grid (string di-intern), tanpa list-of-lists per sheet
+            grid = TableGrid(0, 0)
+            for values in sheet.iter_rows(values_only=True):
+                # Tanpa _clean_text: normalisasi penomoran akan mengubah angka desimal (2.5 -> "2. 5")
+                cells = [str(v).strip() if v is not None else "" for v in values]
+                while cells and not cells[-1]:
+                    cells.pop()
+                if cells:
+                    grid.append_row(cells)
+            if grid.row_count:
+                tables.append((sheet.title, grid))
+    finally:
+        workbook.close()
+
+    if not tables:
+        return None
+
+    def elements():
+        # Satu tabel per sheet; daftar nama sheet ikut ter-index sebagai satu paragraf
+        yield from _iter_sections([("Sheets: " + ", ".join(title for title, _ in tables), None)])
+        for table_id, (_, grid) in enumerate(tables):
+            yield "table", _table_element(grid, table_id)
+
+    return elements()
+
+
+def _extract_pdf_text_layer(document: IO[bytes]) -> Optional[Iterator[Tuple[str, Dict[str, Any]]]]:
+    """
+    PDF digital (punya text layer) dibaca langsung dengan pypdf. Bila >10% halaman
+    hampir tanpa teks (scan / gambar), return None -> Document Intelligence.
+    Catatan: struktur tabel dan heading tidak terdeteksi di jalur ini (isi tabel jadi
+    paragraf, tanpa raw_tables), karena itu "pdf" tidak termasuk default native-extractors.
+    """
+    reader = PdfReader(document)
+    page_count = len(reader.pages)
+    if not page_count:
+        return None
+
+    max_sparse_pages = int(page_count * 0.1)
+    sparse_pages = 0
+    texts = []
+    for page in reader.pages:
+        text = page.extract_text() or ""
+        if len(text.strip()) < settings.native_pdf_min_chars_per_page:
+            sparse_pages += 1
+            if sparse_pages > max_sparse_pages:
+                return None
+        texts.append(text)
+
+    return _iter_sections((p, None) for text in texts for p in _split_plain_paragraphs(text))
+
+
+# MIME type -> (nama extractor, fungsi). Fungsi harus selesai membaca document sebelum
+# return (spool langsung ditutup); element boleh di-walk lazy. None -> fallback Document Intelligence.
+NATIVE_EXTRACTORS: Dict[str, Tuple[str, Callable[[IO[bytes]], Optional[Iterator[Tuple[str, Dict[str, Any]]]]]]] = {
+    "text/plain": ("text", _extract_plain_text),
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ("docx", _extract_docx),
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": ("xlsx", _extract_xlsx),
+    "application/pdf": ("pdf", _extract_pdf_text_layer),
+}
+
+
+def _blob_mime_type(blob_name: str, properties: Any) -> str:
+    """Content-Type blob; bila kosong/generik, tebak dari ekstensi."""
+    from documentManagement import _detect_mime
+
+    content_settings = getattr(properties, "content_settings", None)
+    content_type = getattr(content_settings, "content_type", None) if content_settings else None
+    if isinstance(content_type, str) and content_type and content_type != "application/octet-stream":
+        return content_type.split(";")[0].strip().lower()
+    return _detect_mime(blob_name)
+
+
+def _extract_native(document: IO[bytes], mime_type: Optional[str]) -> Optional[Tuple[Iterator[Tuple[str, Dict[str, Any]]], str]]:
+    """Coba extractor lokal untuk MIME type ini; None bila tidak ada / tidak cocok."""
+    name, extractor = NATIVE_EXTRACTORS.get(mime_type or "", (None, None))
+    if extractor is None or name not in {e.strip() for e in settings.native_extractors.split(",")}:
+        return None
+
+    document.seek(0)
+    try:
+        elements = extractor(document)
+    except Exception as e:
+        print(f"⚠️ Native {name} extractor failed, falling back to Document Intelligence: {e}")
+        elements = None
+    finally:
+        document.seek(0)
+
+    if elements is None:
+        return None
+    print(f"⚡ Native {name} extraction (Document Intelligence skipped)")
+    return elements, name
+
+
+# === Persistent extraction cache (content-addressed, SHA-256 blob bytes) ===
+# Naikkan versi ini setiap kali struktur output _iter_docint_elements berubah
+# v2: gzip JSON Lines, satu element ([kind, data]) per baris, dibaca/ditulis secara streaming
+EXTRACTION_CACHE_VERSION = "v2"
+
+
+def _is_system_blob(blob_name: str) -> bool:
+    """Blob internal pipeline (cache, checkpoint) tidak boleh ikut diindeks."""
+    return bool(settings.system_blob_prefix) and blob_name.startswith(settings.system_blob_prefix)
+
+
+def _extraction_cache_key(content_hash: str) -> str:
+    return f"{EXTRACTION_CACHE_VERSION}/{content_hash}.jsonl.gz"
+
+
+def _extraction_cache_blob(key: str) -> Any:
+    return blob_container.get_blob_client(f"{settings.system_blob_prefix}extraction-cache/{key}")
+
+
+def _extraction_cache_open(content_hash: str) -> Optional[IO[bytes]]:
+    """File object (gzip, posisi di awal) untuk entry cache ini, atau None bila miss."""
+    backend = settings.extraction_cache_backend
+    key = _extraction_cache_key(content_hash)
+
+    try:
+        if backend == "local":
+            path = os.path.join(settings.extraction_cache_dir, key)
+            return open(path, "rb") if os.path.exists(path) else None
+
+        if backend == "blob":
+            spool = tempfile.SpooledTemporaryFile(max_size=settings.index_spool_max_bytes)
+            try:
+                _extraction_cache_blob(key).download_blob().readinto(spool)
+            except Exception:
+                spool.close()
+                raise
+            spool.seek(0)
+            return spool
+
+    except ResourceNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Extraction cache read failed ({key}): {e}")
+
+    return None
+
+
+def _extraction_cache_discard(content_hash: str):
+    """Buang entry cache yang rusak supaya run berikutnya extract ulang."""
+    key = _extraction_cache_key(content_hash)
+    try:
+        if settings.extraction_cache_backend == "local":
+            os.remove(os.path.join(settings.extraction_cache_dir, key))
+        elif settings.extraction_cache_backend == "blob":
+            _extraction_cache_blob(key).delete_blob()
+    except Exception as e:
+        print(f"⚠️ Extraction cache discard failed ({key}): {e}")
+
+
+def _iter_extraction_cache(content_hash: str, fp: IO[bytes]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Baca entry cache baris per baris (tidak pernah memuat seluruh dokumen ke memori)."""
+    try:
+        with fp, gzip.open(fp, "rt", encoding="utf-8") as lines:
+            for line in lines:
+                kind, data = json.loads(line)
+                yield kind, data
+    except Exception as e:
+        print(f"⚠️ Extraction cache entry corrupt ({content_hash[:12]}): {e}")
+        _extraction_cache_discard(content_hash)
+        raise
+
+
+def _write_through_extraction_cache(
+    content_hash: str,
+    elements: Iterator[Tuple[str, Dict[str, Any]]],
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Teruskan element sambil menulisnya ke file cache sementara; entry cache baru
+    dipublish (rename / upload) setelah stream habis. Stream yang berhenti di tengah
+    jalan atau kosong (bisa jadi error sementara Document Intelligence) tidak di-cache.
+    """
+    backend = settings.extraction_cache_backend
+    key = _extraction_cache_key(content_hash)
+    tmp_path = None
+
+    try:
+        if backend == "local":
+            path = os.path.join(settings.extraction_cache_dir, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            raw = open(tmp_path, "wb")
         else:
-            other_sections.append(section)
-    
-    # FIX: Create comprehensive core values chunk if found
-    if core_values_sections:
-        core_values_chunk = _create_comprehensive_core_values_chunk(core_values_sections, doc_data)
-        if core_values_chunk:
-            chunks.append(core_values_chunk)
-    
-    # Process other sections normally
-    for section in other_sections:
-        section_chunks = _process_section_intelligently(section)
-        chunks.extend(section_chunks)
-    
-    # Process tables sebagai chunks terpisah dengan optimization
-    for table in doc_data.get("raw_tables", []):
-        if table["tokens"] > 5000:
-            table_chunks = _split_large_table(table)
-            chunks.extend(table_chunks)
+            raw = tempfile.TemporaryFile()
+        writer = gzip.GzipFile(fileobj=raw, mode="wb")
+    except Exception as e:
+        print(f"⚠️ Extraction cache write failed ({key}): {e}")
+        yield from elements
+        return
+
+    count = 0
+    complete = False
+    try:
+        for kind, data in elements:
+            if writer is not None:
+                try:
+                    writer.write(json.dumps([kind, _serializable_element(data)], ensure_ascii=False).encode("utf-8") + b"\n")
+                except Exception as e:
+                    print(f"⚠️ Extraction cache write failed ({key}): {e}")
+                    writer = None
+            count += 1
+            yield kind, data
+        complete = True
+    finally:
+        try:
+            if writer is not None:
+                writer.close()
+                if complete and count:
+                    if backend == "local":
+                        raw.close()
+                        os.replace(tmp_path, path)
+                        tmp_path = None
+                    else:
+                        raw.seek(0)
+                        _extraction_cache_blob(key).upload_blob(raw, overwrite=True)
+        except Exception as e:
+            print(f"⚠️ Extraction cache write failed ({key}): {e}")
+        finally:
+            raw.close()
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _hash_document(document: Union[bytes, IO[bytes]]) -> str:
+    """SHA-256 dari bytes atau file object (dibaca per blok, posisi dikembalikan ke awal)."""
+    if isinstance(document, (bytes, bytearray)):
+        return hashlib.sha256(document).hexdigest()
+
+    digest = hashlib.sha256()
+    document.seek(0)
+    for block in iter(lambda: document.read(1024 * 1024), b""):
+        digest.update(block)
+    document.seek(0)
+    return digest.hexdigest()
+
+
+def _open_extraction(
+    document: Union[bytes, IO[bytes]],
+    content_hash: Optional[str] = None,
+    mime_type: Optional[str] = None,
+) -> Tuple[Iterator[Tuple[str, Dict[str, Any]]], bool, str]:
+    """
+    Pilih extractor: parser lokal untuk MIME type yang didukung (native-extractors),
+    selain itu Document Intelligence lewat cache (bytes identik tidak perlu layout
+    analysis ulang). Return (elements, cache_hit, extractor).
+
+    Bagian yang butuh document dijalankan di sini, jadi document boleh langsung ditutup;
+    elements di-walk secara lazy oleh caller. Hasil extractor lokal tidak di-cache.
+    """
+    if isinstance(document, (bytes, bytearray)):
+        document = BytesIO(document)
+
+    native = _extract_native(document, mime_type)
+    if native is not None:
+        elements, name = native
+        return elements, False, name
+
+    if settings.extraction_cache_backend == "off":
+        res = _analyze_document(document)
+        return (_iter_docint_elements(res) if res is not None else iter(())), False, "docint"
+
+    content_hash = content_hash or _hash_document(document)
+
+    cached = _extraction_cache_open(content_hash)
+    if cached is not None:
+        print(f"♻️ Extraction cache hit: {content_hash[:12]}")
+        return _iter_extraction_cache(content_hash, cached), True, "docint"
+
+    res = _analyze_document(document)
+    if res is None:
+        return iter(()), False, "docint"
+
+    return _write_through_extraction_cache(content_hash, _iter_docint_elements(res)), False, "docint"
+
+
+# === Batched indexing: embed per batch + bulk upsert ke Qdrant ===
+def _build_chunk_records(
+    blob_name: str,
+    chunks: List[Dict[str, Any]],
+    fingerprint: Optional[Dict[str, Any]] = None,
+    start: int = 0,
+    occurrences: Optional[Dict[str, int]] = None,
+) -> List[Dict[str, Any]]:
+    """Build record (id, text, metadata) untuk chunk satu dokumen.
+
+    fingerprint (blob_etag, blob_md5, content_hash) ikut disimpan di payload supaya
+    incremental indexing bisa mendeteksi dokumen yang berubah.
+
+    Saat streaming, chunk datang per potongan: start = chunk_index chunk pertama dan
+    occurrences dipakai bersama antar potongan. total_chunks di payload berisi jumlah
+    chunk sejauh ini; nilai final di-set saat dokumen di-commit.
+
+    ID chunk: index-chunk-ids=content -> uuid5(source + MD5 isi chunk), sehingga chunk yang
+    tidak berubah mempertahankan ID-nya; position -> uuid5(source + urutan chunk).
+    """
+    records = []
+    occurrences = {} if occurrences is None else occurrences
+
+    for i, chunk_data in enumerate(chunks, start):
+        chunk_hash = _chunk_content_hash(chunk_data["content"])
+        if settings.index_chunk_ids == "content":
+            # ID dari source + isi chunk: stabil walau posisi chunk bergeser
+            occurrence = occurrences.get(chunk_hash, 0)
+            occurrences[chunk_hash] = occurrence + 1
+            unique_string_id = f"{_make_safe_doc_id(blob_name)}:{chunk_hash}:{occurrence}"
         else:
-            chunks.append({
-                "content": f"=== TABLE ===\n{table['content']}",
-                "type": "table",
-                "metadata": {
-                    "table_id": table["table_id"], 
-                    "headers": table["headers"],
-                    "row_count": table.get("row_count", 0),
-                },
-                "tokens": table["tokens"]
-            })
-    
-    # Deduplicate untuk avoid redundant storage
-    chunks = _deduplicate_chunks(chunks)
-    
-    return chunks
+            unique_string_id = f"{_make_safe_doc_id(blob_name)}_{i}"
+        chunk_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, unique_string_id))
+
+        # Optimized metadata - only essential fields
+        base_metadata = {
+            "source": blob_name,
+            "chunk_index": i,
+            "content_type": chunk_data["type"],
+            "token_count": chunk_data["tokens"],
+            "total_chunks": start + len(chunks),
+            "chunk_hash": chunk_hash
+        }
+        if fingerprint:
+            base_metadata.update(fingerprint)
 
+        # Add specific metadata dari chunk
+        base_metadata.update(chunk_data.get("metadata", {}))
 
-def _process_section_intelligently(section: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Process section dengan cost optimization - larger chunks untuk reduce storage cost."""
-    chunks = []
-    section_header = section["header"]
-    content_parts = section["content_parts"]
-    
-    # Target chunk size yang lebih besar untuk cost efficiency (3000-4000 tokens)
-    target_chunk_size = 3500
-    
-    # Jika section kecil atau medium, jadikan satu chunk
-    if section["total_tokens"] <= target_chunk_size:
-        full_content = f"=== {section_header} ===\n"
-        full_content += "\n\n".join([part["content"] for part in content_parts])
-        
-        chunks.append({
-            "content": full_content,
-            "type": section["type"],
-            "metadata": {
-                "section_header": section_header,
-                "section_id": section["section_id"],
-                "is_complete_section": True
-            },
-            "tokens": section["total_tokens"]
+        records.append({
+            "id": chunk_id,
+            "text": chunk_data["content"],
+            "metadata": base_metadata
         })
-    else:
-        # Section besar, bagi dengan larger chunks untuk cost efficiency
-        current_chunk_parts = []
-        current_tokens = tiktoken_len(f"=== {section_header} ===\n")
-        
-        for part in content_parts:
-            # Target yang lebih besar untuk reduce number of chunks
-            if current_tokens + part["tokens"] > target_chunk_size:
-                if current_chunk_parts:
-                    # Create chunk
-                    chunk_content = f"=== {section_header} ===\n"
-                    chunk_content += "\n\n".join([p["content"] for p in current_chunk_parts])
-                    
-                    chunks.append({
-                        "content": chunk_content,
-                        "type": section["type"],
-                        "metadata": {
-                            "section_header": section_header,
-                            "section_id": section["section_id"],
-                            "is_partial_section": True,
-                            "chunk_part": len(chunks) + 1
+
+    return records
+
+
+class _PipelineStage:
+    """Satu stage ingestion dengan batas concurrency sendiri + throughput counter."""
+
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.items = 0
+        self.bytes = 0
+        self.busy_seconds = 0.0
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def run(self, items: int = 1):
+        with self._slots:
+            t0 = time.perf_counter()
+            try:
+                yield self
+            finally:
+                elapsed = time.perf_counter() - t0
+                with self._lock:
+                    self.items += items
+                    self.busy_seconds += elapsed
+
+    def add_bytes(self, nbytes: int):
+        with self._lock:
+            self.bytes += nbytes
+
+    def report(self, elapsed_seconds: float) -> Dict[str, Any]:
+        wall = max(elapsed_seconds, 1e-9)
+        stats = {
+            "concurrency": self.concurrency,
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_second": round(self.items / wall, 3),
+        }
+        if self.bytes:
+            stats["bytes"] = self.bytes
+            stats["mb_per_second"] = round(self.bytes / (1024 * 1024) / wall, 3)
+        return stats
+
+
+class EmbeddingRateLimiter:
+    """
+    Token bucket bersama untuk semua panggilan embedding (TPM + RPM Azure OpenAI).
+
+    acquire() memblokir sampai budget token dan request cukup; pause() dipakai saat
+    Azure mengirim Retry-After sehingga semua worker ikut menunggu, bukan hanya satu.
+    """
+
+    def __init__(self, tokens_per_minute: int, requests_per_minute: int = 0):
+        self.tokens_per_minute = max(1, tokens_per_minute)
+        self.requests_per_minute = max(0, requests_per_minute)
+        self._tokens = float(self.tokens_per_minute)
+        self._requests = float(self.requests_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self.waited_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60.0)
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60.0)
+
+    def acquire(self, tokens: int, requests: int = 1) -> float:
+        """Ambil budget; return detik menunggu. Permintaan > kapasitas di-clamp ke kapasitas."""
+        tokens = min(max(tokens, 1), self.tokens_per_minute)
+        requests = min(requests, self.requests_per_minute) if self.requests_per_minute else 0
+        waited = 0.0
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self._paused_until - now
+                if delay <= 0:
+                    token_gap = tokens - self._tokens
+                    request_gap = requests - self._requests if requests else 0
+                    if token_gap <= 0 and request_gap <= 0:
+                        self._tokens -= tokens
+                        self._requests -= requests
+                        self.waited_seconds += waited
+                        return waited
+                    delay = max(
+                        token_gap * 60.0 / self.tokens_per_minute,
+                        request_gap * 60.0 / self.requests_per_minute if request_gap > 0 else 0.0,
+                    )
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float):
+        """Tahan semua acquire() selama `seconds` (Retry-After dari server)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+embedding_rate_limiter = EmbeddingRateLimiter(settings.embed_tokens_per_minute, settings.embed_requests_per_minute)
+
+
+def _error_status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Baca retry-after-ms / retry-after (detik atau HTTP date) dari response error."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except Exception:
+        return None
+
+
+def _is_retryable_error(error: Exception) -> bool:
+    """429, 5xx, timeout dan connection error di-retry; 4xx lain (mis. input terlalu panjang) tidak."""
+    status = _error_status_code(error)
+    return status is None or status in (408, 409, 429) or status >= 500
+
+
+def _embed_with_retry(texts: List[str], token_counts: List[int]) -> Tuple[List[List[float]], Dict[str, Any]]:
+    """
+    Embed satu batch lewat rate limiter bersama, retry dengan backoff + Retry-After.
+    Return (vectors, stats); raise error terakhir bila retry habis.
+    """
+    request_size = max(1, getattr(embeddings, "chunk_size", None) or len(texts))
+    requests = -(-len(texts) // request_size)
+    stats = {"retries": 0, "throttle_wait_seconds": 0.0}
+
+    for attempt in range(settings.embed_max_retries + 1):
+        stats["throttle_wait_seconds"] += embedding_rate_limiter.acquire(sum(token_counts), requests)
+        try:
+            vectors = embeddings.embed_documents(texts)
+            stats["throttle_wait_seconds"] = round(stats["throttle_wait_seconds"], 3)
+            return vectors, stats
+        except Exception as e:
+            if attempt >= settings.embed_max_retries or not _is_retryable_error(e):
+                raise
+
+            retry_after = _retry_after_seconds(e)
+            if retry_after is not None:
+                embedding_rate_limiter.pause(retry_after)
+                delay = 0.0  # acquire() berikutnya menunggu pause bersama
+            else:
+                delay = min(settings.embed_backoff_max_seconds, settings.embed_backoff_base_seconds * (2 ** attempt))
+                delay *= 0.5 + random.random() / 2
+            stats["retries"] += 1
+            print(f"⚠️ Embedding attempt {attempt + 1} failed ({_error_status_code(e)}): {e}; "
+                  f"retrying in {retry_after if retry_after is not None else round(delay, 2)}s")
+            time.sleep(delay)
+
+
+class EmbeddingCache:
+    """
+    Cache vektor embedding persisten, key = model + MD5 isi chunk.
+
+    Vektor disimpan sebagai float32 biner (4 byte/dimensi, 12 KB untuk 3072 dim).
+    Backend: sqlite (file lokal, default), redis (berbagi antar replika), atau off.
+    """
+
+    def __init__(self, backend: str, path: str = "", model: str = ""):
+        self.backend = backend
+        self.path = path
+        self.model = model
+        self._lock = threading.Lock()
+        self._conn = None
+        self._redis = None
+
+    def key(self, chunk_hash: str) -> str:
+        return f"{self.model}:{chunk_hash}"
+
+    @staticmethod
+    def _pack(vector: List[float]) -> bytes:
+        return array("f", vector).tobytes()
+
+    @staticmethod
+    def _unpack(blob: bytes) -> List[float]:
+        vector = array("f")
+        vector.frombytes(blob)
+        return vector.tolist()
+
+    def _sqlite(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at TEXT)"
+            )
+        return self._conn
+
+    def _redis_client(self):
+        # Client terpisah dari memory manager: vektor biner butuh decode_responses=False
+        if self._redis is None:
+            self._redis = redis.Redis(
+                host=settings.redis_host,
+                port=settings.redis_port,
+                password=settings.redis_password,
+                ssl=settings.redis_ssl,
+                socket_timeout=5,
+                socket_connect_timeout=5,
+            )
+        return self._redis
+
+    def get_many(self, chunk_hashes: List[str]) -> Dict[str, List[float]]:
+        """Return {chunk_hash: vector} untuk yang ada di cache."""
+        if self.backend == "off" or not chunk_hashes:
+            return {}
+        keys = {self.key(h): h for h in set(chunk_hashes)}
+
+        try:
+            if self.backend == "sqlite":
+                found = {}
+                key_list = list(keys)
+                with self._lock:
+                    conn = self._sqlite()
+                    # Batas parameter SQLite: query per 500 key
+                    for i in range(0, len(key_list), 500):
+                        part = key_list[i:i + 500]
+                        rows = conn.execute(
+                            f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                        ).fetchall()
+                        found.update({keys[k]: self._unpack(v) for k, v in rows})
+                return found
+
+            if self.backend == "redis":
+                key_list = list(keys)
+                values = self._redis_client().mget(key_list)
+                return {keys[k]: self._unpack(v) for k, v in zip(key_list, values) if v}
+
+        except Exception as e:
+            print(f"⚠️ Embedding cache read failed: {e}")
+        return {}
+
+    def put_many(self, vectors: Dict[str, List[float]]):
+        if self.backend == "off" or not vectors:
+            return
+        rows = [(self.key(h), self._pack(v)) for h, v in vectors.items()]
+
+        try:
+            if self.backend == "sqlite":
+                now = datetime.now().isoformat()
+                with self._lock:
+                    conn = self._sqlite()
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                        [(k, v, now) for k, v in rows],
+                    )
+                    conn.commit()
+
+            elif self.backend == "redis":
+                pipe = self._redis_client().pipeline(transaction=False)
+                for k, v in rows:
+                    pipe.set(k, v, ex=settings.embedding_cache_ttl_seconds or None)
+                pipe.execute()
+
+        except Exception as e:
+            print(f"⚠️ Embedding cache write failed: {e}")
+
+
+embedding_cache = EmbeddingCache(
+    settings.embedding_cache_backend,
+    settings.embedding_cache_path,
+    settings.openai_embed_deployment,
+)
+
+
+def _embed_records(records: List[Dict[str, Any]]) -> Tuple[List[List[float]], Dict[str, Any]]:
+    """
+    Embed record lewat embedding cache; hanya cache miss yang memanggil API
+    (lewat rate limiter + retry). Return (vectors sesuai urutan records, stats).
+    """
+    hashes = [r["metadata"].get("chunk_hash") or _chunk_content_hash(r["text"]) for r in records]
+    cached = embedding_cache.get_many(hashes)
+
+    # Teks identik dalam satu batch cukup di-embed sekali
+    misses: Dict[str, Dict[str, Any]] = {}
+    for h, r in zip(hashes, records):
+        if h not in cached and h not in misses:
+            misses[h] = r
+
+    stats = {"cache_hits": len(records) - sum(1 for h in hashes if h not in cached), "retries": 0, "throttle_wait_seconds": 0.0}
+    if misses:
+        miss_records = list(misses.values())
+        vectors, embed_stats = _embed_with_retry(
+            [r["text"] for r in miss_records],
+            [r["metadata"].get("token_count") or tiktoken_len(r["text"]) for r in miss_records],
+        )
+        fresh = dict(zip(misses, vectors))
+        embedding_cache.put_many(fresh)
+        cached.update(fresh)
+        stats.update(embed_stats)
+
+    stats["cache_misses"] = len(records) - stats["cache_hits"]
+    return [cached[h] for h in hashes], stats
+
+
+# === Near-duplicate detection (near_duplicates.NearDuplicateIndex) ===
+near_duplicate_index = initialize_near_duplicate_index(settings)
+
+
+def _near_dup_namespace(collection_name: Optional[str] = None) -> str:
+    """Namespace NearDuplicateIndex = collection fisik di balik alias (atau nama itu sendiri)."""
+    name = collection_name or settings.qdrant_collection
+    if near_duplicate_index.backend == "off":
+        return name
+    try:
+        return resolve_qdrant_collection(qdrant_client, name) or name
+    except Exception as e:
+        print(f"⚠️ Could not resolve collection {name}: {e}")
+        return name
+
+
+def _mark_near_duplicates(
+    blob_name: str,
+    records: List[Dict[str, Any]],
+    namespace: str,
+    signatures: List[Tuple[str, List[int]]],
+    links: Dict[str, str],
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Cari near-duplicate (dokumen lain) untuk record satu dokumen sesuai near-dup-mode:
+    skip = record tidak di-index; link = record di-index dengan payload near_duplicate_of
+    (ID chunk kanonik), dipakai retrieval hanya bila near-dup-retrieval diaktifkan.
+
+    signatures dan links ({ID chunk kanonik: dokumen kanonik}) diisi untuk
+    NearDuplicateIndex.replace_source saat dokumen di-commit.
+    Return (record yang di-index, jumlah near-duplicate).
+    """
+    mode = settings.near_dup_mode
+    if mode == "off" or not records:
+        return records, 0
+
+    sketches = [
+        minhash(r["text"]) if r["metadata"]["token_count"] >= settings.near_dup_min_tokens else None
+        for r in records
+    ]
+    matches = near_duplicate_index.find_many(namespace, sketches, blob_name)
+
+    kept, duplicates = [], 0
+    for record, sketch, match in zip(records, sketches, matches):
+        if match is None:
+            if sketch is not None:
+                signatures.append((record["id"], sketch))
+            kept.append(record)
+            continue
+
+        duplicates += 1
+        chunk_id, source, similarity = match
+        links[chunk_id] = source
+        if mode == "skip":
+            continue
+        record["metadata"].update(
+            near_duplicate_of=chunk_id,
+            near_duplicate_source=source,
+            near_duplicate_similarity=round(similarity, 3),
+        )
+        kept.append(record)
+    return kept, duplicates
+
+
+def _release_near_duplicate_dependents(released: Dict[str, List[str]], collection_name: str, namespace: str):
+    """
+    Chunk kanonik hilang: lepas payload near_duplicate_* di point yang menunjuk chunk tersebut
+    (tidak lagi di-downweight / di-collapse), lalu kosongkan fingerprint dokumen yang bergantung
+    supaya incremental indexing berikutnya meng-index ulang (chunk yang di-skip kembali masuk).
+    """
+    if released["canonical_ids"]:
+        qdrant_client.set_payload(
+            collection_name=collection_name,
+            payload={"near_duplicate_of": None, "near_duplicate_source": None, "near_duplicate_similarity": None},
+            points=qdrant_models.Filter(must=[qdrant_models.FieldCondition(
+                key="metadata.near_duplicate_of", match=qdrant_models.MatchAny(any=released["canonical_ids"])
+            )]),
+            key=QdrantVectorStore.METADATA_KEY,
+            wait=False
+        )
+    for blob_name in released["sources"]:
+        _refresh_fingerprint_payload(
+            blob_name, {"blob_etag": None, "blob_md5": None, "content_hash": None}, collection_name
+        )
+        near_duplicate_index.update_fingerprint(namespace, blob_name, None)
+        print(f"♻️  {blob_name}: canonical chunks changed or removed, marked for re-indexing")
+
+
+class BatchedIndexer:
+    """
+    Kumpulkan chunk lintas dokumen, embed per batch, lalu bulk upsert ke Qdrant.
+
+    Setiap batch di-upsert dengan wait=False; batch terakhir (saat close) dikirim
+    dengan wait=True sehingga hanya ada satu wait di akhir run.
+
+    on_commit(source, info) dipanggil begitu semua chunk satu dokumen ter-upsert
+    (info: content_hash, chunks); dokumen dengan batch gagal tidak pernah di-commit.
+    Chunk satu dokumen boleh datang bertahap (add(..., partial=True)); dokumen baru
+    bisa di-commit setelah add terakhir tanpa partial.
+    """
+
+    def __init__(
+        self,
+        collection_name: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        stage: Optional[_PipelineStage] = None,
+        on_commit: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ):
+        self.collection_name = collection_name or settings.qdrant_collection
+        self.batch_size = max(1, batch_size or settings.index_embed_batch_size)
+        self.stage = stage or _PipelineStage("embed", settings.index_embed_concurrency)
+        self.on_commit = on_commit
+        self.batches: List[Dict[str, Any]] = []
+        self.indexed_points = 0
+        self.failed_points = 0
+        self.failed_sources = set()
+        self.errors: List[str] = []
+        self._pending: List[Dict[str, Any]] = []
+        # Per source: sisa chunk yang belum ter-upsert (untuk on_commit)
+        self._outstanding: Dict[str, Dict[str, Any]] = {}
+        self._vector_size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        records: List[Dict[str, Any]],
+        source: Optional[str] = None,
+        commit_info: Optional[Dict[str, Any]] = None,
+        partial: bool = False,
+    ):
+        """Queue records; kirim batch penuh, sisakan minimal satu batch untuk close().
+
+        Aman dipanggil dari banyak worker; batch yang penuh di-flush oleh worker
+        pemanggil (backpressure), dibatasi concurrency stage embed.
+
+        source + commit_info: record milik satu dokumen; commit_info ikut diteruskan ke
+        on_commit. partial=True: masih ada record dokumen ini yang menyusul, jadi dokumen
+        belum boleh di-commit walau semua record sejauh ini sudah ter-upsert. Dokumen
+        tanpa record tersisa langsung di-commit pada add terakhir.
+        """
+        ready = []
+        commit_now = None
+        with self._lock:
+            if source is not None and source in self.failed_sources:
+                # Batch dokumen ini sudah gagal (dead-letter); sisa chunk tidak perlu di-embed
+                return
+            if source is not None:
+                entry = self._outstanding.setdefault(source, self._new_entry(sealed=False))
+                if not partial:
+                    entry["sealed"] = True
+                    entry["info"] = commit_info or {}
+            for r in records:
+                source_name = r["metadata"].get("source", "unknown")
+                entry = self._outstanding.setdefault(source_name, self._new_entry(sealed=True))
+                entry["content_hash"] = entry["content_hash"] or r["metadata"].get("content_hash")
+                entry["remaining"] += 1
+                entry["chunks"] += 1
+            if source is not None and self._outstanding[source]["sealed"] and not self._outstanding[source]["remaining"]:
+                commit_now = self._outstanding.pop(source)
+            self._pending.extend(records)
+            while len(self._pending) > self.batch_size:
+                ready.append(self._pending[:self.batch_size])
+                self._pending = self._pending[self.batch_size:]
+
+        if commit_now is not None:
+            self._commit(source, commit_now)
+        for batch in ready:
+            self._flush_batch(batch, wait=False)
+
+    @staticmethod
+    def _new_entry(sealed: bool) -> Dict[str, Any]:
+        return {"remaining": 0, "chunks": 0, "content_hash": None, "sealed": sealed}
+
+    def close(self) -> Dict[str, Any]:
+        """Flush sisa record dan tunggu Qdrant selesai apply semua upsert."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+
+        if batch:
+            self._flush_batch(batch, wait=True)
+
+        return self.report()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "collection": self.collection_name,
+            "embed_batch_size": self.batch_size,
+            "indexed_chunks": self.indexed_points,
+            "failed_chunks": self.failed_points,
+            "batch_errors": self.errors,
+            "embedding_cache": self._cache_report(),
+            "embed_retries": sum(b.get("retries", 0) for b in self.batches),
+            "throttle_wait_seconds": round(sum(b.get("throttle_wait_seconds", 0.0) for b in self.batches), 3),
+            "batches": self.batches,
+        }
+
+    def _target_dims(self) -> int:
+        """Dimensi collection tujuan; vektor penuh (cache) dipotong Matryoshka bila lebih kecil."""
+        if self._vector_size is None:
+            self._vector_size = qdrant_vector_size(qdrant_client, self.collection_name)
+        return self._vector_size
+
+    def _cache_report(self) -> Dict[str, Any]:
+        hits = sum(b.get("cache_hits", 0) for b in self.batches)
+        misses = sum(b.get("cache_misses", 0) for b in self.batches)
+        return {
+            "backend": embedding_cache.backend,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        }
+
+    def _flush_batch(self, batch: List[Dict[str, Any]], wait: bool):
+        with self._lock:
+            timing = {"batch": len(self.batches) + 1, "points": len(batch), "embed_seconds": 0.0, "upsert_seconds": 0.0}
+            self.batches.append(timing)
+        batch_no = timing["batch"]
+
+        with self.stage.run(items=len(batch)):
+            try:
+                t0 = time.perf_counter()
+                vectors, embed_stats = _embed_records(batch)
+                dims = self._target_dims()
+                vectors = [truncate_embedding(v, dims) for v in vectors]
+                timing["embed_seconds"] = round(time.perf_counter() - t0, 3)
+                timing.update(embed_stats)
+
+                points = [
+                    qdrant_models.PointStruct(
+                        id=r["id"],
+                        vector=vector,
+                        payload={
+                            QdrantVectorStore.CONTENT_KEY: r["text"],
+                            QdrantVectorStore.METADATA_KEY: r["metadata"],
                         },
-                        "tokens": current_tokens
-                    })
-                
-                # Start new chunk
-                current_chunk_parts = [part]
-                current_tokens = tiktoken_len(f"=== {section_header} ===\n") + part["tokens"]
+                    )
+                    for r, vector in zip(batch, vectors)
+                ]
+
+                t0 = time.perf_counter()
+                qdrant_client.upsert(
+                    collection_name=self.collection_name,
+                    points=points,
+                    wait=wait
+                )
+                timing["upsert_seconds"] = round(time.perf_counter() - t0, 3)
+
+                committed = []
+                with self._lock:
+                    self.indexed_points += len(points)
+                    for r in batch:
+                        source = r["metadata"].get("source", "unknown")
+                        entry = self._outstanding.get(source)
+                        if entry is None:
+                            continue
+                        entry["remaining"] -= 1
+                        if entry["remaining"] == 0 and entry["sealed"]:
+                            del self._outstanding[source]
+                            committed.append((source, entry))
+                print(f"Indexed batch {batch_no}: {len(points)} chunks "
+                      f"(embed {timing['embed_seconds']}s, upsert {timing['upsert_seconds']}s)")
+
+                for source, entry in committed:
+                    self._commit(source, entry)
+
+            except Exception as e:
+                sources = sorted({r["metadata"].get("source", "unknown") for r in batch})
+                with self._lock:
+                    self.failed_points += len(batch)
+                    self.failed_sources.update(sources)
+                    for source in sources:
+                        self._outstanding.pop(source, None)
+                    self.errors.append(f"batch {batch_no} ({', '.join(sources)}): {str(e)}")
+                timing["error"] = str(e)
+                _dead_letter_batch(batch, self.collection_name, e)
+                print(f"!!!!!!!!!!!!! FATAL ERROR indexing batch {batch_no} ({len(batch)} chunks) !!!!!!!!!!!!!")
+                import traceback
+                traceback.print_exc()
+                print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
+
+    def _commit(self, source: str, entry: Dict[str, Any]):
+        if not self.on_commit:
+            return
+        try:
+            self.on_commit(source, {"content_hash": entry["content_hash"], "chunks": entry["chunks"], **entry.get("info", {})})
+        except Exception as e:
+            with self._lock:
+                self.errors.append(f"{source}: commit callback failed: {str(e)}")
+            print(f"Error committing {source}: {e}")
+
+
+class IndexRunManifest:
+    """
+    Checkpoint durable untuk run indexing, disimpan sebagai JSON di blob
+    {system_blob_prefix}index-runs/{run_key}.json (run terakhir per run_key).
+
+    Blob dicatat (content_hash, ETag, jumlah chunk) setelah chunk-nya ter-upsert.
+    Setiap run mendapat run_id baru, kecuali resume=True dan run terakhir belum
+    "completed": run tersebut dilanjutkan dari checkpoint terakhir, maksimal
+    index-resume-max-attempts kali. previous = data run terakhir yang tidak dilanjutkan.
+    """
+
+    def __init__(self, run_key: str, checkpoint_every: Optional[int] = None, resume: bool = False):
+        self.run_key = run_key
+        self.blob_name = f"{settings.system_blob_prefix}index-runs/{run_key}.json"
+        self.checkpoint_every = max(1, checkpoint_every or settings.index_checkpoint_every)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.resumed = False
+        self.previous: Optional[Dict[str, Any]] = None
+
+        now = datetime.now()
+        data = self._load()
+        if data and data.get("status") != "completed":
+            if not resume:
+                print(f"ℹ️ Index run {data.get('run_id')} was not completed; starting a new run (resume=False)")
+            elif data.get("attempts", 1) >= settings.index_resume_max_attempts:
+                print(f"⚠️ Index run {data.get('run_id')} already attempted {data.get('attempts')} times; starting a new run")
             else:
-                current_chunk_parts.append(part)
-                current_tokens += part["tokens"]
-        
-        # Add final chunk if exists
-        if current_chunk_parts:
-            chunk_content = f"=== {section_header} ===\n"
-            chunk_content += "\n\n".join([p["content"] for p in current_chunk_parts])
-            
-            chunks.append({
-                "content": chunk_content,
-                "type": section["type"],
-                "metadata": {
-                    "section_header": section_header,
-                    "section_id": section["section_id"],
-                    "is_partial_section": True,
-                    "chunk_part": len(chunks) + 1
-                },
-                "tokens": current_tokens
-            })
-    
-    return chunks
+                data["attempts"] = data.get("attempts", 1) + 1
+                self.resumed = True
+                print(f"♻️ Resuming index run {data['run_id']}: {len(data['completed'])} blobs already done")
+
+        if not self.resumed:
+            self.previous = data
+            data = {
+                "run_id": f"{run_key}-{now:%Y%m%d%H%M%S}",
+                "run_key": run_key,
+                "status": "running",
+                "attempts": 1,
+                "created_at": now.isoformat(),
+                "completed": {},
+            }
+        data["updated_at"] = now.isoformat()
+        self.data = data
+        self.run_id = data["run_id"]
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(blob_container.get_blob_client(self.blob_name).download_blob().readall())
+        except ResourceNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️ Failed to read index run manifest {self.blob_name}: {e}")
+            return None
+
+    def completed_blobs(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return dict(self.data["completed"])
+
+    def mark_done(self, blob_name: str, entry: Dict[str, Any]):
+        """Catat blob selesai; manifest ditulis ulang setiap checkpoint_every blob."""
+        entry = dict(entry, completed_at=datetime.now().isoformat())
+        with self._lock:
+            self.data["completed"][blob_name] = entry
+            self._unsaved += 1
+            due = self._unsaved >= self.checkpoint_every
+        if due:
+            self.checkpoint()
+
+    def checkpoint(self, status: Optional[str] = None):
+        with self._lock:
+            if status:
+                self.data["status"] = status
+            self.data["updated_at"] = datetime.now().isoformat()
+            payload = json.dumps(self.data, ensure_ascii=False)
+            self._unsaved = 0
+        try:
+            blob_container.get_blob_client(self.blob_name).upload_blob(payload, overwrite=True)
+        except Exception as e:
+            print(f"⚠️ Failed to write index run manifest {self.blob_name}: {e}")
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "run_key": self.run_key,
+                "status": self.data["status"],
+                "attempts": self.data["attempts"],
+                "completed_blobs": len(self.data["completed"]),
+                "manifest_blob": self.blob_name,
+            }
+
+
+def _default_run_key(kind: str, prefix: str, collection_name: Optional[str] = None) -> str:
+    """Key manifest stabil per (kind, collection, prefix) supaya run yang crash bisa di-resume."""
+    key = f"{collection_name or settings.qdrant_collection}:{prefix}"
+    return f"{kind}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+
+# === Dead letter: batch yang tetap gagal setelah retry, bisa di-replay ===
+def _dead_letter_prefix() -> str:
+    return f"{settings.system_blob_prefix}dead-letter/embeddings/"
+
+
+def _dead_letter_batch(batch: List[Dict[str, Any]], collection_name: str, error: Exception):
+    """Simpan record chunk yang gagal (teks + metadata + id) sebagai satu blob JSON."""
+    entry = {
+        "collection": collection_name,
+        "error": str(error),
+        "status_code": _error_status_code(error),
+        "failed_at": datetime.now().isoformat(),
+        "records": batch,
+    }
+    blob_name = f"{_dead_letter_prefix()}{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.json"
+    try:
+        blob_container.get_blob_client(blob_name).upload_blob(json.dumps(entry, ensure_ascii=False), overwrite=True)
+        print(f"📮 Dead-lettered {len(batch)} chunks: {blob_name}")
+    except Exception as e:
+        print(f"⚠️ Failed to write dead letter {blob_name}: {e}")
+
+
+def list_dead_letters() -> List[Dict[str, Any]]:
+    """Ringkasan batch di dead-letter list (tanpa isi chunk)."""
+    items = []
+    for blob in blob_container.list_blobs(name_starts_with=_dead_letter_prefix()):
+        entry = json.loads(blob_container.get_blob_client(blob.name).download_blob().readall())
+        items.append({
+            "name": blob.name,
+            "collection": entry["collection"],
+            "error": entry["error"],
+            "failed_at": entry["failed_at"],
+            "chunks": len(entry["records"]),
+            "sources": sorted({r["metadata"].get("source", "unknown") for r in entry["records"]}),
+        })
+    return items
+
+
+def replay_dead_letters(names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Kirim ulang chunk di dead-letter list lewat BatchedIndexer (rate limiter + retry yang sama).
+    Blob dead letter dihapus setelah batch-nya berhasil; yang gagal lagi di-dead-letter ulang.
+
+    Mode content: dead letter hanya berisi chunk baru, jadi chunk yang hilang dari versi baru
+    dokumen tidak bisa ditentukan di sini. Fingerprint dokumen dikosongkan (pasti dianggap
+    berubah) dan dokumen di collection aktif dikembalikan di reindex_sources untuk di-index
+    ulang, yang meng-apply diff-nya.
+    """
+    names = names or [item["name"] for item in list_dead_letters()]
+    replayed, failed, errors = 0, 0, []
+    live_collections = {settings.qdrant_collection, resolve_qdrant_collection(qdrant_client, settings.qdrant_collection)}
+    invalidated, reindex_sources = set(), set()
+
+    for name in names:
+        blob_client = blob_container.get_blob_client(name)
+        entry = json.loads(blob_client.download_blob().readall())
+
+        def commit_source(source: str, info: Dict[str, Any], collection=entry["collection"]):
+            if not info["content_hash"]:
+                return
+            if settings.index_chunk_ids != "content":
+                # Mode position: batch lain dokumen ini sudah masuk saat run asli, versi lama boleh dibuang
+                _delete_stale_chunks(source, info["content_hash"], collection)
+                return
+            _refresh_fingerprint_payload(
+                source, {"blob_etag": None, "blob_md5": None, "content_hash": None}, collection
+            )
+            invalidated.add(source)
+            if collection in live_collections:
+                reindex_sources.add(source)
+
+        indexer = BatchedIndexer(collection_name=entry["collection"], on_commit=commit_source)
+        indexer.add(entry["records"])
+        report = indexer.close()
+
+        replayed += report["indexed_chunks"]
+        failed += report["failed_chunks"]
+        errors.extend(report["batch_errors"])
+        # Chunk yang gagal lagi sudah ditulis ke dead letter baru oleh indexer
+        blob_client.delete_blob()
 
-def _create_comprehensive_core_values_chunk(core_values_sections: List[Dict], doc_data: Dict) -> Dict[str, Any]:
-    """NEW: Create a comprehensive chunk containing all core values information."""
-    if not core_values_sections:
-        return None
-    
-    all_content = []
-    total_tokens = 0
-    
-    # Collect all core values content
-    for section in core_values_sections:
-        section_header = section.get("header", "")
-        if section_header and "core" in section_header.lower():
-            all_content.append(f"=== {section_header} ===")
-        
-        for part in section.get("content_parts", []):
-            content = part.get("content", "")
-            if content:
-                all_content.append(content)
-                total_tokens += part.get("tokens", 0)
-    
-    # Also check for any scattered core values content in other sections
-    for section in doc_data.get("sections", []):
-        if section not in core_values_sections:
-            for part in section.get("content_parts", []):
-                content = part.get("content", "")
-                content_lower = content.lower()
-                
-                # If this content mentions multiple core values, include it
-                cv_mentions = sum(1 for cv in ["humble", "customer focused", "employee satisfaction",
-                                             "speed", "passion", "integrity", "discipline"] 
-                                if cv in content_lower)
-                
-                if cv_mentions >= 2:  # Contains multiple core values
-                    all_content.append(content)
-                    total_tokens += part.get("tokens", tiktoken_len(content))
-    
-    if not all_content:
-        return None
-    
-    comprehensive_content = "\n\n".join(all_content)
-    
     return {
-        "content": comprehensive_content,
-        "type": "core_values_comprehensive",
-        "metadata": {
-            "is_core_values": True,
-            "is_comprehensive": True,
-            "content_type": "core_values_comprehensive"
-        },
-        "tokens": total_tokens
+        "dead_letters": len(names),
+        "replayed_chunks": replayed,
+        "failed_chunks": failed,
+        "errors": errors,
+        "invalidated_sources": sorted(invalidated),
+        "reindex_sources": sorted(reindex_sources),
     }
 
-def _split_large_table(table: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Split table besar dengan preserve headers dan target size yang lebih besar."""
-    chunks = []
-    lines = table["content"].split("\n")
-    headers = lines[0] if lines else ""
-    
-    current_chunk_lines = [headers]  # Always include headers
-    current_tokens = tiktoken_len(headers)
-    
-    # Target size yang lebih besar untuk tables
-    target_size = 5000
-    
-    for line in lines[1:]:  # Skip header line
-        line_tokens = tiktoken_len(line)
-        if current_tokens + line_tokens > target_size:
-            # Create chunk
-            chunk_content = f"=== TABLE (Part {len(chunks) + 1}) ===\n"
-            chunk_content += "\n".join(current_chunk_lines)
-            
-            chunks.append({
-                "content": chunk_content,
-                "type": "table",
-                "metadata": {
-                    "table_id": table["table_id"],
-                    "headers": table["headers"],
-                    "is_partial_table": True,
-                    "part": len(chunks) + 1,
-                    "row_count": table.get("row_count", 0),
-                    "total_parts": None
-                },
-                "tokens": current_tokens
-            })
-            
-            # Start new chunk with headers
-            current_chunk_lines = [headers, line]
-            current_tokens = tiktoken_len(headers) + line_tokens
-        else:
-            current_chunk_lines.append(line)
-            current_tokens += line_tokens
-    
-    # Add final chunk
-    if len(current_chunk_lines) > 1:  # More than just headers
-        chunk_content = f"=== TABLE (Part {len(chunks) + 1}) ===\n"
-        chunk_content += "\n".join(current_chunk_lines)
-        
-        chunks.append({
-            "content": chunk_content,
-            "type": "table",
-            "metadata": {
-                "table_id": table["table_id"],
-                "headers": table["headers"],
-                "is_partial_table": True,
-                "part": len(chunks) + 1,
-                "row_count": table.get("row_count", 0),
-                "total_parts": None
-            },
-            "tokens": current_tokens
-        })
-    for chunk in chunks:
-        chunk["metadata"]["total_parts"] = len(chunks)
-    
-    return chunks
 
-def _deduplicate_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Remove duplicate chunks untuk cost optimization."""
-    unique_chunks = []
-    seen_hashes = set()
-    
-    for chunk in chunks:
-        # Create content hash untuk deduplication
-        content_hash = hashlib.md5(chunk["content"].encode()).hexdigest()
-        
-        if content_hash not in seen_hashes:
-            seen_hashes.add(content_hash)
-            unique_chunks.append(chunk)
-    
-    return unique_chunks
+# === Change detection: fingerprint blob + replace points in place ===
+def _blob_fingerprint(properties: Any) -> Dict[str, Any]:
+    """Ambil ETag dan Content-MD5 (base64) dari BlobProperties."""
+    content_settings = getattr(properties, "content_settings", None)
+    content_md5 = getattr(content_settings, "content_md5", None) if content_settings else None
 
-# === Enhanced indexing pipeline - tetap nama function yang sama ===
-def process_and_index_docs(prefix: str = "") -> Dict[str, Any]:
-    """Process dan index dokumen dengan cost optimization - support semua prefix termasuk kosong."""
-    indexed, skipped, errors = 0, 0, []
+    return {
+        "blob_etag": getattr(properties, "etag", None),
+        "blob_md5": base64.b64encode(bytes(content_md5)).decode() if content_md5 else None,
+    }
+
+
+def _source_filter(blob_name: str, must_not: Optional[List[Any]] = None) -> Any:
+    """Filter semua point milik satu dokumen (payload metadata.source)."""
+    return qdrant_models.Filter(
+        must=[qdrant_models.FieldCondition(key="metadata.source", match=qdrant_models.MatchValue(value=blob_name))],
+        must_not=must_not,
+    )
+
+
+def _delete_stale_chunks(blob_name: str, content_hash: str, collection_name: str):
+    """Hapus point lama dokumen ini yang content_hash-nya bukan versi terbaru."""
+    qdrant_client.delete(
+        collection_name=collection_name,
+        points_selector=qdrant_models.FilterSelector(
+            filter=_source_filter(
+                blob_name,
+                must_not=[qdrant_models.FieldCondition(key="metadata.content_hash", match=qdrant_models.MatchValue(value=content_hash))],
+            )
+        ),
+        wait=True
+    )
+
+
+def _refresh_fingerprint_payload(blob_name: str, fingerprint: Dict[str, Any], collection_name: str):
+    """Konten sama tapi ETag berubah (mis. re-upload file identik): update payload saja."""
+    qdrant_client.set_payload(
+        collection_name=collection_name,
+        payload=fingerprint,
+        points=_source_filter(blob_name),
+        key=QdrantVectorStore.METADATA_KEY,
+        wait=False
+    )
+
+
+# === Streaming blob download: spool ke temp file, hash sambil download ===
+def _download_blob_to_spool(blob_client: Any) -> Tuple[IO[bytes], Any, str, int]:
+    """
+    Download blob per chunk ke SpooledTemporaryFile (pindah ke disk di atas
+    index-spool-max-bytes) sambil menghitung SHA-256.
+    Return (spool, blob_properties, content_hash, size). Caller wajib close spool.
+    """
+    downloader = blob_client.download_blob()
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.index_spool_max_bytes)
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        for block in downloader.chunks():
+            spool.write(block)
+            digest.update(block)
+            size += len(block)
+    except Exception:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return spool, downloader.properties, digest.hexdigest(), size
+
+
+# === Content-addressed chunk IDs: diff chunk baru vs point yang sudah ada ===
+def _existing_chunk_index(blob_name: str, collection_name: str) -> Dict[str, Optional[int]]:
+    """{point_id: chunk_index} semua point milik dokumen ini."""
+    from documentManagement import iter_qdrant_points
+
+    existing = {}
+    for point in iter_qdrant_points(
+        qdrant_client,
+        collection_name,
+        scroll_filter=_source_filter(blob_name),
+        payload_fields=["metadata.chunk_index"],
+    ):
+        metadata = (point.payload or {}).get(QdrantVectorStore.METADATA_KEY) or {}
+        existing[str(point.id)] = metadata.get("chunk_index")
+    return existing
+
+
+class _ChunkDiffPlanner:
+    """
+    Diff chunk baru vs point yang sudah ada, incremental per potongan chunk (streaming).
+    add() mengembalikan record yang perlu di-embed; finish() memberi point yang hilang
+    (dihapus) dan chunk lama yang posisinya bergeser (cukup update chunk_index).
+    """
+
+    def __init__(self, existing: Dict[str, Optional[int]]):
+        self.existing = existing
+        self.kept = 0
+        self._seen = set()
+        self._moved: Dict[str, int] = {}
+
+    def add(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        new_records = []
+        for r in records:
+            self._seen.add(r["id"])
+            if r["id"] not in self.existing:
+                new_records.append(r)
+                continue
+            self.kept += 1
+            if self.existing[r["id"]] != r["metadata"]["chunk_index"]:
+                self._moved[r["id"]] = r["metadata"]["chunk_index"]
+        return new_records
+
+    def finish(self) -> Dict[str, Any]:
+        return {
+            "vanished": [pid for pid in self.existing if pid not in self._seen],
+            "moved": self._moved,
+        }
+
+
+def _apply_chunk_diff(blob_name: str, diff: Dict[str, Any], fingerprint: Dict[str, Any], collection_name: str):
+    """
+    Setelah chunk baru ter-upsert: hapus point yang hilang, update fingerprint dokumen
+    di semua point, dan chunk_index untuk chunk yang bergeser posisi.
+    """
+    if diff["vanished"]:
+        qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=qdrant_models.PointIdsList(points=diff["vanished"]),
+            wait=True
+        )
+
+    qdrant_client.set_payload(
+        collection_name=collection_name,
+        payload=fingerprint,
+        points=_source_filter(blob_name),
+        key=QdrantVectorStore.METADATA_KEY,
+        wait=True
+    )
+
+    operations = [
+        qdrant_models.SetPayloadOperation(
+            set_payload=qdrant_models.SetPayload(
+                payload={"chunk_index": index}, points=[point_id], key=QdrantVectorStore.METADATA_KEY
+            )
+        )
+        for point_id, index in diff["moved"].items()
+    ]
+    for i in range(0, len(operations), 500):
+        qdrant_client.batch_update_points(collection_name=collection_name, update_operations=operations[i:i + 500])
+
+
+# === Concurrent ingestion: download -> layout -> chunk -> embed ===
+def _ingest_blob(
+    blob_name: str,
+    stages: Dict[str, _PipelineStage],
+    indexer: BatchedIndexer,
+    known_hash: Optional[str] = None,
+    near_dup_namespace: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Jalankan satu blob melewati semua stage; embed/upsert lewat indexer bersama.
+    near_dup_namespace: collection fisik untuk NearDuplicateIndex (default collection indexer).
+    """
+    near_dup_namespace = near_dup_namespace or indexer.collection_name
+    print(f"Processing: {blob_name}")
+
+    with stages["download"].run():
+        blob_client = blob_container.get_blob_client(blob_name)
+        try:
+            spool, properties, content_hash, size = _download_blob_to_spool(blob_client)
+        except ResourceNotFoundError:
+            return {"status": "skipped", "reason": "Blob does not exist"}
+        stages["download"].add_bytes(size)
+
+    # Satu buffer dokumen per worker: spool ditutup begitu layout analysis selesai
+    with spool:
+        fingerprint = _blob_fingerprint(properties)
+        fingerprint["content_hash"] = content_hash
+        # Profil chunking ikut fingerprint: ganti profil = dokumen di-chunk ulang
+        profile = chunking_profile_for(blob_name)
+        fingerprint["chunking_profile"] = profile
+
+        # ETag berubah tapi isi file identik -> tidak perlu extract/embed ulang
+        if known_hash and content_hash == known_hash:
+            _refresh_fingerprint_payload(blob_name, fingerprint, indexer.collection_name)
+            # Dokumen tanpa point (seluruhnya near-duplicate): fingerprint ada di index near-dup
+            near_duplicate_index.update_fingerprint(near_dup_namespace, blob_name, fingerprint)
+            return {"status": "unchanged", "blob_etag": fingerprint["blob_etag"]}
+
+        # Extract dengan struktur yang comprehensive dan general (cache by content hash)
+        with stages["layout"].run():
+            elements, cache_hit, extractor = _open_extraction(
+                spool, content_hash, _blob_mime_type(blob_name, properties)
+            )
+
+    extracted = 0
+
+    def counted(stream):
+        nonlocal extracted
+        for element in stream:
+            extracted += 1
+            yield element
+
+    # Streaming: section/tabel di-chunk begitu selesai di-extract, lalu diteruskan ke
+    # indexer per potongan sebesar satu batch embed -> embedding mulai sebelum seluruh
+    # dokumen selesai diproses dan memori per dokumen tetap terbatas
+    chunk_stream = _iter_intelligent_chunks(counted(elements), profile)
+    planner = None
+    occurrences: Dict[str, int] = {}
+    created_chunks = 0
+    # Hanya chunk yang benar-benar masuk collection (mode skip membuang near-duplicate)
     total_chunks = 0
-    
-    # Jika prefix kosong, process semua blobs
-    if prefix:
-        blob_list = blob_container.list_blobs(name_starts_with=prefix)
-    else:
-        blob_list = blob_container.list_blobs()
+    new_chunks = 0
+    near_duplicates = 0
+    skipped_duplicates = 0
+    signatures: List[Tuple[str, List[int]]] = []
+    links: Dict[str, str] = {}
+
+    while True:
+        with stages["chunk"].run(items=0 if created_chunks else 1):
+            chunks = list(itertools.islice(chunk_stream, indexer.batch_size))
+        if not chunks:
+            break
+
+        records = _build_chunk_records(blob_name, chunks, fingerprint, start=created_chunks, occurrences=occurrences)
+        created_chunks += len(chunks)
+        records, duplicates = _mark_near_duplicates(blob_name, records, near_dup_namespace, signatures, links)
+        near_duplicates += duplicates
+        skipped_duplicates += len(chunks) - len(records)
+        total_chunks += len(records)
+
+        if settings.index_chunk_ids == "content":
+            # Hanya chunk yang benar-benar baru di-embed; sisanya cukup update payload
+            if planner is None:
+                planner = _ChunkDiffPlanner(_existing_chunk_index(blob_name, indexer.collection_name))
+            records = planner.add(records)
+
+        new_chunks += len(records)
+        indexer.add(records, source=blob_name, partial=True)
+
+    if not created_chunks:
+        if not extracted:
+            # Bisa kegagalan sementara Document Intelligence: jangan dicatat selesai di manifest
+            return {"status": "skipped", "reason": "No content extracted", "retryable": True}
+        return {"status": "skipped", "reason": "No chunks created", "blob_etag": fingerprint["blob_etag"]}
+
+    outcome = {
+        "status": "indexed",
+        "chunks": total_chunks,
+        "content_hash": fingerprint["content_hash"],
+        "cache_hit": cache_hit,
+        "extractor": extractor,
+        "chunking_profile": profile,
+        "near_duplicates": near_duplicates,
+        "skipped_near_duplicates": skipped_duplicates,
+    }
+    commit_info = {
+        "total_chunks": total_chunks,
+        "content_hash": fingerprint["content_hash"],
+        "blob_etag": fingerprint["blob_etag"],
+    }
+    if settings.near_dup_mode != "off":
+        commit_info.update(near_dup_namespace=near_dup_namespace, signatures=signatures, links=links)
+        if not total_chunks:
+            # Tidak ada point yang membawa fingerprint: simpan di index near-dup
+            commit_info["near_dup_fingerprint"] = dict(fingerprint, total_chunks=0)
+
+    if planner is not None:
+        diff = planner.finish()
+        commit_info.update(diff=diff, fingerprint=dict(fingerprint, total_chunks=total_chunks))
+        outcome.update(new_chunks=new_chunks, kept_chunks=planner.kept, deleted_chunks=len(diff["vanished"]))
+
+    # Dokumen lengkap: commit (hapus/rapikan point lama) begitu semua batch-nya ter-upsert
+    indexer.add([], source=blob_name, commit_info=commit_info)
+    return outcome
+
+
+def index_blobs(
+    blob_names: List[str],
+    batch_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    known_hashes: Optional[Dict[str, str]] = None,
+    progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    run_key: Optional[str] = None,
+    manifest: Optional["IndexRunManifest"] = None,
+    collection_name: Optional[str] = None,
+    resume: bool = False,
+    blob_etags: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """
+    Index daftar blob secara concurrent dengan bounded worker pool.
+
+    Setiap stage (download, layout, chunk, embed) punya batas concurrency sendiri,
+    sehingga Document Intelligence dan Azure OpenAI tidak dibanjiri request.
+
+    known_hashes: content_hash yang sudah ada di index per blob. Blob dengan hash
+    sama di-skip; blob yang berubah di-index ulang lalu point lamanya dihapus.
+    progress_callback: dipanggil (blob_name, outcome) setiap satu blob selesai.
+    run_key: aktifkan checkpoint (IndexRunManifest). Dengan resume=True run terakhir yang
+    belum completed dilanjutkan: blob yang sudah tercatat selesai di-skip, kecuali ETag-nya
+    (blob_etags, dari listing) berbeda dengan yang tercatat.
+    manifest: IndexRunManifest yang sudah dibuka caller (menggantikan run_key/resume).
+    collection_name: collection tujuan (default settings.qdrant_collection / alias aktif).
+    """
+    indexed, skipped, unchanged, errors = 0, 0, 0, []
+    cache_hits = 0
+    extractors: Dict[str, int] = {}
+    known_hashes = known_hashes or {}
+    total_chunks = 0
+    new_chunks = 0
+    near_duplicates = 0
+    skipped_near_duplicates = 0
+    # Blob tanpa hasil extract (mungkin gagal sementara): tidak dicatat selesai, dilaporkan terpisah
+    no_content: List[str] = []
+    workers = max(1, workers or settings.index_workers)
+
+    stages = {
+        "download": _PipelineStage("download", settings.index_download_concurrency),
+        "layout": _PipelineStage("layout", settings.index_layout_concurrency),
+        "chunk": _PipelineStage("chunk", settings.index_chunk_concurrency),
+        "embed": _PipelineStage("embed", settings.index_embed_concurrency),
+    }
 
-    print(f"Starting to process documents with prefix: '{prefix}'")
-    
-    for b in blob_list:
+    if manifest is None and run_key:
+        manifest = IndexRunManifest(run_key, resume=resume)
+    already_done = 0
+    if manifest:
+        done = manifest.completed_blobs()
+        blob_etags = blob_etags or {}
+
+        def is_done(name: str) -> bool:
+            # Blob yang berubah setelah tercatat selesai tetap di-index ulang
+            return name in done and (name not in blob_etags or done[name].get("blob_etag") == blob_etags[name])
+
+        already_done = sum(1 for name in blob_names if is_done(name))
+        blob_names = [name for name in blob_names if not is_done(name)]
+
+    def commit_source(blob_name: str, info: Dict[str, Any]):
+        if "diff" in info:
+            _apply_chunk_diff(blob_name, info["diff"], info["fingerprint"], indexer.collection_name)
+        elif not info["total_chunks"]:
+            # Semua chunk di-skip sebagai near-duplicate: tidak ada point versi baru
+            qdrant_client.delete(
+                collection_name=indexer.collection_name,
+                points_selector=qdrant_models.FilterSelector(filter=_source_filter(blob_name)),
+                wait=True
+            )
+        elif info["content_hash"]:
+            # Replace in place: chunk baru sudah ter-upsert, buang point versi lama
+            _delete_stale_chunks(blob_name, info["content_hash"], indexer.collection_name)
+            # total_chunks baru diketahui setelah seluruh dokumen di-stream
+            _refresh_fingerprint_payload(blob_name, {"total_chunks": info["total_chunks"]}, indexer.collection_name)
+        if "signatures" in info:
+            released = near_duplicate_index.replace_source(
+                info["near_dup_namespace"], blob_name, info["signatures"], info["links"],
+                info.get("near_dup_fingerprint"),
+            )
+            if released["sources"] or released["canonical_ids"]:
+                _release_near_duplicate_dependents(released, indexer.collection_name, info["near_dup_namespace"])
+        if manifest:
+            manifest.mark_done(blob_name, {
+                "status": "indexed",
+                "content_hash": info["content_hash"],
+                "blob_etag": info.get("blob_etag"),
+                "chunks": info["total_chunks"],
+                "new_chunks": info["chunks"],
+            })
+
+    indexer = BatchedIndexer(
+        collection_name=collection_name,
+        batch_size=batch_size,
+        stage=stages["embed"],
+        on_commit=commit_source,
+    )
+
+    # Resolve alias sekali per run: signature near-duplicate disimpan per collection fisik
+    near_dup_namespace = _near_dup_namespace(indexer.collection_name)
+
+    def ingest(blob_name: str) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        outcome = _ingest_blob(blob_name, stages, indexer, known_hashes.get(blob_name), near_dup_namespace)
+        outcome["seconds"] = round(time.perf_counter() - t0, 3)
+        return outcome
+
+    def report_progress(blob_name: str, outcome: Dict[str, Any]):
+        if not progress_callback:
+            return
         try:
-            print(f"Processing: {b.name}")
-            blob_client = blob_container.get_blob_client(b.name)
-            content_bytes = blob_client.download_blob().readall()
+            progress_callback(blob_name, outcome)
+        except Exception as e:
+            print(f"⚠️ Progress callback failed for {blob_name}: {e}")
 
-            # Extract dengan struktur yang comprehensive dan general
-            doc_data = _extract_text_with_docint(content_bytes)
-            
-            if not doc_data.get("sections") and not doc_data.get("raw_tables"):
-                skipped += 1
-                print(f"Skipped {b.name}: No content extracted")
+    print(f"Indexing {len(blob_names)} documents with {workers} workers")
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(ingest, name): name for name in blob_names}
+
+        for future in as_completed(futures):
+            blob_name = futures[future]
+            try:
+                outcome = future.result()
+            except Exception as e:
+                errors.append(f"{blob_name}: {str(e)}")
+                print(f"Error processing {blob_name}: {e}")
+                report_progress(blob_name, {"status": "error", "reason": str(e)})
                 continue
 
-            # Create cost-optimized chunks
-            chunks = _create_intelligent_chunks(doc_data)
-            
-            if not chunks:
+            report_progress(blob_name, outcome)
+
+            if outcome["status"] == "indexed":
+                indexed += 1
+                total_chunks += outcome["chunks"]
+                new_chunks += outcome.get("new_chunks", outcome["chunks"])
+                near_duplicates += outcome.get("near_duplicates", 0)
+                skipped_near_duplicates += outcome.get("skipped_near_duplicates", 0)
+                cache_hits += int(outcome["cache_hit"])
+                extractors[outcome["extractor"]] = extractors.get(outcome["extractor"], 0) + 1
+                print(f"Queued {blob_name}: {outcome['chunks']} chunks"
+                      + (f" ({outcome['skipped_near_duplicates']} near-duplicates skipped)" if outcome.get("skipped_near_duplicates") else ""))
+            elif outcome["status"] == "unchanged":
+                unchanged += 1
+                print(f"Unchanged {blob_name}: content hash matches index")
+            else:
                 skipped += 1
-                print(f"Skipped {b.name}: No chunks created")
-                continue
+                if outcome.get("retryable"):
+                    no_content.append(blob_name)
+                print(f"Skipped {blob_name}: {outcome['reason']}")
 
-            # Index each chunk dengan cost-efficient metadata
-            for i, chunk_data in enumerate(chunks):
-                unique_string_id = f"{_make_safe_doc_id(b.name)}_{i}"
-                chunk_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, unique_string_id))
-                
-                # Optimized metadata - only essential fields
-                base_metadata = {
-                    "source": b.name,
-                    "chunk_index": i,
-                    "content_type": chunk_data["type"],
-                    "token_count": chunk_data["tokens"],
-                    "total_chunks": len(chunks)
-                }
-                
-                # Add specific metadata dari chunk
-                base_metadata.update(chunk_data.get("metadata", {}))
-                
-                try:
-                    print(f"Attempting to index chunk {chunk_id} for {b.name}...")
-                    vectorstoreQ.add_texts(
-                        [chunk_data["content"]], 
-                        metadatas=[base_metadata], 
-                        ids=[chunk_id]
-                    )
-                    print(f"Successfully indexed chunk {chunk_id}.")
-                except Exception as e:
-                    print(f"!!!!!!!!!!!!! FATAL ERROR indexing chunk {chunk_id} !!!!!!!!!!!!!")
-                    import traceback
-                    traceback.print_exc()  # Ini akan print error lengkapnya
-                    print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-                    continue
-            
-            total_chunks += len(chunks)
-            print(f"Indexed {b.name}: {len(chunks)} chunks")
-            indexed += 1
-            
-            # Add small delay untuk avoid rate limiting
-            time.sleep(0.1)
+            if manifest and outcome["status"] != "indexed" and not outcome.get("retryable"):
+                manifest.mark_done(blob_name, {
+                    "status": outcome["status"],
+                    "reason": outcome.get("reason"),
+                    "blob_etag": outcome.get("blob_etag"),
+                })
 
-        except Exception as e:
-            error_msg = f"{b.name}: {str(e)}"
-            errors.append(error_msg)
-            print(f"Error processing {b.name}: {e}")
+    batch_report = indexer.close()
+    errors.extend(batch_report["batch_errors"])
+
+    elapsed = time.perf_counter() - started
+
+    run_report = None
+    if manifest:
+        # Run dengan error bisa di-resume (resume=True): hanya blob yang belum selesai diulang
+        manifest.checkpoint(status="incomplete" if errors else "completed")
+        run_report = dict(manifest.summary(), resumed=manifest.resumed, already_done=already_done)
 
     return {
         "indexed": indexed, 
         "skipped": skipped, 
+        "unchanged": unchanged,
+        "extraction_cache_hits": cache_hits,
+        "extractors": extractors,
         "errors": errors,
         "total_chunks": total_chunks,
-        "avg_chunks_per_doc": total_chunks / max(indexed, 1)
+        "new_chunks": new_chunks,
+        "near_duplicates": near_duplicates,
+        "skipped_near_duplicates": skipped_near_duplicates,
+        "near_dup_mode": settings.near_dup_mode,
+        "failed_chunks": batch_report["failed_chunks"],
+        "avg_chunks_per_doc": total_chunks / max(indexed, 1),
+        "embed_batch_size": batch_report["embed_batch_size"],
+        "embedding_cache": batch_report["embedding_cache"],
+        "embed_retries": batch_report["embed_retries"],
+        "throttle_wait_seconds": batch_report["throttle_wait_seconds"],
+        "batches": batch_report["batches"],
+        "failed_sources": sorted(indexer.failed_sources),
+        "no_content_sources": sorted(no_content),
+        "run": run_report,
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 3),
+        "stages": {name: stage.report(elapsed) for name, stage in stages.items()}
     }
 
+
+# === Enhanced indexing pipeline - tetap nama function yang sama ===
+def process_and_index_docs(
+    prefix: str = "",
+    batch_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    run_key: Optional[str] = None,
+    manifest: Optional["IndexRunManifest"] = None,
+    collection_name: Optional[str] = None,
+    resume: bool = False,
+) -> Dict[str, Any]:
+    """
+    Process dan index dokumen dengan cost optimization - support semua prefix termasuk kosong.
+    Run di-checkpoint per prefix; resume=True melanjutkan run sebelumnya yang belum selesai.
+    """
+    # Jika prefix kosong, process semua blobs
+    if prefix:
+        blob_list = blob_container.list_blobs(name_starts_with=prefix)
+    else:
+        blob_list = blob_container.list_blobs()
+
+    print(f"Starting to process documents with prefix: '{prefix}'")
+    blobs = [b for b in blob_list if not _is_system_blob(b.name)]
+    blob_names = [b.name for b in blobs]
+
+    return index_blobs(
+        blob_names,
+        batch_size=batch_size,
+        workers=workers,
+        progress_callback=progress_callback,
+        run_key=run_key or _default_run_key("docs", prefix, collection_name),
+        manifest=manifest,
+        collection_name=collection_name,
+        resume=resume,
+        blob_etags={b.name: b.etag for b in blobs if getattr(b, "etag", None)},
+    )
+
 # === NEW: Function to get unique document count ===
 def _get_unique_documents_info(docs: List[Any]) -> Dict[str, Any]:
     """Get information about unique documents from retrieved chunks."""
@@ -1192,13 +2322,33 @@ def _rerank_documents(docs: List[Any], query: str, max_docs: int) -> List[Any]:
         # Length bonus untuk comprehensive content
         if len(doc.page_content) > 500:
             score += 20
+
+        # Near-duplicate dari chunk dokumen lain: kalah dari versi kanoniknya (opt-in)
+        if settings.near_dup_retrieval == "downweight" and metadata.get("near_duplicate_of"):
+            score *= settings.near_dup_downweight
         
         scored_docs.append((doc, score))
     
     # Sort and return top docs
     scored_docs.sort(key=lambda x: x[1], reverse=True)
+    if settings.near_dup_retrieval == "collapse":
+        return _diversify_near_duplicates([doc for doc, score in scored_docs], max_docs)
     return [doc for doc, score in scored_docs[:max_docs]]
 
+def _diversify_near_duplicates(docs: List[Any], max_docs: int) -> List[Any]:
+    """Satu chunk per grup near-duplicate (chunk kanonik + chunk yang near_duplicate_of-nya sama)."""
+    selected, seen = [], set()
+    for doc in docs:
+        metadata = doc.metadata
+        group = {metadata.get("_id"), metadata.get("near_duplicate_of")} - {None}
+        if group & seen:
+            continue
+        seen |= group
+        selected.append(doc)
+        if len(selected) >= max_docs:
+            break
+    return selected
+
 def _build_comprehensive_context(docs: List[Any], query: str, doc_info: Dict[str, Any], is_doc_listing: bool) -> str:
     """Build context yang efficient dengan document counting information."""
     context_parts = []
@@ -1231,6 +2381,10 @@ def _build_comprehensive_context(docs: List[Any], query: str, doc_info: Dict[str
         meta_info = f"[SUMBER: {source} | TIPE: {content_type}"
         if section_header:
             meta_info += f" | BAGIAN: {section_header}"
+        if metadata.get('total_rows'):
+            first_row = metadata.get('row_start', metadata.get('row_index'))
+            last_row = metadata.get('row_end', first_row)
+            meta_info += f" | BARIS: {first_row}-{last_row} dari {metadata['total_rows']}"
         meta_info += "]"
         
         context_parts.append(f"{meta_info}\n{doc.page_content}")
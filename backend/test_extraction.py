@@ -1,17 +1,18 @@
 # Test Document Extraction
 from internal_assistant_core import blob_container
-from rag_modul import _extract_text_with_docint
+from rag_modul import _extract_text_with_docint, _download_blob_to_spool
 import json
 
 def test_document_extraction(blob_name: str):
     """Test ekstraksi dokumen dan tampilkan hasilnya"""
     try:
-        # Download dokumen
+        # Download dokumen (streamed ke spool file)
         blob_client = blob_container.get_blob_client(blob_name)
-        content_bytes = blob_client.download_blob().readall()
+        spool, _, _, _ = _download_blob_to_spool(blob_client)
         
         # Ekstraksi dengan Document Intelligence
-        doc_data = _extract_text_with_docint(content_bytes)
+        with spool:
+            doc_data = _extract_text_with_docint(spool)
         
         # Save hasil ke file JSON
         filename = f"ekstraksi_{blob_name.replace('/', '_').replace('.pdf', '')}.json"